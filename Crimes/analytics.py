@@ -0,0 +1,304 @@
+# analytics.py
+# ==============================
+# Headless analytics (ไม่ใช้ Streamlit)
+# ==============================
+# KPI + ข้อมูลกราฟชุดเดียวกับที่ app แสดง สำหรับ filter spec หนึ่ง ๆ
+# - app เรียกฟังก์ชันในนี้ (ผ่าน result cache) แล้วทำแค่ส่วนแสดงผล
+# - report.py ใช้ Analytics.report() สร้างรายงานล่วงหน้า (Parquet/JSON) โดยไม่ต้องเปิด app
+# - cube / profile / aggregate ตามตัวกรองผ่าน backend (pandas หรือ duckdb ตาม CRIMES_BACKEND)
+import os
+
+import pandas as pd
+
+import backend
+import cube
+import data_cache
+import dataset_store
+import parallel
+import quantiles
+import result_cache
+import schema
+import temporal
+
+# ------------------------------
+# Sources (ตั้งค่าผ่าน env, ใช้ร่วมกันระหว่าง app และ CLI)
+# ------------------------------
+BEFORE_URL = os.environ.get("CRIMES_BEFORE_URL", "https://drive.google.com/uc?id=1zl7Cg2oQi8q61gyX42IjLKXmK7rmzp9v")
+AFTER_URL = os.environ.get("CRIMES_AFTER_URL", "https://drive.google.com/uc?id=1Mu5kXGBcC8KEINNfZPiumBPxNGQ-nN5G")
+# SHA-256 ที่คาดไว้ของไฟล์ต้นทาง (ว่าง = ไม่ตรวจ) → ดาวน์โหลดไม่ตรง checksum จะไม่ถูกใช้
+SOURCE_CHECKSUMS = {
+    BEFORE_URL: os.environ.get("CRIMES_BEFORE_SHA256", ""),
+    AFTER_URL: os.environ.get("CRIMES_AFTER_SHA256", ""),
+}
+
+MISSING_HANDLING = {
+    "Case Number": "ลบแถว (Drop rows) – ฟีเจอร์หลักของเหตุการณ์",
+    "Date": "ลบแถว (Drop rows) – ใช้วิเคราะห์เวลา/แนวโน้ม",
+    "Block": "ลบแถว (Drop rows) – ระบุตำแหน่งเหตุ",
+    "IUCR": "ลบแถว (Drop rows) – รหัสมาตรฐานประเภทคดี",
+    "Primary Type": "ลบแถว (Drop rows) – ใช้วิเคราะห์ประเภทคดี",
+    "Description": "ลบแถว (Drop rows) – รายละเอียดสำคัญ",
+    "Arrest": "ลบแถว (Drop rows) – ใช้คำนวณสัดส่วนจับกุม",
+    "Domestic": "ลบแถว (Drop rows) – ใช้แยก domestic/non-domestic",
+    "Beat": "ลบแถว (Drop rows) – รหัสพื้นที่",
+    "District": "ลบแถว (Drop rows) – รหัสพื้นที่",
+    "FBI Code": "ลบแถว (Drop rows) – รหัสจัดกลุ่ม",
+    "Year": "ลบแถว (Drop rows) – เงื่อนไขตามช่วงปี",
+    "Updated On": "ลบแถว (Drop rows) – ความสมบูรณ์ของข้อมูล",
+    "Location Description": "เติมค่า (Fill) = UNKNOWN – missing ต่ำ (~0.41%)",
+    "Ward": "ตัดคอลัมน์ (Drop column) – missing สูงมาก (~69%)",
+    "Community Area": "ตัดคอลัมน์ (Drop column) – missing สูงมาก (~68%)",
+    "Latitude": "กรองเฉพาะตอนทำแผนที่ (Map-only filter) – ไม่ลบจากชุดหลัก",
+    "Longitude": "กรองเฉพาะตอนทำแผนที่ (Map-only filter) – ไม่ลบจากชุดหลัก",
+    "X Coordinate": "กรองเฉพาะตอนทำแผนที่ (Map-only filter) – ไม่ลบจากชุดหลัก",
+    "Y Coordinate": "กรองเฉพาะตอนทำแผนที่ (Map-only filter) – ไม่ลบจากชุดหลัก",
+    "Location": "กรองเฉพาะตอนทำแผนที่ (Map-only filter) – ไม่ลบจากชุดหลัก",
+}
+
+TOP_N = 15  # ตาราง Top 15 (missing ต่อคอลัมน์, พื้นที่, Location Description)
+
+
+# ------------------------------
+# Load (memory mode)
+# ------------------------------
+def source_paths() -> tuple:
+    # Parquet cache ของ Before/After (ดาวน์โหลดพร้อมกันเฉพาะครั้งแรก / หลัง refresh)
+    before_path, after_path = data_cache.ensure_cached_many(
+        [BEFORE_URL, AFTER_URL], schema.read_csv_typed, schema.SCHEMA_VERSION, checksums=SOURCE_CHECKSUMS
+    )
+    return before_path, after_path
+
+def open_dataset(parquet_path: str) -> pd.DataFrame:
+    return dataset_store.open_shared(parquet_path, temporal.prep, temporal.PREP_VERSION)
+
+def memory_sources(parquet_path: str, df: pd.DataFrame) -> list:
+    # partition ตามช่วงแถวของ Arrow store สำหรับ parallel (worker อ่านไฟล์เอง)
+    return parallel.arrow_sources(dataset_store.arrow_path(parquet_path, temporal.PREP_VERSION), len(df))
+
+def build_profile(parquet_path: str, df: pd.DataFrame = None) -> dict:
+    # pandas: missing counts ทั้งชุดคำนวณแบบขนานตามช่วงแถว; duckdb: query บน Parquet (df ไม่ใช้)
+    engine = backend.get()
+    return engine.profile(engine.open(parquet_path, df))
+
+def load_cube(parquet_path: str, df: pd.DataFrame, dataset: str, sources: list = None) -> pd.DataFrame:
+    # cube เก็บลงดิสก์ข้าง Parquet (Incremental Refresh ปรับ cube นี้ด้วย delta); ผลเหมือนกันทุก backend
+    engine = backend.get()
+    return cube.load_or_build(parquet_path, temporal.PREP_VERSION, df, dataset, lambda: engine.build_cube(engine.open(parquet_path, df, sources), dataset))
+
+
+# ------------------------------
+# Profiles → tables (Data Dictionary / Missing Compare)
+# ------------------------------
+# profile = schema.dataset_profile(df) หรือ PartitionedDataset.profile() (ไม่ต้องอ่านข้อมูล)
+def missing_count_pct(profile: dict, col: str):
+    if col not in profile["missing"]:
+        return None, None
+    cnt = int(profile["missing"][col])
+    pct = float(cnt / profile["rows"] * 100) if profile["rows"] else float("nan")
+    return cnt, pct
+
+def column_dtype_str(profile: dict, col: str) -> str:
+    return profile["dtypes"].get(col, "-")
+
+def build_data_dictionary(prof_b: dict, prof_a: dict) -> pd.DataFrame:
+    rows = []
+    for col, meaning, expected_type, group in schema.FEATURE_INFO:
+        b_dtype = column_dtype_str(prof_b, col)
+        a_dtype = column_dtype_str(prof_a, col)
+        handling = MISSING_HANDLING.get(col, "ไม่ระบุ (Not specified)")
+        rows.append(
+            {
+                "ฟีเจอร์ (Feature)": col,
+                "กลุ่ม (Group)": group,
+                "ความหมาย (Meaning)": meaning,
+                "ชนิดข้อมูลที่ควรเป็น (Expected type)": expected_type,
+                "ชนิดข้อมูลก่อน (Before dtype)": b_dtype,
+                "ชนิดข้อมูลหลัง (After dtype)": a_dtype,
+                "แนวทางจัดการ Missing (Handling)": handling,
+            }
+        )
+    return pd.DataFrame(rows)
+
+def build_missing_compare(prof_b: dict, prof_a: dict) -> pd.DataFrame:
+    rows = []
+    all_cols = sorted(set(prof_b["columns"]).union(set(prof_a["columns"])))
+    for col in all_cols:
+        b_cnt, b_pct = missing_count_pct(prof_b, col)
+        a_cnt, a_pct = missing_count_pct(prof_a, col)
+        rows.append(
+            {
+                "ฟีเจอร์ (Feature)": col,
+                "Missing ก่อน (Count)": "-" if b_cnt is None else f"{b_cnt:,}",
+                "Missing ก่อน (%)": "-" if b_pct is None else f"{b_pct:.4f}",
+                "Missing หลัง (Count)": "-" if a_cnt is None else f"{a_cnt:,}",
+                "Missing หลัง (%)": "-" if a_pct is None else f"{a_pct:.4f}",
+                "วิธีจัดการ (Method)": MISSING_HANDLING.get(col, "-"),
+            }
+        )
+    df_out = pd.DataFrame(rows)
+
+    def sort_key(x):
+        try:
+            return float(x)
+        except Exception:
+            return -1.0
+
+    df_out["_sort"] = df_out["Missing หลัง (%)"].apply(sort_key)
+    df_out = df_out.sort_values("_sort", ascending=False).drop(columns=["_sort"])
+    return df_out
+
+
+# ------------------------------
+# Chart data (ผลแบบ value_counts → ตารางที่กราฟใช้)
+# ------------------------------
+def top_k_compare(counts_b: pd.Series, counts_a: pd.Series, col: str, k: int, mode: str):
+    # (Before, After) Top K พร้อมคอลัมน์ Value ตาม mode ("Count..." หรือ "Share...")
+    tb = counts_b.head(k).reset_index()
+    tb.columns = [col, "Count"]
+    ta = counts_a.head(k).reset_index()
+    ta.columns = [col, "Count"]
+    if mode.startswith("Share"):
+        tb["Value"] = (tb["Count"] / max(tb["Count"].sum(), 1)) * 100
+        ta["Value"] = (ta["Count"] / max(ta["Count"].sum(), 1)) * 100
+    else:
+        tb["Value"] = tb["Count"]
+        ta["Value"] = ta["Count"]
+    return tb, ta
+
+def top_table(counts: pd.Series, col: str, n: int = TOP_N) -> pd.DataFrame:
+    out = counts.head(n).reset_index()
+    out.columns = [col, "Count"]
+    return out
+
+def share_table(shares: pd.Series, col: str) -> pd.DataFrame:
+    out = shares.reset_index()
+    out.columns = [col, "Percent"]
+    return out
+
+def year_trend(counts_b: pd.Series, counts_a: pd.Series) -> pd.DataFrame:
+    parts = []
+    for name, counts in [("Before", counts_b), ("After", counts_a)]:
+        part = counts.sort_index().reset_index()
+        part.columns = ["Year", "Count"]
+        part["Dataset"] = name
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+def missing_percent(missing: pd.Series, rows: int, n: int = TOP_N) -> pd.DataFrame:
+    out = (missing / max(rows, 1) * 100).sort_values(ascending=False).head(n).reset_index()
+    out.columns = ["Column", "MissingPercent"]
+    return out
+
+def kpis(cube_b: pd.DataFrame, cube_a: pd.DataFrame) -> dict:
+    # KPI ของแท็บ Overview จาก cube slice (ไม่ scan แถว)
+    return {
+        "rows_before": cube.total(cube_b),
+        "rows_after": cube.total(cube_a),
+        "missing_before": cube.total(cube_b, "Missing"),
+        "missing_after": cube.total(cube_a, "Missing"),
+        "arrest_rate_after": cube.rate(cube_a, "Arrest") if "Arrest" in cube_a.columns else 0.0,
+        "domestic_rate_after": cube.rate(cube_a, "Domestic") if "Domestic" in cube_a.columns else 0.0,
+        "geo_rows_after": cube.total(cube_a, "Geo"),
+    }
+
+
+# ------------------------------
+# Engine (1 ชุดข้อมูล → หลาย filter spec)
+# ------------------------------
+class Analytics:
+    # ds_before / ds_after = dataset ของ backend (pandas: Arrow store + FilterIndex, duckdb: view บน Parquet)
+    def __init__(self, engine, ds_before, ds_after, crime_cube: pd.DataFrame, profile_before: dict, profile_after: dict):
+        self.engine = engine
+        self.ds_before = ds_before
+        self.ds_after = ds_after
+        self.cube = crime_cube
+        self.profile_before = profile_before
+        self.profile_after = profile_after
+
+    @classmethod
+    def open(cls, before_path: str = None, after_path: str = None, profiles: tuple = None, engine: str = None) -> "Analytics":
+        # path = Parquet cache (None → ดึงตาม BEFORE_URL/AFTER_URL); profiles = (before, after) ที่คำนวณไว้แล้ว
+        # engine = ชื่อ backend (None → CRIMES_BACKEND)
+        if before_path is None or after_path is None:
+            before_path, after_path = source_paths()
+        be = backend.get(engine)
+        ds_b, ds_a = be.open(before_path), be.open(after_path)
+        crime_cube = cube.combine([
+            cube.load_or_build(before_path, temporal.PREP_VERSION, None, "Before", lambda: be.build_cube(ds_b, "Before")),
+            cube.load_or_build(after_path, temporal.PREP_VERSION, None, "After", lambda: be.build_cube(ds_a, "After")),
+        ])
+        if profiles is None:
+            profiles = be.profile(ds_b), be.profile(ds_a)
+        return cls(be, ds_b, ds_a, crime_cube, *profiles)
+
+    def year_bounds(self) -> tuple:
+        bounds = [b for b in (self.engine.year_bounds(self.ds_before), self.engine.year_bounds(self.ds_after)) if b is not None]
+        if not bounds:
+            return 2001, 2025
+        return min(b[0] for b in bounds), max(b[1] for b in bounds)
+
+    def normalize(self, spec: dict) -> dict:
+        # filter spec แบบ JSON → รูปเดียวกับ app (Year = tuple, คอลัมน์อื่น = list, ไม่ระบุ = ไม่กรอง)
+        year = spec.get("Year")
+        filters = {"Year": tuple(int(y) for y in year) if year else self.year_bounds()}
+        for col in schema.FILTER_COLUMNS:
+            vals = spec.get(col) or []
+            if col in ("Arrest", "Domestic"):
+                vals = [v if isinstance(v, bool) else str(v) == "True" for v in vals]
+            filters[col] = list(vals)
+        return filters
+
+    def report(self, spec: dict, top_k: int = 10, mode: str = "Count") -> dict:
+        # {"filters", "filter_key", "kpis", "tables": {ชื่อ: DataFrame}}
+        filters = self.normalize(spec)
+        cube_b = cube.slice_cube(self.cube, filters, "Before")
+        cube_a = cube.slice_cube(self.cube, filters, "After")
+        ds = {"Before": self.ds_before, "After": self.ds_after}
+
+        tables = {}
+        tb, ta = top_k_compare(cube.counts(cube_b, "Primary Type"), cube.counts(cube_a, "Primary Type"), "Primary Type", top_k, mode)
+        tables["top_primary_type"] = pd.concat([tb.assign(Dataset="Before"), ta.assign(Dataset="After")], ignore_index=True)
+        for col in ["Arrest", "Domestic"]:
+            if col in cube_b.columns and col in cube_a.columns:
+                tables[f"{col.lower()}_share"] = pd.concat([
+                    share_table(cube.shares(cube_b, col), col).assign(Dataset="Before"),
+                    share_table(cube.shares(cube_a, col), col).assign(Dataset="After"),
+                ], ignore_index=True)
+        if "Year" in cube_b.columns:
+            tables["trend_by_year"] = year_trend(cube.counts(cube_b, "Year"), cube.counts(cube_a, "Year"))
+        if all(temporal.TIME_KEY in p["columns"] for p in [self.profile_before, self.profile_after]):
+            times = temporal.merge_partials([self.engine.time_rollup(ds[name], name, filters) for name in ["Before", "After"]])
+            tables["hour_weekday"] = pd.concat([
+                temporal.heatmap(temporal.slice_rollup(times, dataset=name)).stack().rename("Count").reset_index().assign(Dataset=name)
+                for name in ["Before", "After"]
+            ], ignore_index=True)
+            tables["trend_by_day"] = temporal.trend(times, "Day")
+        tables["missing_by_column"] = pd.concat([
+            missing_percent(self.engine.missing_counts(ds[name], filters), self.engine.rows(ds[name], filters)).assign(Dataset=name)
+            for name in ["Before", "After"]
+        ], ignore_index=True)
+        for col in ["District", "Location Description"]:
+            if col in cube_b.columns and col in cube_a.columns:
+                fill = "UNKNOWN" if col == "Location Description" else None
+                tables[f"top_{col.lower().replace(' ', '_')}"] = pd.concat([
+                    top_table(cube.counts(cube_b, col, fill), col).assign(Dataset="Before"),
+                    top_table(cube.counts(cube_a, col, fill), col).assign(Dataset="After"),
+                ], ignore_index=True)
+        box_rows = []
+        for name, profile in [("Before", self.profile_before), ("After", self.profile_after)]:
+            for col in ["Latitude", "Longitude"]:
+                if col in profile["columns"]:
+                    stats = quantiles.QuantileSketch.from_values(self.engine.values(ds[name], col, filters)).box_stats()
+                    if stats is not None:
+                        stats = {k: v for k, v in stats.items() if k != "outliers"}
+                        box_rows.append({"Dataset": name, "Column": col, **stats})
+        tables["coord_box_stats"] = pd.DataFrame(box_rows)
+        tables["data_dictionary"] = build_data_dictionary(self.profile_before, self.profile_after)
+        tables["missing_compare"] = build_missing_compare(self.profile_before, self.profile_after)
+
+        return {
+            "filters": filters,
+            "filter_key": result_cache.filter_key(filters),
+            "kpis": {**kpis(cube_b, cube_a), "year_range": list(filters["Year"])},
+            "tables": tables,
+        }
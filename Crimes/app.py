@@ -1,7 +1,33 @@
 # app.py
+import os
+import uuid
+from concurrent.futures import wait
+
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+
+import analytics
+import backend
+import cube
+import data_cache
+import diff
+import duplicates
+import explorer
+import filter_index
+import geo
+import heavy_hitters
+import incremental
+import parallel
+import partitions
+import perf
+import quantiles
+import result_cache
+import sampling
+import schema
+import temporal
 
 # ==============================
 # Page Config
@@ -135,30 +161,249 @@ def insight_card(title_th_en: str, what: str, so_what: str, now_what: str):
         unsafe_allow_html=True,
     )
 
+# ==============================
+# Instrumentation (developer)
+# ==============================
+# แผง Performance แสดงเมื่อเปิดด้วย ?dev=1 หรือ CRIMES_DEV=1, log JSON lines ต่อ rerun ที่ CRIMES_PERF_LOG
+DEV_PANEL = os.environ.get("CRIMES_DEV", "") == "1" or st.query_params.get("dev") == "1"
+if "perf_session" not in st.session_state:
+    st.session_state.perf_session = uuid.uuid4().hex[:8]
+    st.session_state.perf_reruns = 0
+st.session_state.perf_reruns += 1
+trace = perf.activate(perf.RerunTrace(st.session_state.perf_session, st.session_state.perf_reruns))
+
+def finish_trace():
+    summary = trace.finish()
+    perf.write_jsonl(summary)
+    if DEV_PANEL:
+        with st.sidebar.expander("⏱️ Performance (Developer)", expanded=True):
+            st.caption(
+                f"rerun #{summary['rerun']} · {summary['total_ms']:,.0f} ms · "
+                f"cache {summary['cache_hits']} hit / {summary['cache_misses']} miss"
+            )
+            spans = pd.DataFrame(summary["spans"])
+            if len(spans):
+                spans["stage"] = spans["depth"].map(lambda d: "· " * d) + spans["stage"]
+                spans["rss_delta_mb"] = spans["rss_delta_bytes"] / 1e6
+                st.dataframe(
+                    spans[["stage", "ms", "rows", "bytes", "rss_delta_mb", "cache"]].round(2),
+                    use_container_width=True, hide_index=True,
+                )
+
+def show_chart(fig):
+    # จับเวลา serialize + ส่ง figure (ขนาด payload วัดเฉพาะตอนเปิดแผง developer)
+    with trace.stage("plotly_chart", figure=fig.layout.title.text) as span:
+        if DEV_PANEL:
+            span["bytes"] = len(fig.to_json())
+        st.plotly_chart(fig, use_container_width=True)
+
 # ==============================
 # Load Data
 # ==============================
-@st.cache_data(show_spinner=False)
-def load_data():
-    before_url = "https://drive.google.com/uc?id=1zl7Cg2oQi8q61gyX42IjLKXmK7rmzp9v"
-    after_url = "https://drive.google.com/uc?id=1Mu5kXGBcC8KEINNfZPiumBPxNGQ-nN5G"
-    df_before = pd.read_csv(before_url, low_memory=False)
-    df_after = pd.read_csv(after_url, low_memory=False)
-    return df_before, df_after
-
-@st.cache_data(show_spinner=False)
-def prep_dates(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    if "Date" in df.columns:
-        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-        df["Year"] = df["Date"].dt.year
-        df["Month"] = df["Date"].dt.to_period("M").astype(str)
-    return df
+# URL/checksum ของต้นทางตั้งใน analytics (ใช้ร่วมกับ report.py)
+BEFORE_URL, AFTER_URL = analytics.BEFORE_URL, analytics.AFTER_URL
+
+# ไฟล์ส่วนเพิ่ม (CSV ที่มี Updated On ใหม่กว่า watermark) สำหรับ Incremental Refresh: โฟลเดอร์หรือไฟล์เดียว
+BEFORE_DROP = os.environ.get("CRIMES_BEFORE_DROP", os.path.join(data_cache.CACHE_DIR, "drop", "before"))
+AFTER_DROP = os.environ.get("CRIMES_AFTER_DROP", os.path.join(data_cache.CACHE_DIR, "drop", "after"))
+
+PREP_VERSION = temporal.PREP_VERSION
+# memory = โหลดทั้งชุดไว้ในหน่วยความจำ, partitioned = อ่านเฉพาะ partition ปีที่เลือก (Year=YYYY/)
+# CRIMES_BACKEND (backend.py) = duckdb → query = ไม่โหลดแถวเข้า pandas: กรอง / นับแถว / value counts / missing
+#   ผ่าน backend บน Parquet cache (CRIMES_STORAGE ไม่ใช้); ฟีเจอร์รายแถว (ตาราง, แผนที่, diff, ข้อมูลซ้ำ) ปิดไว้
+STORAGE_MODE = "query" if backend.BACKEND == "duckdb" else os.environ.get("CRIMES_STORAGE", "memory")
+ROW_LEVEL = STORAGE_MODE != "query"
+engine = backend.get()
+
+@st.cache_resource(show_spinner=False)
+@perf.computes
+def load_source_paths():
+    # อ่านจาก Parquet cache ในเครื่อง (ดาวน์โหลด+แปลง CSV เฉพาะครั้งแรก)
+    # ชนิดข้อมูลตาม schema ถูกแปลงครั้งเดียวตอนแปลง CSV → Parquet
+    # path เปลี่ยนเมื่อ refresh (เต็มชุดหรือส่วนเพิ่ม) → ใช้เป็น key ของ cache ด้านล่าง
+    # Before/After ดาวน์โหลดพร้อมกัน และ parse ระหว่างดาวน์โหลด
+    return analytics.source_paths()
+
+@st.cache_resource(show_spinner=False)
+@perf.computes
+def load_data(before_path: str, after_path: str):
+    # เปิดผ่าน dataset_store (Arrow memory map): 1 ชุดต่อ process ใช้ร่วมกันทุก session, ห้ามแก้ in-place
+    return analytics.open_dataset(before_path), analytics.open_dataset(after_path)
+
+@st.cache_resource(show_spinner=False)
+@perf.computes
+def load_partitioned(before_path: str, after_path: str):
+    parts_before = partitions.open_partitioned(before_path, temporal.prep, PREP_VERSION)
+    parts_after = partitions.open_partitioned(after_path, temporal.prep, PREP_VERSION)
+    return parts_before, parts_after
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+@perf.computes
+def load_year_slice(_parts_b: partitions.PartitionedDataset, _parts_a: partitions.PartitionedDataset, year_range: tuple):
+    # partition pruning: อ่านเฉพาะ Year=... ที่อยู่ในช่วง (partition ที่โหลดแล้วถูกใช้ซ้ำ)
+    return _parts_b.load(year_range), _parts_a.load(year_range)
+
+# --- Scan sources สำหรับ parallel (worker อ่านข้อมูลเองจากไฟล์ ไม่ส่ง DataFrame ข้าม process)
+def partition_sources(parts: partitions.PartitionedDataset, year_range: tuple) -> list:
+    return parallel.parquet_sources([parts.partition_path(n) for n in parts.prune(year_range)])
+
+def full_sources() -> dict:
+    # ทั้งประวัติ (ไม่ขึ้นกับช่วงปี) สำหรับ sample / รายการ Top-K ที่สร้างครั้งเดียว (pandas เท่านั้น)
+    if STORAGE_MODE == "partitioned":
+        return {
+            name: parallel.parquet_sources([parts.partition_path(n) for n in parts.meta["partitions"]])
+            for name, parts in [("Before", parts_before), ("After", parts_after)]
+        }
+    return {"Before": analytics.memory_sources(source_paths[0], df_before), "After": analytics.memory_sources(source_paths[1], df_after)}
+
+def build_cube_parallel(sources: list, df: pd.DataFrame, name: str) -> pd.DataFrame:
+    # ไม่มี partition ในช่วงปี → cube ว่างจาก frame ว่าง
+    # pandas: parallel.build_cube ตาม partition, duckdb: query ตรงบนไฟล์ partition
+    if not sources:
+        return cube.build_cube(df, name)
+    engine = backend.get()
+    return engine.build_cube(engine.open([path for _, path, _, _ in sources], df, sources), name)
+
+@st.cache_resource(show_spinner=False)
+@perf.computes
+def load_query_datasets(before_path: str, after_path: str):
+    # duckdb: view บน Parquet cache (อ่านแค่ schema) → query ตามตัวกรองทุกครั้ง ไม่ถือแถวไว้
+    return engine.open(before_path), engine.open(after_path)
+
+@st.cache_resource(show_spinner=False)
+@perf.computes
+def load_year_bounds(_ds_b, _ds_a, source_paths: tuple) -> tuple:
+    bounds = [b for b in (engine.year_bounds(_ds_b), engine.year_bounds(_ds_a)) if b is not None]
+    if not bounds:
+        return 2001, 2025
+    return min(b[0] for b in bounds), max(b[1] for b in bounds)
+
+@st.cache_resource(show_spinner=False)
+@perf.computes
+def load_profiles(_df_b: pd.DataFrame, _df_a: pd.DataFrame, source_paths: tuple):
+    # duckdb: _df_* = None (profile จาก query บน Parquet)
+    before_path, after_path = source_paths
+    return analytics.build_profile(before_path, _df_b), analytics.build_profile(after_path, _df_a)
+
+# data_key: source paths (+ year_range ถ้า partitioned) → แยก cache ตามชุดที่โหลดจริง
+@st.cache_resource(show_spinner=False, max_entries=8)
+@perf.computes
+def load_cube(_df_b: pd.DataFrame, _df_a: pd.DataFrame, _sources: dict, data_key) -> pd.DataFrame:
+    # ไม่ hash DataFrame (ขึ้นต้นด้วย _) → สร้างครั้งเดียว, ล้างพร้อม load_data ตอน Refresh
+    # _sources = {"Before": [...], "After": [...]}: partition ที่ parallel.build_cube นับแยกแล้วรวม
+    # duckdb: _df_* / _sources = None → cube จาก query บน Parquet
+    if STORAGE_MODE == "partitioned":
+        return cube.combine([
+            build_cube_parallel(_sources["Before"], _df_b, "Before"),
+            build_cube_parallel(_sources["After"], _df_a, "After"),
+        ])
+    before_path, after_path = data_key
+    return cube.combine([
+        analytics.load_cube(before_path, _df_b, "Before", _sources["Before"]),
+        analytics.load_cube(after_path, _df_a, "After", _sources["After"]),
+    ])
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+@perf.computes
+def load_index(_df: pd.DataFrame, name: str, data_key) -> filter_index.FilterIndex:
+    # index ถือ DataFrame ไว้เอง (cache_resource ไม่ copy) → ใช้ร่วมกันทุก rerun/session
+    return filter_index.FilterIndex(_df)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+@perf.computes
+def load_spatial_index(_df: pd.DataFrame, name: str, data_key):
+    if "Latitude" not in _df.columns or "Longitude" not in _df.columns:
+        return None
+    return geo.SpatialIndex(_df["Latitude"].to_numpy(), _df["Longitude"].to_numpy())
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+@perf.computes
+def load_explorer(_df: pd.DataFrame, name: str, data_key) -> explorer.RowExplorer:
+    # argsort ต่อคอลัมน์สร้างเมื่อเรียงครั้งแรก แล้วใช้ซ้ำทุก rerun/session
+    return explorer.RowExplorer(_df)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+@perf.computes
+def load_coord_sketches(_df_b: pd.DataFrame, _df_a: pd.DataFrame, data_key) -> dict:
+    # {(dataset, col): {year: QuantileSketch}} สร้างครั้งเดียว แล้วรวมตามช่วงปีที่เลือก
+    out = {}
+    for name, df in [("Before", _df_b), ("After", _df_a)]:
+        for col in ["Latitude", "Longitude"]:
+            if col in df.columns and "Year" in df.columns:
+                out[(name, col)] = quantiles.sketches_by(df, col, "Year")
+    return out
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+@perf.computes
+def load_diff(_df_b: pd.DataFrame, _df_a: pd.DataFrame, data_key) -> diff.RowDiff:
+    # diff รายแถว Before/After (ทั้งชุด หรือช่วงปีที่โหลดใน partitioned) สร้างเมื่อเปิดแท็บ Cleaning Process
+    return diff.diff(_df_b, _df_a)
+
+@st.cache_resource(show_spinner=False)
+@perf.computes
+def load_samples(_sources: dict, source_paths: tuple) -> dict:
+    # stratified sample ทั้งประวัติ (ต่อ partition ปี) สำหรับพรีวิวโดยประมาณ → {"Before": (sample, values), "After": ...}
+    out = {}
+    for name, path in zip(["Before", "After"], source_paths):
+        out[name] = sampling.load_or_build(path, PREP_VERSION, lambda: parallel.sample(_sources[name], name))
+    return out
+
+@st.cache_resource(show_spinner=False)
+@perf.computes
+def load_partition_top_k(_sources: dict, source_paths: tuple) -> pd.DataFrame:
+    # Top-K ที่ตัดรายการต่อ partition (ปี × เขต) ของ Block/Description/IUCR ทั้งประวัติ (Before + After ในตารางเดียว)
+    return pd.concat([
+        heavy_hitters.load_or_build(path, PREP_VERSION, lambda: parallel.partition_top_k(_sources[name], name))
+        for name, path in zip(["Before", "After"], source_paths)
+    ], ignore_index=True)
+
+@st.cache_resource(show_spinner=False)
+@perf.computes
+def load_time_rollup(_sources: dict, source_paths: tuple) -> pd.DataFrame:
+    # จำนวนคดีต่อชั่วโมง (TimeKey) ทั้งประวัติ (Before + After ในตารางเดียว) → heatmap / แนวโน้มรายวัน
+    return temporal.merge_partials([
+        temporal.load_or_build(path, PREP_VERSION, lambda: parallel.time_rollup(_sources[name], name))
+        for name, path in zip(["Before", "After"], source_paths)
+    ])
+
+@st.cache_resource(show_spinner=False)
+@perf.computes
+def load_duplicates(_sources: dict, source_paths: tuple) -> pd.DataFrame:
+    # สรุปแถวซ้ำ exact / near ต่อ (ปี × เขต) ทั้งประวัติ (Before + After ในตารางเดียว)
+    return pd.concat([
+        duplicates.load_or_build(path, PREP_VERSION, lambda: parallel.duplicate_summary(_sources[name], name))
+        for name, path in zip(["Before", "After"], source_paths)
+    ], ignore_index=True)
+
+@st.cache_resource(show_spinner=False)
+def load_refiner() -> parallel.Refiner:
+    return parallel.Refiner()
+
+@st.cache_resource(show_spinner=False)
+def load_result_cache() -> result_cache.ResultCache:
+    # แชร์ข้ามทุก session (ผู้ใช้หลายคนมักดู preset เดียวกัน)
+    return result_cache.ResultCache()
 
 with st.spinner("กำลังโหลดข้อมูล..."):
-    df_before, df_after = load_data()
-    df_before = prep_dates(df_before)
-    df_after = prep_dates(df_after)
+    with trace.stage("load_source_paths", cached=True):
+        source_paths = load_source_paths()
+    if STORAGE_MODE == "partitioned":
+        with trace.stage("load_partitioned", cached=True) as span:
+            parts_before, parts_after = load_partitioned(*source_paths)
+            profile_before, profile_after = parts_before.profile(), parts_after.profile()
+            span["rows"] = profile_before["rows"] + profile_after["rows"]
+    elif STORAGE_MODE == "query":
+        with trace.stage("load_query_datasets", cached=True):
+            ds_before, ds_after = load_query_datasets(*source_paths)
+            df_before = df_after = None
+        with trace.stage("load_profiles", cached=True):
+            profile_before, profile_after = load_profiles(None, None, source_paths)
+    else:
+        with trace.stage("load_data", cached=True) as span:
+            df_before, df_after = load_data(*source_paths)
+            span["rows"] = len(df_before) + len(df_after)
+        with trace.stage("load_profiles", cached=True):
+            profile_before, profile_after = load_profiles(df_before, df_after, source_paths)
 
 # ==============================
 # Title
@@ -175,11 +420,23 @@ st.sidebar.header("ตัวกรอง (Filters)")
 if "reset_filters" not in st.session_state:
     st.session_state.reset_filters = False
 
+# multiselect มี key → อ่านค่าที่เลือกได้ก่อน render (นับ facet) และล้างได้ตอนรีเซ็ต
+FILTER_KEYS = {col: "filter_" + col.lower().replace(" ", "_") for col in schema.FILTER_COLUMNS}
+BOOL_FILTERS = ["Arrest", "Domestic"]
+
 if st.sidebar.button("รีเซ็ตตัวกรอง (Reset Filters)"):
     st.session_state.reset_filters = True
+    for key in FILTER_KEYS.values():
+        st.session_state.pop(key, None)
 
 # --- Year range (robust)
-if (
+if STORAGE_MODE == "partitioned":
+    all_years = parts_before.years + parts_after.years
+    year_min, year_max = (min(all_years), max(all_years)) if all_years else (2001, 2025)
+elif STORAGE_MODE == "query":
+    with trace.stage("load_year_bounds", cached=True):
+        year_min, year_max = load_year_bounds(ds_before, ds_after, source_paths)
+elif (
     "Year" in df_after.columns
     and df_after["Year"].notna().any()
     and "Year" in df_before.columns
@@ -199,48 +456,165 @@ year_range = st.sidebar.slider(
     default_year if not st.session_state.reset_filters else (year_min, year_max),
 )
 
-# --- Helper to build options safely (works even if some columns are missing after cleaning)
-def safe_unique_values(df: pd.DataFrame, col: str, max_items: int = 200):
-    if col not in df.columns:
-        return []
-    vals = df[col].dropna().astype(str).unique().tolist()
-    vals = sorted(vals)
-    return vals[:max_items]
+# --- Approximate preview (partitioned): เปลี่ยนช่วงปีแล้วตอบจาก sample ทันที ระหว่างโหลดช่วงปีจริงเบื้องหลัง
+# (memory mode ไม่ต้องใช้: ข้อมูลทั้งชุดโหลดไว้แล้ว KPI มาจาก cube ทันที)
+PREVIEW_WAIT_SECONDS = 0.1  # ค่าจริงเสร็จภายในเวลานี้ (เช่น cache hit) → ไม่ต้องแสดงพรีวิว
+PREVIEW_POLL_SECONDS = 0.5
+approx_preview = STORAGE_MODE == "partitioned" and st.sidebar.toggle(
+    "⚡ พรีวิวเร็ว (Approximate preview)",
+    value=True,
+    help="แสดง KPI/Top-K โดยประมาณจากตัวอย่าง (Stratified sample) พร้อมช่วงความเชื่อมั่น 95% ระหว่างคำนวณค่าจริง",
+)
+
+# --- Load only what the year range needs (partitioned) + shared cube/indexes
+data_key = source_paths + tuple(year_range) if STORAGE_MODE == "partitioned" else source_paths
+
+def prepare_year_slice(year_range: tuple, ctx):
+    # งานเบื้องหลังของพรีวิว: เรียก loader ชุดเดียวกับด้านล่าง → rerun ถัดไปเป็น cache hit ทั้งหมด
+    # เธรดของ Refiner ไม่มี ScriptRunContext → ผูก context ของ rerun ที่สั่งงานก่อนเรียก loader ของ st.cache_resource
+    add_script_run_ctx(ctx=ctx)
+    key = source_paths + year_range
+    df_b, df_a = load_year_slice(parts_before, parts_after, year_range)
+    load_cube(df_b, df_a, {"Before": partition_sources(parts_before, year_range), "After": partition_sources(parts_after, year_range)}, key)
+    load_index(df_b, "Before", key)
+    load_index(df_a, "After", key)
+    load_spatial_index(df_a, "After", key)
+    load_coord_sketches(df_b, df_a, key)
+
+preview = False
+if approx_preview:
+    refine_ctx = get_script_run_ctx()
+    refine_job = load_refiner().submit(data_key, lambda: prepare_year_slice(tuple(year_range), refine_ctx))
+    preview = bool(wait([refine_job], timeout=PREVIEW_WAIT_SECONDS).not_done)
+if preview:
+    with trace.stage("load_samples", cached=True) as span:
+        samples = load_samples(full_sources(), source_paths)
+        span["rows"] = len(samples["Before"][0]) + len(samples["After"][0])
+else:
+    with st.spinner("กำลังเตรียมข้อมูล..."):
+        if STORAGE_MODE == "partitioned":
+            with trace.stage("load_year_slice", cached=True) as span:
+                df_before, df_after = load_year_slice(parts_before, parts_after, tuple(year_range))
+                span["rows"] = len(df_before) + len(df_after)
+        if STORAGE_MODE == "partitioned":
+            scan = {
+                "Before": partition_sources(parts_before, tuple(year_range)),
+                "After": partition_sources(parts_after, tuple(year_range)),
+            }
+        elif STORAGE_MODE == "query":
+            scan = {"Before": None, "After": None}
+        else:
+            scan = {"Before": analytics.memory_sources(source_paths[0], df_before), "After": analytics.memory_sources(source_paths[1], df_after)}
+        with trace.stage("load_cube", cached=True) as span:
+            crime_cube = load_cube(df_before, df_after, scan, data_key)
+            span["rows"] = len(crime_cube)
+        if ROW_LEVEL:
+            with trace.stage("load_index", cached=True):
+                index_before = load_index(df_before, "Before", data_key)
+                index_after = load_index(df_after, "After", data_key)
+            with trace.stage("load_spatial_index", cached=True):
+                spatial_after = load_spatial_index(df_after, "After", data_key)
+            with trace.stage("load_coord_sketches", cached=True):
+                coord_sketches = load_coord_sketches(df_before, df_after, data_key)
+            # dataset ของ backend บน frame + index ที่โหลดแล้ว (aggregate ตามตัวกรองผ่าน engine เหมือน duckdb)
+            ds_before = engine.open(source_paths[0], df_before, scan["Before"], index_before)
+            ds_after = engine.open(source_paths[1], df_after, scan["After"], index_after)
+
+# --- Result cache (ใช้ตั้งแต่ตัวเลือกใน sidebar)
+memo = load_result_cache()
+
+def traced_memo(key: tuple, name: tuple, compute):
+    with trace.stage(":".join(str(n) for n in name)) as span:
+        found, value = memo.get_or_compute(key, compute)
+        span["cache"] = "hit" if found else "miss"
+        span["rows"] = perf.row_count(value)
+        span["bytes"] = result_cache.sizeof(value)
+    return value
+
+def memoized_static(name: tuple, compute):
+    # ผลที่ไม่ขึ้นกับตัวกรอง (เช่น สรุปจาก profile ทั้งชุด) → key เดียวทุก filter แต่แยกตามชุดข้อมูล (data_key)
+    return traced_memo(("static", data_key) + name, name, compute)
+
+# --- Faceted options: จำนวนคดี (After) ของแต่ละตัวเลือกภายใต้ตัวกรองอื่นที่เลือกอยู่ เรียงจากมากไปน้อย
+# นับจาก cube (slice + sum บนรหัส category) ไม่ scan แถว; ค่าที่ไม่มีคดีภายใต้ตัวกรองอื่นยังอยู่ท้ายรายการ (0)
+def selected_filters() -> dict:
+    # ค่าที่เลือกไว้ใน multiselect (session state ก่อน render) → ตัวกรองของคอลัมน์อื่นตอนนับ facet
+    out = {"Year": year_range}
+    for col, key in FILTER_KEYS.items():
+        vals = st.session_state.get(key, [])
+        out[col] = [v == "True" for v in vals] if col in BOOL_FILTERS else list(vals)
+    return out
+
+def facet_options(col: str, current: dict) -> tuple:
+    # (ตัวเลือกเรียงตามจำนวน, {ค่า: จำนวน}); พรีวิว = ค่าประมาณจาก sample (ตัวเลือกครบเหมือนค่าจริง)
+    others = {**current, col: []}
+    key = result_cache.filter_key(others)
+    if preview:
+        def compute():
+            est = sampling.counts(cube.slice_cube(samples["After"][0], others), col)
+            values = ["True", "False"] if col in BOOL_FILTERS else sampling.options(samples["After"][1], col, year_range)
+            return order_options(values, est.set_index(col)["Count"].round().astype("int64"), col)
+        return traced_memo(("facet_approx", data_key, col, key), ("facet_approx", col), compute)
+    if col not in crime_cube.columns:
+        return [], {}
+    after_cube = traced_memo(("facet_cube", data_key), ("facet_cube",), lambda: cube.slice_cube(crime_cube, {}, "After"))
+    values = traced_memo(("facet_values", data_key, col), ("facet_values", col), lambda: sorted(cube.counts(after_cube, col).index.tolist()))
+    return traced_memo(
+        ("facet", data_key, col, key), ("facet", col),
+        lambda: order_options(["True", "False"] if col in BOOL_FILTERS else values, cube.facet_counts(after_cube, others, col), col),
+    )
 
-# --- Build filter options from AFTER first (because it is the analysis dataset)
-crime_types = safe_unique_values(df_after, "Primary Type")
-districts = safe_unique_values(df_after, "District")
-loc_desc = safe_unique_values(df_after, "Location Description")
+def order_options(values: list, counts: pd.Series, col: str) -> tuple:
+    if col in BOOL_FILTERS:
+        counts = counts.rename(index=str)
+    counts = counts.to_dict()
+    return sorted(values, key=lambda v: -counts.get(v, 0)), counts
+
+def facet_label(counts: dict):
+    mark = "≈" if preview else ""
+    return lambda v: f"{v} ({mark}{counts.get(v, 0):,})"
+
+current_filters = selected_filters()
+crime_types, crime_counts = facet_options("Primary Type", current_filters)
+districts, district_counts = facet_options("District", current_filters)
+loc_desc, loc_counts = facet_options("Location Description", current_filters)
+arrest_opts, arrest_counts = facet_options("Arrest", current_filters)
+domestic_opts, domestic_counts = facet_options("Domestic", current_filters)
 
 # --- Multi-filters
 sel_crime = st.sidebar.multiselect(
     "ประเภทคดี (Primary Type)",
     options=crime_types,
-    default=[] if not st.session_state.reset_filters else [],
+    format_func=facet_label(crime_counts),
+    key=FILTER_KEYS["Primary Type"],
 )
 
 sel_district = st.sidebar.multiselect(
     "เขตตำรวจ (District)",
     options=districts,
-    default=[] if not st.session_state.reset_filters else [],
+    format_func=facet_label(district_counts),
+    key=FILTER_KEYS["District"],
 )
 
 sel_loc = st.sidebar.multiselect(
     "สถานที่เกิดเหตุ (Location Description)",
     options=loc_desc,
-    default=[] if not st.session_state.reset_filters else [],
+    format_func=facet_label(loc_counts),
+    key=FILTER_KEYS["Location Description"],
 )
 
 sel_arrest = st.sidebar.multiselect(
     "การจับกุม (Arrest)",
-    options=["True", "False"],
-    default=[] if not st.session_state.reset_filters else [],
+    options=arrest_opts,
+    format_func=facet_label(arrest_counts),
+    key=FILTER_KEYS["Arrest"],
 )
 
 sel_domestic = st.sidebar.multiselect(
     "คดีในครอบครัว (Domestic)",
-    options=["True", "False"],
-    default=[] if not st.session_state.reset_filters else [],
+    options=domestic_opts,
+    format_func=facet_label(domestic_counts),
+    key=FILTER_KEYS["Domestic"],
 )
 
 st.sidebar.divider()
@@ -252,185 +626,213 @@ metric_mode = st.sidebar.radio(
 
 top_k = st.sidebar.slider("Top K ที่แสดง (Top K)", 5, 20, 10)
 
-# --- Apply same filters to both datasets (Before/After)
-def apply_filters(df: pd.DataFrame) -> pd.DataFrame:
-    dff = df.copy()
+st.sidebar.divider()
+def clear_loaders():
+    load_source_paths.clear()
+    load_data.clear()
+    load_partitioned.clear()
+    load_year_slice.clear()
+    load_query_datasets.clear()
+    load_year_bounds.clear()
+    load_profiles.clear()
+    load_cube.clear()
+    load_index.clear()
+    load_spatial_index.clear()
+    load_explorer.clear()
+    load_coord_sketches.clear()
+    load_diff.clear()
+    load_samples.clear()
+    load_partition_top_k.clear()
+    load_time_rollup.clear()
+    load_duplicates.clear()
+    # instance เดียวที่ทุก session ใช้: ล้างผลเก่าพร้อมตัวนับ hit/miss (key ของผลขึ้นกับตัวกรอง ไม่ผูกกับข้อมูล)
+    load_result_cache().clear()
+
+if st.sidebar.button("ดึงข้อมูลใหม่ (Refresh Data Cache)"):
+    data_cache.invalidate()
+    clear_loaders()
+    st.rerun()
+
+# --- Incremental refresh: นำเข้าเฉพาะแถวที่ Updated On ใหม่กว่า watermark จาก drop folder
+if st.sidebar.button("อัปเดตส่วนเพิ่ม (Incremental Refresh)"):
+    with st.spinner("กำลังนำเข้าข้อมูลส่วนเพิ่ม..."):
+        results = {
+            "Before": incremental.refresh(BEFORE_URL, BEFORE_DROP, temporal.prep, PREP_VERSION),
+            "After": incremental.refresh(AFTER_URL, AFTER_DROP, temporal.prep, PREP_VERSION),
+        }
+    st.session_state.incremental_result = results
+    if any(r and (r["added"] or r["updated"]) for r in results.values()):
+        clear_loaders()
+        st.rerun()
+
+if "incremental_result" in st.session_state:
+    for name, r in st.session_state.incremental_result.items():
+        if r is None:
+            st.sidebar.caption(f"{name}: ไม่มีไฟล์ส่วนเพิ่มใหม่")
+        else:
+            st.sidebar.caption(
+                f"{name}: +{r['added']:,} ใหม่, {r['updated']:,} แก้ไข "
+                f"(watermark {r['watermark']['updated_on'] if r['watermark'] else '-'})"
+            )
+
+# --- Filter spec (ใช้ร่วมกันทั้งแถวดิบและ aggregate cube)
+filters = {
+    "Year": year_range,
+    "Primary Type": sel_crime,
+    "District": sel_district,
+    "Location Description": sel_loc,
+    "Arrest": [v == "True" for v in sel_arrest],
+    "Domestic": [v == "True" for v in sel_domestic],
+}
 
-    if "Year" in dff.columns:
-        dff = dff[(dff["Year"] >= year_range[0]) & (dff["Year"] <= year_range[1])]
+# --- Memoize ผลลัพธ์ตาม filter spec (เปลี่ยนแค่ Metric Mode / Top K → ใช้ผลเดิม)
+# key ขึ้นต้นด้วย data_key → หลัง refresh / เปลี่ยนช่วงปีของ partition ไม่ได้ผลของชุดเดิม
+filter_hash = result_cache.filter_key(filters)
 
-    if sel_crime and "Primary Type" in dff.columns:
-        dff = dff[dff["Primary Type"].astype(str).isin(sel_crime)]
+def memoized(name: tuple, compute):
+    return traced_memo((data_key, filter_hash) + name, name, compute)
 
-    if sel_district and "District" in dff.columns:
-        dff = dff[dff["District"].astype(str).isin(sel_district)]
+TABS = [
+    "ภาพรวม (Overview)",
+    "คุณภาพข้อมูล (Data Quality)",
+    "สำรวจข้อมูล (Exploration)",
+    "ขั้นตอนการจัดการข้อมูล (Cleaning Process)",
+    "พจนานุกรมข้อมูล (Data Dictionary)",
+    "Missing ก่อน–หลัง (Missing Compare)",
+]
+tab1, tab2, tab3, tab4, tab5, tab6 = TABS
 
-    if sel_loc and "Location Description" in dff.columns:
-        dff = dff[dff["Location Description"].astype(str).isin(sel_loc)]
+# ==============================
+# Approximate preview (ระหว่างรอค่าจริง)
+# ==============================
+def approx_text(est: dict, fmt: str = ",.0f", suffix: str = "") -> str:
+    half = (est["high"] - est["low"]) / 2
+    return f"≈{est['value']:{fmt}}{suffix} ± {half:{fmt}}{suffix}"
+
+def top_bar_approx(est_b: pd.DataFrame, est_a: pd.DataFrame, col: str, k: int, mode: str):
+    # est_* = sampling.counts() → แท่งค่าประมาณ + error bar ช่วงความเชื่อมั่น 95%
+    share = mode.startswith("Share")
+    tables = []
+    for est in [est_b, est_a]:
+        t = est.head(k).copy()
+        scale = 100 / max(t["Count"].sum(), 1) if share else 1
+        t["Value"] = t["Count"] * scale
+        t["ErrPlus"] = (t["High"] - t["Count"]) * scale
+        t["ErrMinus"] = (t["Count"] - t["Low"]) * scale
+        tables.append(t)
+    max_x = max(float((t["Value"] + t["ErrPlus"]).max()) for t in tables) if all(len(t) for t in tables) else None
+    figs = []
+    for t, title in zip(tables, ["ก่อนทำความสะอาด (Before) โดยประมาณ", "หลังทำความสะอาด (After) โดยประมาณ"]):
+        fig = px.bar(t, x="Value", y=col, orientation="h", title=title, error_x="ErrPlus", error_x_minus="ErrMinus")
+        fig.update_layout(xaxis_title="Share (%)" if share else "Count", yaxis_title=col, margin=dict(l=10, r=10, t=50, b=10))
+        if max_x is not None:
+            fig.update_xaxes(range=[0, max_x * 1.10])
+        figs.append(fig)
+    return figs
 
-    if sel_arrest and "Arrest" in dff.columns:
-        dff = dff[dff["Arrest"].astype(str).isin(sel_arrest)]
+if preview:
+    st.session_state.reset_filters = False
+    st.radio("เลือกหน้า (Section)", TABS, horizontal=True, key="active_tab", label_visibility="collapsed")
+    st.info(
+        f"⚡ พรีวิวโดยประมาณจากตัวอย่าง (Stratified sample) · ช่วงปี {year_range[0]}–{year_range[1]} "
+        "กำลังคำนวณค่าจริงเบื้องหลัง แล้วจะแสดงผลจริงแทนอัตโนมัติ (± = ช่วงความเชื่อมั่น 95%)"
+    )
+    sample_b = memoized(("approx", "Before"), lambda: cube.slice_cube(samples["Before"][0], filters))
+    sample_a = memoized(("approx", "After"), lambda: cube.slice_cube(samples["After"][0], filters))
+    kpi = memoized(("approx", "kpis"), lambda: sampling.kpis(sample_b, sample_a))
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("📌 จำนวนแถว (Rows) - ก่อน", approx_text(kpi["rows_before"]))
+    c2.metric("✅ จำนวนแถว (Rows) - หลัง", approx_text(kpi["rows_after"]))
+    c3.metric("⚠️ Missing - ก่อน", approx_text(kpi["missing_before"]))
+    c4.metric("🧼 Missing - หลัง", approx_text(kpi["missing_after"]))
+    colK1, colK2, colK3, colK4 = st.columns(4)
+    colK1.metric("👮 Arrest Rate (After)", approx_text(kpi["arrest_rate_after"], ".2f", "%"))
+    colK2.metric("🏠 Domestic Share (After)", approx_text(kpi["domestic_rate_after"], ".2f", "%"))
+    colK3.metric("🗺️ แถวที่มีพิกัด (After)", approx_text(kpi["geo_rows_after"]))
+    colK4.metric("📅 ช่วงปีที่เลือก", f"{year_range[0]}–{year_range[1]}")
+
+    st.subheader("ประเภทคดีสูงสุด (Top Crime Types)")
+    fig_b, fig_a = top_bar_approx(
+        memoized(("approx", "counts", "Before", "Primary Type"), lambda: sampling.counts(sample_b, "Primary Type")),
+        memoized(("approx", "counts", "After", "Primary Type"), lambda: sampling.counts(sample_a, "Primary Type")),
+        "Primary Type", top_k, metric_mode,
+    )
+    colL, colR = st.columns(2)
+    with colL:
+        show_chart(fig_b)
+    with colR:
+        show_chart(fig_a)
+
+    @st.fragment(run_every=PREVIEW_POLL_SECONDS)
+    def refine_when_ready():
+        # เช็คงานเบื้องหลังเป็นระยะ → เสร็จแล้ว rerun ทั้งหน้าด้วยค่าจริง (หน้าอื่นแสดงเมื่อค่าจริงพร้อม)
+        if refine_job.done():
+            st.rerun()
+        st.caption("⏳ กำลังคำนวณค่าจริง...")
+
+    refine_when_ready()
+    finish_trace()
+    st.stop()
+
+# --- Apply same filters to both datasets (Before/After) ผ่าน backend
+# จำนวนแถว / missing / value counts: engine ตามตัวกรอง (pandas = FilterIndex, duckdb = WHERE บน Parquet)
+rows_b = memoized(("rows", "Before"), lambda: engine.rows(ds_before, filters))
+rows_a = memoized(("rows", "After"), lambda: engine.rows(ds_after, filters))
+# ฟีเจอร์รายแถว (pandas): RowSelection (row-id view) แทน DataFrame copy → ดึงคอลัมน์เมื่อจำเป็นเท่านั้น
+if ROW_LEVEL:
+    b = memoized(("select", "Before"), lambda: engine.select(ds_before, filters))
+    a = memoized(("select", "After"), lambda: engine.select(ds_after, filters))
 
-    if sel_domestic and "Domestic" in dff.columns:
-        dff = dff[dff["Domestic"].astype(str).isin(sel_domestic)]
+# --- Cube slices สำหรับ KPI/กราฟที่เป็นการนับ (ไม่ต้อง scan แถว)
+cube_b = memoized(("cube", "Before"), lambda: cube.slice_cube(crime_cube, filters, "Before"))
+cube_a = memoized(("cube", "After"), lambda: cube.slice_cube(crime_cube, filters, "After"))
 
-    return dff
+def filtered_counts(dataset: str, col: str, fill: str = None) -> pd.Series:
+    sliced = cube_b if dataset == "Before" else cube_a
+    return memoized(("counts", dataset, col, fill), lambda: cube.counts(sliced, col, fill))
 
-b = apply_filters(df_before)
-a = apply_filters(df_after)
+def filtered_shares(dataset: str, col: str) -> pd.Series:
+    sliced = cube_b if dataset == "Before" else cube_a
+    return memoized(("shares", dataset, col), lambda: cube.shares(sliced, col))
 
 # --- Clear reset flag after applying
 if st.session_state.reset_filters:
     st.session_state.reset_filters = False
 
 # --- Empty state (important for scoring)
-if a.empty or b.empty:
+if rows_a == 0 or rows_b == 0:
     st.warning("ไม่พบข้อมูลตามตัวกรองที่เลือก กรุณาปรับตัวกรอง (Filter) ใหม่ หรือกด Reset Filters")
+    finish_trace()
     st.stop()
 
 # ==============================
 # Tabs
 # ==============================
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
-    [
-        "ภาพรวม (Overview)",
-        "คุณภาพข้อมูล (Data Quality)",
-        "สำรวจข้อมูล (Exploration)",
-        "ขั้นตอนการจัดการข้อมูล (Cleaning Process)",
-        "พจนานุกรมข้อมูล (Data Dictionary)",
-        "Missing ก่อน–หลัง (Missing Compare)",
-    ]
-)
+# st.tabs รันโค้ดของทุกแท็บทุก rerun (แค่ซ่อนไว้) → ใช้ตัวเลือกแท็บแทน แล้วคำนวณเฉพาะแท็บที่เปิดอยู่
+# ผลคำนวณของแต่ละแท็บอยู่ใน result cache → สลับกลับมาแท็บเดิมใช้ผลเดิมได้ทันที
+active_tab = st.radio("เลือกหน้า (Section)", TABS, horizontal=True, key="active_tab", label_visibility="collapsed")
 
 # ==============================
-# Data Dictionary + Missing Handling
+# Helpers: charts
 # ==============================
-FEATURE_INFO = [
-    ("Case Number", "รหัสคดีเฉพาะ (Case identifier)", "หมวดหมู่ (Categorical/String)", "Event"),
-    ("ID", "หมายเลขประจำเหตุการณ์ (Record ID)", "ตัวเลข (Numeric/Integer)", "Event"),
-    ("Date", "วันเวลาเกิดเหตุ (Incident datetime)", "วันเวลา (Datetime)", "Event"),
-    ("Updated On", "วันเวลาอัปเดตข้อมูล (Updated datetime)", "วันเวลา (Datetime)", "Event"),
-    ("Year", "ปีที่เกิดเหตุ (Year)", "ตัวเลข (Numeric/Integer)", "Event"),
-    ("IUCR", "รหัสประเภทคดีมาตรฐาน (IUCR code)", "หมวดหมู่ (Categorical)", "Crime"),
-    ("Primary Type", "ประเภทคดีหลัก (Primary type)", "หมวดหมู่ (Categorical)", "Crime"),
-    ("Description", "รายละเอียดคดี (Description)", "หมวดหมู่ (Categorical)", "Crime"),
-    ("FBI Code", "รหัสจัดกลุ่มตาม FBI (FBI code)", "หมวดหมู่ (Categorical)", "Crime"),
-    ("Arrest", "มีการจับกุมหรือไม่ (Arrested)", "ตรรกะ (Boolean)", "Status"),
-    ("Domestic", "คดีในครอบครัวหรือไม่ (Domestic)", "ตรรกะ (Boolean)", "Status"),
-    ("Block", "บล็อกที่เกิดเหตุ (Block)", "หมวดหมู่ (Categorical)", "Location"),
-    ("Beat", "รหัสเขตย่อยตำรวจ (Beat)", "ตัวเลข (Numeric/Integer)", "Location"),
-    ("District", "เขตตำรวจ (District)", "ตัวเลข (Numeric/Integer)", "Location"),
-    ("Ward", "เขตการเลือกตั้ง (Ward)", "ตัวเลข (Numeric)", "Location"),
-    ("Community Area", "เขตชุมชน (Community area)", "ตัวเลข (Numeric)", "Location"),
-    ("Location Description", "ประเภทสถานที่ (Location description)", "หมวดหมู่ (Categorical)", "Location"),
-    ("X Coordinate", "พิกัดแกน X (X coordinate)", "ตัวเลข (Numeric)", "Geo"),
-    ("Y Coordinate", "พิกัดแกน Y (Y coordinate)", "ตัวเลข (Numeric)", "Geo"),
-    ("Latitude", "ละติจูด (Latitude)", "ตัวเลขทศนิยม (Numeric/Float)", "Geo"),
-    ("Longitude", "ลองจิจูด (Longitude)", "ตัวเลขทศนิยม (Numeric/Float)", "Geo"),
-    ("Location", "พิกัดคู่ (Lat, Long) (Location tuple text)", "ข้อความ/ออบเจกต์ (Object/String)", "Geo"),
-]
-
-MISSING_HANDLING = {
-    "Case Number": "ลบแถว (Drop rows) – ฟีเจอร์หลักของเหตุการณ์",
-    "Date": "ลบแถว (Drop rows) – ใช้วิเคราะห์เวลา/แนวโน้ม",
-    "Block": "ลบแถว (Drop rows) – ระบุตำแหน่งเหตุ",
-    "IUCR": "ลบแถว (Drop rows) – รหัสมาตรฐานประเภทคดี",
-    "Primary Type": "ลบแถว (Drop rows) – ใช้วิเคราะห์ประเภทคดี",
-    "Description": "ลบแถว (Drop rows) – รายละเอียดสำคัญ",
-    "Arrest": "ลบแถว (Drop rows) – ใช้คำนวณสัดส่วนจับกุม",
-    "Domestic": "ลบแถว (Drop rows) – ใช้แยก domestic/non-domestic",
-    "Beat": "ลบแถว (Drop rows) – รหัสพื้นที่",
-    "District": "ลบแถว (Drop rows) – รหัสพื้นที่",
-    "FBI Code": "ลบแถว (Drop rows) – รหัสจัดกลุ่ม",
-    "Year": "ลบแถว (Drop rows) – เงื่อนไขตามช่วงปี",
-    "Updated On": "ลบแถว (Drop rows) – ความสมบูรณ์ของข้อมูล",
-    "Location Description": "เติมค่า (Fill) = UNKNOWN – missing ต่ำ (~0.41%)",
-    "Ward": "ตัดคอลัมน์ (Drop column) – missing สูงมาก (~69%)",
-    "Community Area": "ตัดคอลัมน์ (Drop column) – missing สูงมาก (~68%)",
-    "Latitude": "กรองเฉพาะตอนทำแผนที่ (Map-only filter) – ไม่ลบจากชุดหลัก",
-    "Longitude": "กรองเฉพาะตอนทำแผนที่ (Map-only filter) – ไม่ลบจากชุดหลัก",
-    "X Coordinate": "กรองเฉพาะตอนทำแผนที่ (Map-only filter) – ไม่ลบจากชุดหลัก",
-    "Y Coordinate": "กรองเฉพาะตอนทำแผนที่ (Map-only filter) – ไม่ลบจากชุดหลัก",
-    "Location": "กรองเฉพาะตอนทำแผนที่ (Map-only filter) – ไม่ลบจากชุดหลัก",
-}
+def in_both(*cols) -> bool:
+    # คอลัมน์จาก profile (ไม่แตะแถว) → ใช้ได้ทุก backend
+    return all(c in profile_before["columns"] and c in profile_after["columns"] for c in cols)
 
-def dtype_str(s: pd.Series) -> str:
-    try:
-        return str(s.dtype)
-    except Exception:
-        return "unknown"
-
-def missing_count_pct(df: pd.DataFrame, col: str):
-    if col not in df.columns:
-        return None, None
-    cnt = int(df[col].isna().sum())
-    pct = float(df[col].isna().mean() * 100)
-    return cnt, pct
-
-def build_data_dictionary(df_b: pd.DataFrame, df_a: pd.DataFrame) -> pd.DataFrame:
-    rows = []
-    for col, meaning, expected_type, group in FEATURE_INFO:
-        b_dtype = dtype_str(df_b[col]) if col in df_b.columns else "-"
-        a_dtype = dtype_str(df_a[col]) if col in df_a.columns else "-"
-        handling = MISSING_HANDLING.get(col, "ไม่ระบุ (Not specified)")
-        rows.append(
-            {
-                "ฟีเจอร์ (Feature)": col,
-                "กลุ่ม (Group)": group,
-                "ความหมาย (Meaning)": meaning,
-                "ชนิดข้อมูลที่ควรเป็น (Expected type)": expected_type,
-                "ชนิดข้อมูลก่อน (Before dtype)": b_dtype,
-                "ชนิดข้อมูลหลัง (After dtype)": a_dtype,
-                "แนวทางจัดการ Missing (Handling)": handling,
-            }
-        )
-    return pd.DataFrame(rows)
-
-def build_missing_compare(df_b: pd.DataFrame, df_a: pd.DataFrame) -> pd.DataFrame:
-    rows = []
-    all_cols = sorted(set(df_b.columns).union(set(df_a.columns)))
-    for col in all_cols:
-        b_cnt, b_pct = missing_count_pct(df_b, col)
-        a_cnt, a_pct = missing_count_pct(df_a, col)
-        rows.append(
-            {
-                "ฟีเจอร์ (Feature)": col,
-                "Missing ก่อน (Count)": "-" if b_cnt is None else f"{b_cnt:,}",
-                "Missing ก่อน (%)": "-" if b_pct is None else f"{b_pct:.4f}",
-                "Missing หลัง (Count)": "-" if a_cnt is None else f"{a_cnt:,}",
-                "Missing หลัง (%)": "-" if a_pct is None else f"{a_pct:.4f}",
-                "วิธีจัดการ (Method)": MISSING_HANDLING.get(col, "-"),
-            }
-        )
-    df_out = pd.DataFrame(rows)
+def in_after(*cols) -> bool:
+    return all(c in profile_after["columns"] for c in cols)
 
-    def sort_key(x):
-        try:
-            return float(x)
-        except Exception:
-            return -1.0
-
-    df_out["_sort"] = df_out["Missing หลัง (%)"].apply(sort_key)
-    df_out = df_out.sort_values("_sort", ascending=False).drop(columns=["_sort"])
-    return df_out
-
-# ==============================
-# Helpers: charts
-# ==============================
-def top_bar_before_after(df_b: pd.DataFrame, df_a: pd.DataFrame, col: str, k: int, mode: str):
-    tb = df_b[col].value_counts().head(k).reset_index()
-    tb.columns = [col, "Count"]
-    ta = df_a[col].value_counts().head(k).reset_index()
-    ta.columns = [col, "Count"]
+def row_level_notice(feature: str):
+    st.info(f"{feature} ใช้แถวดิบใน memory → เปิดได้เมื่อ CRIMES_BACKEND=pandas (ตอนนี้ duckdb query ตรงบน Parquet)")
 
+def top_bar_before_after(counts_b: pd.Series, counts_a: pd.Series, col: str, k: int, mode: str):
+    # counts_* = ผลแบบ value_counts() (เช่นจาก filtered_counts)
+    tb, ta = analytics.top_k_compare(counts_b, counts_a, col, k, mode)
     if mode.startswith("Share"):
-        tb["Value"] = (tb["Count"] / max(tb["Count"].sum(), 1)) * 100
-        ta["Value"] = (ta["Count"] / max(ta["Count"].sum(), 1)) * 100
         x_title = "Share (%)"
         text_fmt = ".2f"
     else:
-        tb["Value"] = tb["Count"]
-        ta["Value"] = ta["Count"]
         x_title = "Count"
         text_fmt = ","
 
@@ -464,36 +866,82 @@ def top_bar_before_after(df_b: pd.DataFrame, df_a: pd.DataFrame, col: str, k: in
 
     return fig_b, fig_a
 
-def safe_rate(series: pd.Series):
-    if series.empty:
-        return 0.0
-    s = series.astype(str)
-    return float((s == "True").mean() * 100)
+def coord_box_stats(dataset: str, col: str):
+    # กรองแค่ช่วงปี (pandas) → รวม sketch รายปีที่สร้างไว้ (ไม่แตะแถวดิบ)
+    # มีตัวกรองอื่น / duckdb → สร้าง sketch จากค่าของแถวที่เลือก (engine.values) ครั้งเดียวต่อ filter (memoized)
+    if ROW_LEVEL and not any(filters.get(c) for c in schema.FILTER_COLUMNS):
+        by_year = coord_sketches.get((dataset, col))
+        if by_year is None:
+            return None
+        lo, hi = year_range
+        sketch = memoized(("sketch", dataset, col), lambda: quantiles.merge([s for y, s in by_year.items() if lo <= y <= hi]))
+    else:
+        ds = ds_before if dataset == "Before" else ds_after
+        sketch = memoized(("sketch", dataset, col), lambda: quantiles.QuantileSketch.from_values(engine.values(ds, col, filters)))
+    return sketch.box_stats()
+
+def box_from_stats(stats: dict, col: str, title: str) -> go.Figure:
+    # box trace จากค่าที่คำนวณแล้ว (payload คงที่ ไม่ขึ้นกับจำนวนแถว)
+    fig = go.Figure()
+    if stats is None:
+        fig.update_layout(title=title)
+        return fig
+    fig.add_trace(go.Box(
+        x=[col], q1=[stats["q1"]], median=[stats["median"]], q3=[stats["q3"]],
+        lowerfence=[stats["lowerfence"]], upperfence=[stats["upperfence"]],
+        name=col, boxpoints=False, showlegend=False,
+    ))
+    if len(stats["outliers"]):
+        fig.add_trace(go.Scatter(
+            x=[col] * len(stats["outliers"]), y=stats["outliers"], mode="markers",
+            marker=dict(size=4, opacity=0.6), name="Outliers", showlegend=False,
+        ))
+    fig.update_layout(title=f"{title} (n={stats['n']:,}, outliers={stats['n_outliers']:,})", yaxis_title=col)
+    return fig
+
+def row_explorer(sel: filter_index.RowSelection, key: str, columns: list):
+    # ทั้งชุดที่ตรงตัวกรอง: sort / ค้นหา / แบ่งหน้าฝั่ง server → ส่งไป browser ทีละหน้าเท่านั้น
+    with trace.stage("load_explorer", cached=True):
+        ex = load_explorer(sel.df, "After" if sel.df is df_after else "Before", data_key)
+    c1, c2, c3, c4 = st.columns([2, 1, 1, 2])
+    sort_col = c1.selectbox("เรียงตาม (Sort by)", ["-"] + columns, key=f"{key}_sort")
+    order = c2.radio("ลำดับ (Order)", ["↑", "↓"], horizontal=True, key=f"{key}_order")
+    search_cols = [c for c in explorer.SEARCH_COLUMNS if c in columns]
+    search_col = c3.selectbox("ค้นหาใน (Search in)", search_cols, key=f"{key}_search_col") if search_cols else None
+    prefix = c4.text_input("ขึ้นต้นด้วย (Prefix)", key=f"{key}_prefix").strip().upper() if search_cols else ""
+    sort = None if sort_col == "-" else sort_col
+    rows = memoized(("explore", key, sort, order, search_col, prefix), lambda: ex.rows(sel.mask, sort, order == "↑", search_col, prefix))
+
+    total = len(rows)
+    c5, c6, c7 = st.columns([1, 1, 3])
+    size = c5.selectbox("แถวต่อหน้า (Rows/page)", explorer.PAGE_SIZES, key=f"{key}_size")
+    pages = max(1, -(-total // size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages  # ชุดเล็กลงหลังเปลี่ยนตัวกรอง/ค้นหา
+    page_no = c6.number_input(f"หน้า (Page) / {pages:,}", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    offset = (int(page_no) - 1) * size
+    c7.caption(f"แถว {min(offset + 1, total):,}–{min(offset + size, total):,} จาก {total:,} (ทั้งชุดที่ตรงตัวกรอง)")
+    st.dataframe(schema.with_location(ex.page(rows, offset, size, columns)), use_container_width=True)
 
 # ------------------------------
 # TAB 1: Overview (Executive Summary)
 # ------------------------------
-with tab1:
+if active_tab == tab1:
+    kpi = memoized(("kpis",), lambda: analytics.kpis(cube_b, cube_a))
     c1, c2, c3, c4 = st.columns(4)
 
-    c1.metric("📌 จำนวนแถว (Rows) - ก่อน", f"{b.shape[0]:,}")
-    c2.metric("✅ จำนวนแถว (Rows) - หลัง", f"{a.shape[0]:,}")
+    c1.metric("📌 จำนวนแถว (Rows) - ก่อน", f"{kpi['rows_before']:,}")
+    c2.metric("✅ จำนวนแถว (Rows) - หลัง", f"{kpi['rows_after']:,}")
 
-    miss_b = int(b.isna().sum().sum())
-    miss_a = int(a.isna().sum().sum())
-    c3.metric("⚠️ Missing - ก่อน", f"{miss_b:,}")
-    c4.metric("🧼 Missing - หลัง", f"{miss_a:,}")
+    c3.metric("⚠️ Missing - ก่อน", f"{kpi['missing_before']:,}")
+    c4.metric("🧼 Missing - หลัง", f"{kpi['missing_after']:,}")
 
     st.divider()
 
     colK1, colK2, colK3, colK4 = st.columns(4)
-    arrest_rate = safe_rate(a["Arrest"]) if "Arrest" in a.columns else 0.0
-    domestic_rate = safe_rate(a["Domestic"]) if "Domestic" in a.columns else 0.0
-    has_geo = int(a.dropna(subset=["Latitude", "Longitude"]).shape[0]) if ("Latitude" in a.columns and "Longitude" in a.columns) else 0
-
-    colK1.metric("👮 Arrest Rate (After)", f"{arrest_rate:.2f}%")
-    colK2.metric("🏠 Domestic Share (After)", f"{domestic_rate:.2f}%")
-    colK3.metric("🗺️ แถวที่มีพิกัด (After)", f"{has_geo:,}")
+    colK1.metric("👮 Arrest Rate (After)", f"{kpi['arrest_rate_after']:.2f}%")
+    colK2.metric("🏠 Domestic Share (After)", f"{kpi['domestic_rate_after']:.2f}%")
+    colK3.metric("🗺️ แถวที่มีพิกัด (After)", f"{kpi['geo_rows_after']:,}")
     colK4.metric("📅 ช่วงปีที่เลือก", f"{year_range[0]}–{year_range[1]}")
 
     st.caption("หมายเหตุ: KPI จะเปลี่ยนตามตัวกรอง (Filters) เพื่อให้ตอบคำถามกรรมการได้ทันที")
@@ -502,13 +950,15 @@ with tab1:
 
     # Top Crime Types (Scale locked + labels)
     st.subheader("ประเภทคดีสูงสุด (Top Crime Types)")
-    if "Primary Type" in b.columns and "Primary Type" in a.columns:
-        fig_b, fig_a = top_bar_before_after(b, a, "Primary Type", top_k, metric_mode)
+    if in_both("Primary Type"):
+        fig_b, fig_a = top_bar_before_after(
+            filtered_counts("Before", "Primary Type"), filtered_counts("After", "Primary Type"), "Primary Type", top_k, metric_mode
+        )
         colL, colR = st.columns(2)
         with colL:
-            st.plotly_chart(fig_b, use_container_width=True)
+            show_chart(fig_b)
         with colR:
-            st.plotly_chart(fig_a, use_container_width=True)
+            show_chart(fig_a)
 
         insight_card(
             "Insight 1: คดีลักทรัพย์ (Theft) พบบ่อยที่สุด",
@@ -523,22 +973,19 @@ with tab1:
 
     # Arrest Rate (Pie)
     st.subheader("สัดส่วนการจับกุม (Arrest Rate)")
-    if "Arrest" in b.columns and "Arrest" in a.columns:
+    if in_both("Arrest"):
         colL2, colR2 = st.columns(2)
 
-        arrest_b = (b["Arrest"].value_counts(normalize=True) * 100).reset_index()
-        arrest_b.columns = ["Arrest", "Percent"]
-
-        arrest_a = (a["Arrest"].value_counts(normalize=True) * 100).reset_index()
-        arrest_a.columns = ["Arrest", "Percent"]
+        arrest_b = analytics.share_table(filtered_shares("Before", "Arrest"), "Arrest")
+        arrest_a = analytics.share_table(filtered_shares("After", "Arrest"), "Arrest")
 
         with colL2:
             fig3 = px.pie(arrest_b, values="Percent", names="Arrest", title="Before")
-            st.plotly_chart(fig3, use_container_width=True)
+            show_chart(fig3)
 
         with colR2:
             fig4 = px.pie(arrest_a, values="Percent", names="Arrest", title="After")
-            st.plotly_chart(fig4, use_container_width=True)
+            show_chart(fig4)
 
         insight_card(
             "Insight 2: อัตราการจับกุมต่ำ (Low Arrest Rate)",
@@ -553,19 +1000,11 @@ with tab1:
 
     # Trend by Year (line)
     st.subheader("แนวโน้มจำนวนคดีตามปี (Trend by Year)")
-    if "Year" in b.columns and "Year" in a.columns:
-        yb = b["Year"].value_counts().sort_index().reset_index()
-        yb.columns = ["Year", "Count"]
-        yb["Dataset"] = "Before"
-
-        ya = a["Year"].value_counts().sort_index().reset_index()
-        ya.columns = ["Year", "Count"]
-        ya["Dataset"] = "After"
-
-        yy = pd.concat([yb, ya], ignore_index=True)
+    if in_both("Year"):
+        yy = analytics.year_trend(filtered_counts("Before", "Year"), filtered_counts("After", "Year"))
         fig5 = px.line(yy, x="Year", y="Count", color="Dataset", markers=True)
         fig5.update_layout(margin=dict(l=10, r=10, t=40, b=10))
-        st.plotly_chart(fig5, use_container_width=True)
+        show_chart(fig5)
 
         insight_card(
             "Insight 5: จำนวนคดีผันผวนตามปี (Yearly Fluctuation)",
@@ -576,26 +1015,100 @@ with tab1:
     else:
         st.info("ทำกราฟแนวโน้มไม่ได้ เพราะไม่พบ Year/Date")
 
+    st.divider()
+
+    # Hour × Weekday / แนวโน้มรายวัน-สัปดาห์-เดือน จาก rollup รายชั่วโมง (ไม่ scan แถว)
+    st.subheader("รูปแบบตามเวลา (Hour × Weekday / Time Trend)")
+    if in_both(schema.TIME_KEY):
+        if ROW_LEVEL and temporal.covers(filters):
+            with trace.stage("load_time_rollup", cached=True):
+                time_rollup = load_time_rollup(full_sources(), source_paths)
+            time_table = memoized(("time_rollup",), lambda: temporal.slice_rollup(time_rollup, filters["Year"]))
+        else:
+            # ตัวกรองอื่นนอกจากช่วงปี / duckdb → rollup ของแถวที่เลือกผ่าน backend (นับคีย์จำนวนเต็มครั้งเดียว)
+            time_table = memoized(("time_rollup",), lambda: temporal.merge_partials([
+                engine.time_rollup(ds_before, "Before", filters),
+                engine.time_rollup(ds_after, "After", filters),
+            ]))
+
+        colT1, colT2 = st.columns(2)
+        for col_ui, name in [(colT1, "Before"), (colT2, "After")]:
+            heat = memoized(("time_heatmap", name), lambda: temporal.heatmap(temporal.slice_rollup(time_table, dataset=name)))
+            fig_heat = px.imshow(heat, aspect="auto", title=name, labels=dict(x="Hour", y="Weekday", color="Count"))
+            fig_heat.update_layout(margin=dict(l=10, r=10, t=40, b=10))
+            with col_ui:
+                show_chart(fig_heat)
+
+        grain = st.radio("ความละเอียด (Granularity)", ["Day", "Week", "Month", "Year"], horizontal=True)
+        tt = memoized(("time_trend", grain), lambda: temporal.trend(time_table, grain))
+        fig_tt = px.line(tt, x=grain, y="Count", color="Dataset", render_mode="webgl")
+        fig_tt.update_layout(margin=dict(l=10, r=10, t=40, b=10))
+        show_chart(fig_tt)
+    else:
+        st.info("ทำกราฟตามเวลาไม่ได้ เพราะไม่พบ Date")
+
 # ------------------------------
 # TAB 2: Data Quality
 # ------------------------------
-with tab2:
+if active_tab == tab2:
     st.subheader("Missing ต่อคอลัมน์ (Missing by Column)")
     st.caption("แสดง Top 15 เพื่อชี้คอลัมน์ที่ควรจัดการก่อน (Prioritize fields)")
 
     colQ1, colQ2 = st.columns(2)
 
     with colQ1:
-        miss_col_b = (b.isna().mean() * 100).sort_values(ascending=False).head(15).reset_index()
-        miss_col_b.columns = ["Column", "MissingPercent"]
+        miss_col_b = analytics.missing_percent(memoized(("missing", "Before"), lambda: engine.missing_counts(ds_before, filters)), rows_b)
         fig6 = px.bar(miss_col_b, x="MissingPercent", y="Column", orientation="h", title="Before (Top 15)")
-        st.plotly_chart(fig6, use_container_width=True)
+        show_chart(fig6)
 
     with colQ2:
-        miss_col_a = (a.isna().mean() * 100).sort_values(ascending=False).head(15).reset_index()
-        miss_col_a.columns = ["Column", "MissingPercent"]
+        miss_col_a = analytics.missing_percent(memoized(("missing", "After"), lambda: engine.missing_counts(ds_after, filters)), rows_a)
         fig7 = px.bar(miss_col_a, x="MissingPercent", y="Column", orientation="h", title="After (Top 15)")
-        st.plotly_chart(fig7, use_container_width=True)
+        show_chart(fig7)
+
+    st.divider()
+
+    st.subheader("ข้อมูลซ้ำ (Duplicates: Case Number + Date + IUCR)")
+    st.caption(
+        f"Exact = Case Number + Date + IUCR ตรงกันทุกค่า · Near = (หลังตัดสำเนา exact) Case Number เดียวกันที่เรียงตามเวลาแล้ว "
+        f"ห่างจากแถวก่อนหน้าไม่เกิน {duplicates.NEAR_MINUTES} นาที ต่อกันเป็นกลุ่มเดียว (ทั้งกลุ่มอาจยาวเกิน {duplicates.NEAR_MINUTES} นาที) · "
+        "ตรวจทั้งชุดครั้งเดียว แล้วแสดงตามช่วงปีและ District ที่เลือก (จำนวน = แถวส่วนเกินจากแถวแรกของกลุ่ม)"
+    )
+    if not ROW_LEVEL:
+        row_level_notice("การตรวจแถวซ้ำ")
+    else:
+        with trace.stage("load_duplicates", cached=True):
+            dup_summary = load_duplicates(full_sources(), source_paths)
+        dup_b = memoized(("dups", "Before"), lambda: duplicates.slice_summary(dup_summary, filters, "Before"))
+        dup_a = memoized(("dups", "After"), lambda: duplicates.slice_summary(dup_summary, filters, "After"))
+        tot_b, tot_a = duplicates.totals(dup_b), duplicates.totals(dup_a)
+
+        d1, d2, d3, d4 = st.columns(4)
+        d1.metric("🧬 Exact ซ้ำ - ก่อน", f"{tot_b['ExactRows']:,}", help=f"{tot_b['ExactGroups']:,} กลุ่ม")
+        d2.metric("🧬 Exact ซ้ำ - หลัง", f"{tot_a['ExactRows']:,}", help=f"{tot_a['ExactGroups']:,} กลุ่ม")
+        d3.metric("⏱️ Near ซ้ำ - ก่อน", f"{tot_b['NearRows']:,}", help=f"{tot_b['NearGroups']:,} กลุ่ม")
+        d4.metric("⏱️ Near ซ้ำ - หลัง", f"{tot_a['NearRows']:,}", help=f"{tot_a['NearGroups']:,} กลุ่ม")
+
+        if tot_b["ExactRows"] + tot_b["NearRows"] + tot_a["ExactRows"] + tot_a["NearRows"] == 0:
+            st.info("ไม่พบแถวซ้ำในช่วงที่เลือก")
+        else:
+            dup_year = pd.concat([
+                duplicates.by(dup_b, "Year").assign(Dataset="Before"),
+                duplicates.by(dup_a, "Year").assign(Dataset="After"),
+            ], ignore_index=True)
+            fig_dup = px.bar(dup_year, x="Year", y=["ExactRows", "NearRows"], facet_col="Dataset", title="แถวซ้ำตามปี (Duplicates by Year)")
+            show_chart(fig_dup)
+
+            if "District" in dup_summary.columns:
+                dup_district = pd.concat([
+                    duplicates.by(dup_b, "District").assign(Dataset="Before"),
+                    duplicates.by(dup_a, "District").assign(Dataset="After"),
+                ], ignore_index=True)
+                st.dataframe(
+                    dup_district.sort_values(["Dataset", "ExactRows", "NearRows"], ascending=[False, False, False]),
+                    use_container_width=True,
+                    hide_index=True,
+                )
 
     st.divider()
 
@@ -603,52 +1116,57 @@ with tab2:
     st.caption("ใช้ Box plot (กล่องสถิติ) เพื่อชี้ค่าที่หลุดช่วง และช่วยตัดสินใจกรองก่อนทำแผนที่ (Map)")
 
     cols = st.columns(2)
-    if "Latitude" in b.columns and "Latitude" in a.columns:
+    if in_both("Latitude"):
         with cols[0]:
-            fig8 = px.box(b, y="Latitude", title="Latitude - Before")
-            st.plotly_chart(fig8, use_container_width=True)
+            fig8 = box_from_stats(coord_box_stats("Before", "Latitude"), "Latitude", "Latitude - Before")
+            show_chart(fig8)
         with cols[1]:
-            fig9 = px.box(a, y="Latitude", title="Latitude - After")
-            st.plotly_chart(fig9, use_container_width=True)
+            fig9 = box_from_stats(coord_box_stats("After", "Latitude"), "Latitude", "Latitude - After")
+            show_chart(fig9)
 
     cols2 = st.columns(2)
-    if "Longitude" in b.columns and "Longitude" in a.columns:
+    if in_both("Longitude"):
         with cols2[0]:
-            fig10 = px.box(b, y="Longitude", title="Longitude - Before")
-            st.plotly_chart(fig10, use_container_width=True)
+            fig10 = box_from_stats(coord_box_stats("Before", "Longitude"), "Longitude", "Longitude - Before")
+            show_chart(fig10)
         with cols2[1]:
-            fig11 = px.box(a, y="Longitude", title="Longitude - After")
-            st.plotly_chart(fig11, use_container_width=True)
+            fig11 = box_from_stats(coord_box_stats("After", "Longitude"), "Longitude", "Longitude - After")
+            show_chart(fig11)
 
     st.divider()
 
     st.subheader("ชุดข้อมูลสำหรับทำแผนที่ (Map-ready subset)")
-    if "Latitude" in a.columns and "Longitude" in a.columns:
-        map_df = a.dropna(subset=["Latitude", "Longitude"]).copy()
-        st.write(f"จำนวนแถวที่มีพิกัดพร้อมใช้: **{map_df.shape[0]:,}** จาก **{a.shape[0]:,}**")
+    if not ROW_LEVEL:
+        row_level_notice("ตารางแถวที่มีพิกัด")
+    elif in_after("Latitude", "Longitude"):
+        map_df = a.intersect(spatial_after.valid_mask)
+        st.write(f"จำนวนแถวที่มีพิกัดพร้อมใช้: **{len(map_df):,}** จาก **{len(a):,}**")
         st.caption("แนวทาง: ไม่ลบจากชุดหลัก แต่กรองเฉพาะตอนทำแผนที่ (Map-only filtering)")
-        cols_show = [c for c in ["Date", "Primary Type", "Location Description", "Latitude", "Longitude"] if c in map_df.columns]
-        st.dataframe(map_df[cols_show].head(20), use_container_width=True)
+        cols_show = [c for c in ["Date", "Primary Type", "Location Description", "Block", "Description", "Latitude", "Longitude"] if c in map_df.columns]
+        row_explorer(map_df, "map_rows", cols_show)
     else:
         st.info("ไม่มีคอลัมน์ Latitude/Longitude ในไฟล์ clean")
 
 # ------------------------------
 # TAB 3: Exploration (Add Hotspot Map)
 # ------------------------------
-with tab3:
+if active_tab == tab3:
     st.subheader("คดีตามพื้นที่ (District / Community Area / Ward)")
 
-    available_dims = [c for c in ["District", "Community Area", "Ward"] if (c in b.columns and c in a.columns)]
+    available_dims = [c for c in ["District", "Community Area", "Ward"] if in_both(c)]
     if not available_dims:
         st.warning("ไม่พบคอลัมน์ District/Community Area/Ward ที่ตรงกันทั้ง Before และ After")
     else:
         pick = st.selectbox("เลือกมิติพื้นที่ (Location Dimension)", available_dims)
         colE1, colE2 = st.columns(2)
 
-        top_loc_b = b[pick].value_counts().head(15).reset_index()
-        top_loc_b.columns = [pick, "Count"]
-        top_loc_a = a[pick].value_counts().head(15).reset_index()
-        top_loc_a.columns = [pick, "Count"]
+        if pick in cube.CUBE_DIMS:
+            cnt_b, cnt_a = filtered_counts("Before", pick), filtered_counts("After", pick)
+        else:
+            cnt_b = memoized(("value_counts", "Before", pick), lambda: engine.value_counts(ds_before, pick, filters))
+            cnt_a = memoized(("value_counts", "After", pick), lambda: engine.value_counts(ds_after, pick, filters))
+        top_loc_b = analytics.top_table(cnt_b, pick)
+        top_loc_a = analytics.top_table(cnt_a, pick)
 
         fig12 = px.bar(top_loc_b, x="Count", y=pick, orientation="h", title=f"{pick} - Before (Top 15)", text="Count")
         fig12.update_traces(texttemplate="%{text:,}", textposition="outside")
@@ -661,21 +1179,18 @@ with tab3:
             fig13.update_xaxes(range=[0, max_x * 1.10])
 
         with colE1:
-            st.plotly_chart(fig12, use_container_width=True)
+            show_chart(fig12)
         with colE2:
-            st.plotly_chart(fig13, use_container_width=True)
+            show_chart(fig13)
 
     st.divider()
 
     st.subheader("จุดเกิดเหตุ (Location Description) Top 15")
-    if "Location Description" in b.columns and "Location Description" in a.columns:
+    if in_both("Location Description"):
         colLD1, colLD2 = st.columns(2)
 
-        ld_b = b["Location Description"].fillna("UNKNOWN").value_counts().head(15).reset_index()
-        ld_b.columns = ["Location Description", "Count"]
-
-        ld_a = a["Location Description"].fillna("UNKNOWN").value_counts().head(15).reset_index()
-        ld_a.columns = ["Location Description", "Count"]
+        ld_b = analytics.top_table(filtered_counts("Before", "Location Description", fill="UNKNOWN"), "Location Description")
+        ld_a = analytics.top_table(filtered_counts("After", "Location Description", fill="UNKNOWN"), "Location Description")
 
         fig_ld1 = px.bar(ld_b, x="Count", y="Location Description", orientation="h", title="Before (Top 15)", text="Count")
         fig_ld1.update_traces(texttemplate="%{text:,}", textposition="outside")
@@ -689,9 +1204,9 @@ with tab3:
             fig_ld2.update_xaxes(range=[0, max_x2 * 1.10])
 
         with colLD1:
-            st.plotly_chart(fig_ld1, use_container_width=True)
+            show_chart(fig_ld1)
         with colLD2:
-            st.plotly_chart(fig_ld2, use_container_width=True)
+            show_chart(fig_ld2)
 
         insight_card(
             "Insight 4: จุดเกิดเหตุสูงสุดคือถนน (STREET)",
@@ -704,22 +1219,57 @@ with tab3:
 
     st.divider()
 
+    st.subheader("ค่าที่พบบ่อย (Top Block / Description / IUCR)")
+    hh_cols = [c for c in heavy_hitters.HH_COLUMNS if in_both(c)]
+    if hh_cols:
+        hh_pick = st.selectbox("เลือกคอลัมน์ (Column)", hh_cols)
+        if ROW_LEVEL and heavy_hitters.covers(filters):
+            # รวมรายการ Top-K ของ partition (ปี × เขต) ที่ตรงตัวกรอง ไม่ต้อง scan แถว
+            with trace.stage("load_partition_top_k", cached=True):
+                tops = load_partition_top_k(full_sources(), source_paths)
+            hh_b, bound_b = memoized(("topk", "Before", hh_pick), lambda: heavy_hitters.top_k(tops, hh_pick, filters, "Before", 15))
+            hh_a, bound_a = memoized(("topk", "After", hh_pick), lambda: heavy_hitters.top_k(tops, hh_pick, filters, "After", 15))
+            st.caption(
+                f"รวมจากรายการ Top-{heavy_hitters.CAPACITY} ที่นับจริงแล้วตัดไว้ต่อ partition (ปี × เขต) · "
+                f"error bar = จำนวนที่อาจขาดไปจากค่าที่ถูกตัดใน partition อื่น (ขอบบน ไม่ใช่ค่าคลาดเคลื่อนเชิงสถิติ) · "
+                f"ค่าที่ไม่อยู่ในรายการมีไม่เกิน {bound_b:,} (Before) / {bound_a:,} (After) แถว"
+            )
+        else:
+            # ตัวกรองอื่นนอกจากปี/เขต / duckdb → value counts ของแถวที่เลือกผ่าน backend (ค่าจริง)
+            hh_b, bound_b = memoized(("topk_exact", "Before", hh_pick), lambda: heavy_hitters.exact_top_k(engine.value_counts(ds_before, hh_pick, filters), hh_pick, 15))
+            hh_a, bound_a = memoized(("topk_exact", "After", hh_pick), lambda: heavy_hitters.exact_top_k(engine.value_counts(ds_after, hh_pick, filters), hh_pick, 15))
+            st.caption("นับจากแถวที่ตรงตัวกรองทั้งหมด (ค่าจริง)")
+
+        max_x3 = float(max(hh_b["Max"].max(), hh_a["Max"].max())) if (len(hh_b) and len(hh_a)) else None
+        colH1, colH2 = st.columns(2)
+        for col_ui, table, title in [(colH1, hh_b, "Before (Top 15)"), (colH2, hh_a, "After (Top 15)")]:
+            fig_hh = px.bar(
+                table.assign(NoError=0), x="Count", y=hh_pick, orientation="h", title=title,
+                error_x="Error", error_x_minus="NoError", text="Count",
+            )
+            fig_hh.update_traces(texttemplate="%{text:,}", textposition="inside")
+            if max_x3 is not None:
+                fig_hh.update_xaxes(range=[0, max_x3 * 1.10])
+            with col_ui:
+                show_chart(fig_hh)
+    else:
+        st.info("ไม่พบคอลัมน์ Block/Description/IUCR")
+
+    st.divider()
+
     st.subheader("คดีในครอบครัว vs นอกครอบครัว (Domestic vs Non-Domestic)")
-    if "Domestic" in b.columns and "Domestic" in a.columns:
+    if in_both("Domestic"):
         colD1, colD2 = st.columns(2)
 
-        dom_b = (b["Domestic"].value_counts(normalize=True) * 100).reset_index()
-        dom_b.columns = ["Domestic", "Percent"]
-
-        dom_a = (a["Domestic"].value_counts(normalize=True) * 100).reset_index()
-        dom_a.columns = ["Domestic", "Percent"]
+        dom_b = analytics.share_table(filtered_shares("Before", "Domestic"), "Domestic")
+        dom_a = analytics.share_table(filtered_shares("After", "Domestic"), "Domestic")
 
         with colD1:
             fig_dom1 = px.pie(dom_b, values="Percent", names="Domestic", title="Before")
-            st.plotly_chart(fig_dom1, use_container_width=True)
+            show_chart(fig_dom1)
         with colD2:
             fig_dom2 = px.pie(dom_a, values="Percent", names="Domestic", title="After")
-            st.plotly_chart(fig_dom2, use_container_width=True)
+            show_chart(fig_dom2)
 
         insight_card(
             "Insight 3: คดีส่วนใหญ่เป็นนอกครอบครัว (Non-Domestic)",
@@ -735,46 +1285,94 @@ with tab3:
     st.subheader("แผนที่จุดเสี่ยง (Hotspot Map)")
     st.caption("แสดงเฉพาะแถวที่มี Latitude/Longitude (OpenStreetMap ไม่ต้องใช้ token)")
 
-    if "Latitude" in a.columns and "Longitude" in a.columns:
-        map_df = a.dropna(subset=["Latitude", "Longitude"]).copy()
-        map_df = map_df[(map_df["Latitude"].between(-90, 90)) & (map_df["Longitude"].between(-180, 180))]
-
-        # จำกัดจำนวนจุดเพื่อให้แผนที่ลื่น (competition usability)
-        max_points = 3000
-        if map_df.shape[0] > max_points:
-            map_df = map_df.sample(max_points, random_state=42)
-
-        hover_cols = [c for c in ["Primary Type", "Location Description", "Date", "District"] if c in map_df.columns]
-        fig_map = px.scatter_mapbox(
-            map_df,
-            lat="Latitude",
-            lon="Longitude",
-            hover_data=hover_cols,
-            zoom=9,
-            height=520,
+    if not ROW_LEVEL:
+        row_level_notice("แผนที่และการค้นหารอบจุด")
+    elif in_after("Latitude", "Longitude"):
+        colM1, colM2 = st.columns([2, 1])
+        map_mode = colM1.radio(
+            "รูปแบบแผนที่ (Map Mode)",
+            options=["ความหนาแน่น (Density Grid)", "จุดตัวอย่าง (Sample Points)"],
+            horizontal=True,
         )
+        map_zoom = colM2.slider("ระดับซูม (Zoom)", 8, 15, 9)
+
+        if map_mode.startswith("ความหนาแน่น"):
+            # นับทุกแถวที่มีพิกัดเป็นช่องกริดฝั่ง server → payload มีขนาดจำกัดตามจำนวนช่อง
+            geo_rows = a.intersect(spatial_after.valid_mask)
+            cells = memoized(
+                ("density", "After", map_zoom),
+                lambda: geo.density_grid(geo_rows["Latitude"].to_numpy(), geo_rows["Longitude"].to_numpy(), map_zoom),
+            )
+            st.caption(f"รวม **{int(cells['Count'].sum()):,}** แถวเป็น **{len(cells):,}** ช่องกริด (Grid cells)")
+            fig_map = px.density_mapbox(
+                cells,
+                lat="Latitude",
+                lon="Longitude",
+                z="Count",
+                radius=geo.CELL_PX,
+                hover_data={"Count": ":,"},
+                zoom=map_zoom,
+                height=520,
+            )
+        else:
+            hover_cols = [c for c in ["Primary Type", "Location Description", "Date", "District"] if c in a.columns]
+            map_df = a.intersect(spatial_after.valid_mask)[["Latitude", "Longitude"] + hover_cols]
+
+            # จำกัดจำนวนจุดเพื่อให้แผนที่ลื่น (competition usability)
+            max_points = 3000
+            if map_df.shape[0] > max_points:
+                map_df = map_df.sample(max_points, random_state=42)
+
+            fig_map = px.scatter_mapbox(
+                map_df,
+                lat="Latitude",
+                lon="Longitude",
+                hover_data=hover_cols,
+                zoom=map_zoom,
+                height=520,
+            )
         fig_map.update_layout(mapbox_style="open-street-map", margin=dict(l=10, r=10, t=10, b=10))
-        st.plotly_chart(fig_map, use_container_width=True)
+        show_chart(fig_map)
+
+        with st.expander("ค้นหารอบจุด (Radius Search)"):
+            colR1, colR2, colR3 = st.columns(3)
+            r_lat = colR1.number_input("Latitude", value=41.8781, format="%.5f")
+            r_lon = colR2.number_input("Longitude", value=-87.6298, format="%.5f")
+            r_m = colR3.number_input("รัศมี (เมตร)", min_value=50, max_value=5000, value=500, step=50)
+
+            # ใช้ spatial index → แตะเฉพาะช่องกริดรอบจุด แล้วตัดด้วยตัวกรองปัจจุบัน
+            near_rows, near_dist = spatial_after.radius_rows(r_lat, r_lon, r_m)
+            if a.mask is not None:
+                keep = a.mask[near_rows]
+                near_rows, near_dist = near_rows[keep], near_dist[keep]
+            st.write(f"พบ **{len(near_rows):,}** คดีภายใน **{r_m:,}** เมตร (ตามตัวกรองปัจจุบัน)")
+            if len(near_rows):
+                near_cols = [c for c in ["Date", "Primary Type", "Location Description", "Block", "Latitude", "Longitude"] if c in a.columns]
+                near_df = df_after.iloc[near_rows][near_cols].assign(**{"Distance (m)": near_dist.round(1)})
+                st.dataframe(near_df.sort_values("Distance (m)").head(50), use_container_width=True)
     else:
         st.info("ไม่มีคอลัมน์ Latitude/Longitude ในไฟล์ clean")
 
     st.divider()
 
-    st.subheader("ตารางตัวอย่าง (Sample Table) - After")
-    st.dataframe(a.head(50), use_container_width=True)
+    st.subheader("สำรวจแถวข้อมูล (Row Explorer) - After")
+    if ROW_LEVEL:
+        row_explorer(a, "rows_after", [c for c in a.columns if c != schema.TIME_KEY])
+    else:
+        row_level_notice("Row Explorer")
 
 # ------------------------------
 # TAB 4: Cleaning Process (คงของเดิม + ปรับให้ยืดหยุ่น)
 # ------------------------------
-with tab4:
+if active_tab == tab4:
     st.header("ขั้นตอนการจัดการข้อมูล (Data Cleaning Process)")
 
     st.markdown("### 1) สรุปภาพรวมก่อน–หลัง (Before vs After)")
     colP1, colP2, colP3, colP4 = st.columns(4)
-    colP1.metric("ก่อน: จำนวนแถว (Rows)", f"{df_before.shape[0]:,}")
-    colP2.metric("ก่อน: จำนวนฟีเจอร์ (Features)", f"{df_before.shape[1]:,}")
-    colP3.metric("หลัง: จำนวนแถว (Rows)", f"{df_after.shape[0]:,}")
-    colP4.metric("หลัง: จำนวนฟีเจอร์ (Features)", f"{df_after.shape[1]:,}")
+    colP1.metric("ก่อน: จำนวนแถว (Rows)", f"{profile_before['rows']:,}")
+    colP2.metric("ก่อน: จำนวนฟีเจอร์ (Features)", f"{len(profile_before['columns']):,}")
+    colP3.metric("หลัง: จำนวนแถว (Rows)", f"{profile_after['rows']:,}")
+    colP4.metric("หลัง: จำนวนฟีเจอร์ (Features)", f"{len(profile_after['columns']):,}")
     st.caption("หมายเหตุ: หลังทำความสะอาดมีการตัดฟีเจอร์ที่ missing สูงมากออก (Ward, Community Area)")
 
     st.divider()
@@ -783,7 +1381,7 @@ with tab4:
     st.markdown(
         """
 - ตรวจสอบข้อมูลขาดหาย (Missing values) พบว่าบางฟีเจอร์มี missing สูงมาก เช่น **Ward (~69%)** และ **Community Area (~68%)**
-- ตรวจสอบข้อมูลซ้ำ (Duplicates) (แนะนำ: ตรวจ Case Number + Date + IUCR เพื่อความมั่นใจ)
+- ตรวจสอบข้อมูลซ้ำ (Duplicates) (ตรวจ Case Number + Date + IUCR แบบ exact/near → ดูผลในแท็บ Data Quality)
 - สรุป: จำเป็นต้องทำความสะอาดข้อมูลก่อนวิเคราะห์ เพื่อให้ผลลัพธ์น่าเชื่อถือและตรวจสอบย้อนกลับได้
 """
     )
@@ -820,6 +1418,7 @@ Latitude/Longitude/Location หาก missing ให้กรองเฉพา
 - Arrest / Domestic → Boolean (True/False)
 - Beat / District → Integer (รหัสพื้นที่)
 - Year → คำนวณจาก Date และใช้กรองช่วงปี
+- TimeKey → ชั่วโมงนับจาก 1970-01-01 (จำนวนเต็ม) ใช้สรุปตามชั่วโมง/วัน/สัปดาห์/เดือน
 - Latitude/Longitude → ตรวจช่วงค่า (Latitude: -90..90, Longitude: -180..180) เพื่อกันค่าหลุดช่วง
 """
     )
@@ -836,7 +1435,73 @@ Latitude/Longitude/Location หาก missing ให้กรองเฉพา
 
     st.divider()
 
-    st.markdown("### 6) Insight สรุปจากข้อมูล (Evidence-based Insights)")
+    st.markdown("### 6) ตรวจสอบรายแถว (Row-level Before/After Diff)")
+    # partitioned: โหลดเฉพาะ partition ของช่วงปีที่เลือก → เทียบได้แค่ช่วงนั้น
+    if STORAGE_MODE == "partitioned":
+        diff_scope = f"เฉพาะช่วงปี {year_range[0]}–{year_range[1]} ที่โหลดไว้ ไม่ขึ้นกับตัวกรองอื่น"
+    else:
+        diff_scope = "ทั้งชุด ไม่ขึ้นกับตัวกรอง"
+    st.caption(f"จับคู่แถวด้วย ID (หรือ Case Number + Date + IUCR) → แถวที่ถูกลบ / คงไว้ / ถูกแก้ค่า และจำนวนค่าที่เปลี่ยนต่อคอลัมน์ ({diff_scope})")
+    row_diff = None
+    if not ROW_LEVEL:
+        row_level_notice("การเทียบรายแถว")
+    else:
+        try:
+            with st.spinner("กำลังเทียบข้อมูลรายแถว..."):
+                with trace.stage("load_diff", cached=True) as span:
+                    row_diff = load_diff(df_before, df_after, data_key)
+                    span["rows"] = row_diff.before_rows + row_diff.after_rows
+                    span["bytes"] = row_diff.nbytes
+        except ValueError as e:
+            st.warning(str(e))
+
+    if row_diff is not None:
+        summary = row_diff.summary()
+        colD1, colD2, colD3, colD4 = st.columns(4)
+        colD1.metric("แถวที่ถูกลบ (Dropped)", f"{summary['dropped']:,}")
+        colD2.metric("แถวที่คงไว้ (Kept)", f"{summary['kept']:,}")
+        colD3.metric("แถวที่ถูกแก้ค่า (Modified)", f"{summary['modified']:,}")
+        colD4.metric("แถวใหม่ใน After (Added)", f"{summary['added']:,}")
+        st.caption(
+            f"Key: {summary['key']} · key ซ้ำ: ก่อน {summary['duplicates_before']:,} / หลัง {summary['duplicates_after']:,} แถว"
+        )
+
+        changes = row_diff.column_changes
+        changes = changes[changes["changed"] > 0]
+        colC1, colC2 = st.columns(2)
+        with colC1:
+            st.markdown("**ค่าที่เปลี่ยนต่อคอลัมน์ (Changes per Column)**")
+            if changes.empty:
+                st.info("ไม่มีค่าที่เปลี่ยนในแถวที่คงไว้")
+            else:
+                st.dataframe(
+                    changes.rename(columns={
+                        "column": "ฟีเจอร์ (Feature)",
+                        "changed": "เปลี่ยน (Changed)",
+                        "filled": "ว่าง→มีค่า (Filled)",
+                        "cleared": "มีค่า→ว่าง (Cleared)",
+                        "changed_%": "เปลี่ยน (%)",
+                    }),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+        with colC2:
+            st.markdown("**ค่าว่างในแถวที่ถูกลบ (Missing in Dropped Rows)**")
+            if row_diff.dropped_missing.empty:
+                st.info("ไม่มีแถวที่ถูกลบ หรือแถวที่ถูกลบไม่มีค่าว่าง")
+            else:
+                dropped_missing = row_diff.dropped_missing.rename("จำนวน (Count)").rename_axis("ฟีเจอร์ (Feature)").reset_index()
+                st.dataframe(dropped_missing, use_container_width=True, hide_index=True)
+
+        with st.expander("ตัวอย่างแถว (Sample Rows)"):
+            st.markdown("**แถวที่ถูกลบ (Dropped)**")
+            st.dataframe(schema.with_location(row_diff.dropped_rows(df_before, 50)), use_container_width=True)
+            st.markdown("**แถวที่ถูกแก้ค่า (Modified: Before → After)**")
+            st.dataframe(row_diff.modified_rows(df_before, df_after, 50), use_container_width=True)
+
+    st.divider()
+
+    st.markdown("### 7) Insight สรุปจากข้อมูล (Evidence-based Insights)")
     st.caption("สรุปแบบ What → So What → Now What เพื่อใช้ในสไลด์/ตอบกรรมการ")
 
     insight_card(
@@ -873,36 +1538,36 @@ Latitude/Longitude/Location หาก missing ให้กรองเฉพา
 # ------------------------------
 # TAB 5: Data Dictionary
 # ------------------------------
-with tab5:
+if active_tab == tab5:
     st.header("พจนานุกรมข้อมูล (Data Dictionary)")
     st.caption("อธิบายว่าฟีเจอร์เก็บข้อมูลอะไร และชนิดข้อมูล (Data type) ก่อน–หลัง")
 
-    dd = build_data_dictionary(df_before, df_after)
+    dd = memoized_static(("data_dictionary",), lambda: analytics.build_data_dictionary(profile_before, profile_after))
     st.dataframe(dd, use_container_width=True, height=520)
 
     st.divider()
 
     st.subheader("สรุปขนาดข้อมูล (Dataset Size Summary)")
     colS1, colS2, colS3, colS4 = st.columns(4)
-    colS1.metric("ก่อน: แถว (Rows)", f"{df_before.shape[0]:,}")
-    colS2.metric("ก่อน: ฟีเจอร์ (Columns)", f"{df_before.shape[1]:,}")
-    colS3.metric("หลัง: แถว (Rows)", f"{df_after.shape[0]:,}")
-    colS4.metric("หลัง: ฟีเจอร์ (Columns)", f"{df_after.shape[1]:,}")
+    colS1.metric("ก่อน: แถว (Rows)", f"{profile_before['rows']:,}")
+    colS2.metric("ก่อน: ฟีเจอร์ (Columns)", f"{len(profile_before['columns']):,}")
+    colS3.metric("หลัง: แถว (Rows)", f"{profile_after['rows']:,}")
+    colS4.metric("หลัง: ฟีเจอร์ (Columns)", f"{len(profile_after['columns']):,}")
 
     st.info(
-        f"หลังจัดการ Missing แล้ว จำนวนข้อมูลเปลี่ยนจาก **{df_before.shape[0]:,} แถว** → "
-        f"**{df_after.shape[0]:,} แถว** (ลดลง **{df_before.shape[0] - df_after.shape[0]:,} แถว**) "
-        f"และจำนวนฟีเจอร์จาก **{df_before.shape[1]}** → **{df_after.shape[1]}**"
+        f"หลังจัดการ Missing แล้ว จำนวนข้อมูลเปลี่ยนจาก **{profile_before['rows']:,} แถว** → "
+        f"**{profile_after['rows']:,} แถว** (ลดลง **{profile_before['rows'] - profile_after['rows']:,} แถว**) "
+        f"และจำนวนฟีเจอร์จาก **{len(profile_before['columns'])}** → **{len(profile_after['columns'])}**"
     )
 
 # ------------------------------
 # TAB 6: Missing Compare
 # ------------------------------
-with tab6:
+if active_tab == tab6:
     st.header("เปรียบเทียบ Missing ก่อน–หลัง (Missing Comparison)")
     st.caption("แสดงจำนวน (Count) และร้อยละ (%) ของ Missing ก่อนจัดการ vs หลังจัดการ")
 
-    miss_cmp = build_missing_compare(df_before, df_after)
+    miss_cmp = memoized_static(("missing_compare",), lambda: analytics.build_missing_compare(profile_before, profile_after))
     st.dataframe(miss_cmp, use_container_width=True, height=520)
 
     st.divider()
@@ -924,6 +1589,14 @@ with tab6:
 """
     )
 
+# ------------------------------
+# Result cache stats (sidebar)
+# ------------------------------
+cache_stats = memo.stats()
+st.sidebar.caption(
+    f"Result cache: {cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses "
+    f"({cache_stats['hit_rate']:.0f}%) · {cache_stats['entries']:,} entries · "
+    f"{cache_stats['bytes'] / 1e6:.1f}/{cache_stats['max_bytes'] / 1e6:.0f} MB"
+)
 
-
-
+finish_trace()
@@ -0,0 +1,299 @@
+# backend.py
+# ==============================
+# Query backend (pandas / DuckDB)
+# ==============================
+# ชั้นเดียวใต้ data layer: เปิดชุดข้อมูล, กรอง, และ aggregate ที่ analytics / app ใช้
+# (cube, profile, missing counts, value counts, rollup เวลา, ค่าคอลัมน์ของแถวที่เลือก)
+# - pandas (ค่าเริ่มต้น): Arrow store ใน memory map + FilterIndex + parallel process pool (ของเดิม)
+# - duckdb: query ตรงบนไฟล์ Parquet ในเครื่อง (vectorized, multi-thread, spill ลงดิสก์เมื่อเกิน memory_limit)
+#   → ไม่โหลดทั้งชุดเข้า pandas; ผลลัพธ์ (cube / counts / profile) มีรูปเดียวกับ pandas backend
+#   คอลัมน์เวลา (Year / TimeKey) คำนวณใน view แบบเดียวกับ temporal.prep
+#
+#   CRIMES_BACKEND=duckdb  CRIMES_DUCKDB_MEMORY=4GB  CRIMES_DUCKDB_THREADS=4
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import cube
+import data_cache
+import dataset_store
+import filter_index
+import parallel
+import result_cache
+import schema
+import temporal
+
+try:
+    import duckdb
+except ImportError:  # ไม่ได้ติดตั้ง → ใช้ได้เฉพาะ pandas
+    duckdb = None
+
+BACKENDS = ["pandas", "duckdb"]
+BACKEND = os.environ.get("CRIMES_BACKEND", "pandas")
+DUCKDB_MEMORY = os.environ.get("CRIMES_DUCKDB_MEMORY", "")
+DUCKDB_THREADS = int(os.environ.get("CRIMES_DUCKDB_THREADS", "0"))
+DUCKDB_TEMP_DIR = os.path.join(data_cache.CACHE_DIR, "duckdb_tmp")
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get(name: str = None):
+    # backend เดียวต่อชื่อต่อ process
+    name = name or BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"unknown backend: {name} (ใช้ได้: {', '.join(BACKENDS)})")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = PandasBackend() if name == "pandas" else DuckDBBackend()
+        return _backends[name]
+
+
+# ------------------------------
+# pandas
+# ------------------------------
+class PandasDataset:
+    def __init__(self, parquet_path: str, df: pd.DataFrame, sources: list = None, index: filter_index.FilterIndex = None):
+        self.path = parquet_path
+        self.df = df
+        self._sources = sources
+        self._index = index
+        self._last_select = None  # (filter key, RowSelection) ล่าสุด
+
+    @property
+    def index(self) -> filter_index.FilterIndex:
+        if self._index is None:
+            self._index = filter_index.FilterIndex(self.df)
+        return self._index
+
+    def sources(self) -> list:
+        # partition ตามช่วงแถวของ Arrow store สำหรับ parallel (worker อ่านไฟล์เอง)
+        if self._sources is None:
+            self._sources = parallel.arrow_sources(dataset_store.arrow_path(self.path, temporal.PREP_VERSION), len(self.df))
+        return self._sources
+
+
+class PandasBackend:
+    name = "pandas"
+
+    def open(self, parquet_path: str, df: pd.DataFrame = None, sources: list = None, index: filter_index.FilterIndex = None) -> PandasDataset:
+        # df / index = frame และ FilterIndex ที่เปิดไว้แล้ว (เช่นจาก load_data / load_index ของ app) → ไม่สร้างซ้ำ
+        if df is None:
+            df = dataset_store.open_shared(parquet_path, temporal.prep, temporal.PREP_VERSION)
+        return PandasDataset(parquet_path, df, sources, index)
+
+    def select(self, ds: PandasDataset, filters: dict = None) -> filter_index.RowSelection:
+        # rows / missing / value counts ของตัวกรองเดียวกันเรียกต่อกัน → ใช้ selection ล่าสุดซ้ำ
+        key = result_cache.filter_key(filters or {})
+        last = ds._last_select
+        if last is not None and last[0] == key:
+            return last[1]
+        sel = ds.index.select(filters or {})
+        ds._last_select = (key, sel)
+        return sel
+
+    def rows(self, ds: PandasDataset, filters: dict = None) -> int:
+        return len(self.select(ds, filters)) if filters else len(ds.df)
+
+    def build_cube(self, ds: PandasDataset, dataset: str) -> pd.DataFrame:
+        return parallel.build_cube(ds.sources(), dataset)
+
+    def profile(self, ds: PandasDataset) -> dict:
+        return schema.dataset_profile(ds.df, parallel.missing_counts(ds.sources()))
+
+    def missing_counts(self, ds: PandasDataset, filters: dict = None) -> pd.Series:
+        return self.select(ds, filters).missing_counts()
+
+    def value_counts(self, ds: PandasDataset, col: str, filters: dict = None) -> pd.Series:
+        return self.select(ds, filters)[col].value_counts()
+
+    def time_rollup(self, ds: PandasDataset, dataset: str, filters: dict = None) -> pd.DataFrame:
+        return temporal.rollup(self.select(ds, filters)[temporal.TIME_KEY], dataset)
+
+    def values(self, ds: PandasDataset, col: str, filters: dict = None) -> np.ndarray:
+        return self.select(ds, filters)[col].to_numpy(dtype="float64", na_value=np.nan)
+
+    def year_bounds(self, ds: PandasDataset) -> tuple:
+        years = ds.df["Year"].dropna() if "Year" in ds.df.columns else pd.Series(dtype="Int16")
+        return (int(years.min()), int(years.max())) if len(years) else None
+
+
+# ------------------------------
+# DuckDB (out-of-core บน Parquet)
+# ------------------------------
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _literal(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+def _to_pandas(table: pa.Table) -> pd.DataFrame:
+    # จำนวนเต็ม/bool ที่มีค่าว่าง → nullable dtype (เหมือนชนิดหลัง schema.apply_schema ไม่ใช่ float)
+    mapping = {
+        pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+        pa.bool_(): pd.BooleanDtype(),
+    }
+    out = table.to_pandas(types_mapper=mapping.get)
+    for col in out.columns:
+        dtype = out[col].dtype
+        if isinstance(dtype, (pd.Int8Dtype, pd.Int16Dtype, pd.Int32Dtype, pd.Int64Dtype, pd.BooleanDtype)) and not out[col].hasnans:
+            out[col] = out[col].astype(dtype.numpy_dtype)
+    return out
+
+
+class DuckDBDataset:
+    def __init__(self, path: str, view: str, columns: list, types: dict):
+        self.path = path
+        self.view = view  # SELECT ... FROM read_parquet(...) พร้อมคอลัมน์เวลาแบบ temporal.prep
+        self.columns = columns
+        self.types = types
+
+
+class DuckDBBackend:
+    name = "duckdb"
+
+    def __init__(self):
+        if duckdb is None:
+            raise RuntimeError("CRIMES_BACKEND=duckdb ต้องติดตั้ง duckdb (pip install duckdb)")
+        self.con = duckdb.connect()
+        os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+        self.con.execute(f"SET temp_directory = {_literal(DUCKDB_TEMP_DIR)}")
+        if DUCKDB_MEMORY:
+            self.con.execute(f"SET memory_limit = {_literal(DUCKDB_MEMORY)}")
+        if DUCKDB_THREADS:
+            self.con.execute(f"SET threads = {DUCKDB_THREADS}")
+
+    def _query(self, sql: str, params: list = None) -> pd.DataFrame:
+        # cursor ต่อ query → ใช้พร้อมกันจากหลาย thread (session ของ Streamlit) ได้
+        cur = self.con.cursor()
+        try:
+            return _to_pandas(cur.execute(sql, params or []).fetch_arrow_table())
+        finally:
+            cur.close()
+
+    def open(self, parquet_path, df: pd.DataFrame = None, sources: list = None, index=None) -> DuckDBDataset:
+        # parquet_path = ไฟล์เดียว หรือ list (เช่น partition Year=YYYY); df/sources/index ไม่ใช้ (อ่านจาก Parquet เอง)
+        paths = [parquet_path] if isinstance(parquet_path, str) else list(parquet_path)
+        source = "read_parquet([" + ", ".join(_literal(p) for p in paths) + "], hive_partitioning = false)"
+        raw_cols = self._query(f"DESCRIBE SELECT * FROM {source}")["column_name"].tolist()
+        select = ["*"]
+        if "Date" in raw_cols:
+            # เหมือน temporal.prep: Year / TimeKey จาก Date (แทนค่าเดิมถ้ามีอยู่แล้ว)
+            date = 'TRY_CAST("Date" AS TIMESTAMP)'
+            derived = {
+                "Date": date,
+                "Year": f"CAST(year({date}) AS SMALLINT)",
+                temporal.TIME_KEY: f"CAST(floor(epoch({date}) / 3600) AS INTEGER)",
+            }
+            replace = [f"{expr} AS {_quote(col)}" for col, expr in derived.items() if col in raw_cols]
+            select = ["* REPLACE (" + ", ".join(replace) + ")"]
+            select += [f"{expr} AS {_quote(col)}" for col, expr in derived.items() if col not in raw_cols]
+        view = f"SELECT {', '.join(select)} FROM {source}"
+        desc = self._query(f"DESCRIBE {view}")
+        return DuckDBDataset(paths[0] if len(paths) == 1 else paths, view, desc["column_name"].tolist(),
+                             dict(zip(desc["column_name"], desc["column_type"])))
+
+    # --- SQL helpers
+    def _where(self, ds: DuckDBDataset, filters: dict = None) -> tuple:
+        clauses, params = [], []
+        filters = filters or {}
+        year_range = filters.get("Year")
+        if year_range is not None and "Year" in ds.columns:
+            clauses.append('"Year" BETWEEN ? AND ?')
+            params += [int(year_range[0]), int(year_range[1])]
+        for col in schema.FILTER_COLUMNS:
+            vals = filters.get(col)
+            if vals and col in ds.columns:
+                clauses.append(f"{_quote(col)} IN ({', '.join('?' for _ in vals)})")
+                params += [v.item() if hasattr(v, "item") else v for v in vals]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _has_derived_location(self, ds: DuckDBDataset) -> bool:
+        return "Location" not in ds.columns and "Latitude" in ds.columns and "Longitude" in ds.columns
+
+    def _missing_row_expr(self, ds: DuckDBDataset) -> str:
+        # เทียบเท่า cube.row_missing: ค่าว่างต่อแถว (ไม่นับ TimeKey, รวม Location ที่ derive)
+        terms = [f"CAST({_quote(c)} IS NULL AS INTEGER)" for c in ds.columns if c != temporal.TIME_KEY]
+        if self._has_derived_location(ds):
+            terms.append('CAST(("Latitude" IS NULL OR "Longitude" IS NULL) AS INTEGER)')
+        return " + ".join(terms) if terms else "0"
+
+    # --- Aggregates
+    def rows(self, ds: DuckDBDataset, filters: dict = None) -> int:
+        where, params = self._where(ds, filters)
+        return int(self._query(f"SELECT count(*) AS n FROM ({ds.view}){where}", params)["n"].iloc[0])
+
+    def build_cube(self, ds: DuckDBDataset, dataset: str) -> pd.DataFrame:
+        dims = []
+        for col in cube.CUBE_DIMS:
+            if col == "Month" and "Date" in ds.columns:
+                dims.append(('CAST(month("Date") AS TINYINT)', "Month"))
+            elif col in ds.columns:
+                dims.append((_quote(col), col))
+        geo = 'CAST(("Latitude" IS NOT NULL AND "Longitude" IS NOT NULL) AS INTEGER)' if "Latitude" in ds.columns and "Longitude" in ds.columns else "0"
+        keys = ", ".join(f"{expr} AS {_quote(name)}" for expr, name in dims)
+        group = f" GROUP BY {', '.join(str(i + 1) for i in range(len(dims)))}" if dims else ""
+        sql = (
+            f"SELECT {keys + ', ' if keys else ''}count(*) AS \"Count\", "
+            f"sum({self._missing_row_expr(ds)}) AS \"Missing\", sum({geo}) AS \"Geo\" "
+            f"FROM ({ds.view}){group}"
+        )
+        out = self._query(sql)
+        for m in cube.MEASURES:
+            out[m] = out[m].astype(np.int32)  # เหมือน cube.measure_frame
+        out.insert(0, "Dataset", dataset)
+        return out
+
+    def missing_counts(self, ds: DuckDBDataset, filters: dict = None) -> pd.Series:
+        # เทียบเท่า schema.missing_counts (รวม Location ที่ derive จาก Latitude/Longitude)
+        where, params = self._where(ds, filters)
+        terms = [f"count(*) FILTER (WHERE {_quote(c)} IS NULL) AS {_quote(c)}" for c in ds.columns]
+        if self._has_derived_location(ds):
+            terms.append('count(*) FILTER (WHERE "Latitude" IS NULL OR "Longitude" IS NULL) AS "Location"')
+        row = self._query(f"SELECT {', '.join(terms)} FROM ({ds.view}){where}", params).iloc[0]
+        return row.astype("int64")
+
+    def profile(self, ds: DuckDBDataset) -> dict:
+        # รูปเดียวกับ schema.dataset_profile (dtypes = ชนิดของ DuckDB เช่น SMALLINT / VARCHAR)
+        missing = self.missing_counts(ds)
+        dtypes = dict(ds.types)
+        if self._has_derived_location(ds):
+            dtypes["Location"] = "derived (Latitude, Longitude)"
+        return {
+            "rows": self.rows(ds),
+            "columns": list(ds.columns) + (["Location"] if self._has_derived_location(ds) else []),
+            "dtypes": dtypes,
+            "missing": {k: int(v) for k, v in missing.items()},
+        }
+
+    def value_counts(self, ds: DuckDBDataset, col: str, filters: dict = None) -> pd.Series:
+        where, params = self._where(ds, filters)
+        extra = f"{' AND' if where else ' WHERE'} {_quote(col)} IS NOT NULL"
+        out = self._query(f"SELECT {_quote(col)} AS v, count(*) AS n FROM ({ds.view}){where}{extra} GROUP BY 1 ORDER BY 2 DESC, 1", params)
+        return pd.Series(out["n"].astype("int64").to_numpy(), index=pd.Index(out["v"], name=col), name="count")
+
+    def time_rollup(self, ds: DuckDBDataset, dataset: str, filters: dict = None) -> pd.DataFrame:
+        where, params = self._where(ds, filters)
+        key = _quote(temporal.TIME_KEY)
+        extra = f"{' AND' if where else ' WHERE'} {key} IS NOT NULL"
+        out = self._query(f"SELECT {key}, count(*) AS \"Count\" FROM ({ds.view}){where}{extra} GROUP BY 1 ORDER BY 1", params)
+        out.insert(0, "Dataset", dataset)
+        out[temporal.TIME_KEY] = out[temporal.TIME_KEY].astype(np.int32)
+        out["Count"] = out["Count"].astype(np.int64)
+        return out
+
+    def values(self, ds: DuckDBDataset, col: str, filters: dict = None) -> np.ndarray:
+        where, params = self._where(ds, filters)
+        out = self._query(f"SELECT CAST({_quote(col)} AS DOUBLE) AS v FROM ({ds.view}){where}", params)
+        return out["v"].to_numpy(dtype="float64", na_value=np.nan)
+
+    def year_bounds(self, ds: DuckDBDataset) -> tuple:
+        if "Year" not in ds.columns:
+            return None
+        out = self._query(f'SELECT min("Year") AS lo, max("Year") AS hi FROM ({ds.view})')
+        lo, hi = out["lo"].iloc[0], out["hi"].iloc[0]
+        return None if pd.isna(lo) else (int(lo), int(hi))
+
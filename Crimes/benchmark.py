@@ -0,0 +1,372 @@
+# benchmark.py
+# ==============================
+# Offline engine benchmark (synthetic data, ไม่ต้องใช้ network)
+# ==============================
+# วัดเวลา + peak memory ของแต่ละขั้นใน pipeline ของ app ที่ขนาดข้อมูลต่าง ๆ แล้วเขียนผลเป็น JSON
+# เพื่อเทียบข้ามเวอร์ชัน (จับ regression)
+#
+#   python benchmark.py                                   # 100k / 1M / 10M แถว
+#   python benchmark.py --rows 100000 --repeat 5
+#   python benchmark.py --rows 1000000 --compare bench_results/baseline.json
+#
+# - CSV สังเคราะห์ถูกเก็บไว้ใน workdir และใช้ซ้ำ (สร้างใหม่เมื่อ seed/ขนาด/GENERATOR_VERSION เปลี่ยน)
+# - peak memory = RSS สูงสุดระหว่างขั้น ลบด้วย RSS ตอนเริ่มขั้น (สุ่มอ่านทุก 5 ms)
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import pyarrow as pa
+
+import backend
+import cube
+import data_cache
+import dataset_store
+import diff
+import duplicates
+import explorer
+import filter_index
+import geo
+import heavy_hitters
+import parallel
+import perf
+import quantiles
+import sampling
+import schema
+import synthetic
+import temporal
+
+DEFAULT_ROWS = [100_000, 1_000_000, 10_000_000]
+DEFAULT_WORKDIR = os.path.join(data_cache.CACHE_DIR, "bench")
+DEFAULT_OUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+PREP_VERSION = "bench"
+
+# ตัวกรองตัวอย่าง (คล้ายที่ผู้ใช้เลือกบ่อย)
+FILTER_PRESETS = {
+    "year_range": {"Year": (2010, 2020)},
+    "type_district": {"Primary Type": ["THEFT", "BATTERY"], "District": [1, 8, 11]},
+    "status": {"Arrest": [True], "Domestic": [False]},
+    "all": {"Year": (2015, 2024), "Primary Type": ["NARCOTICS"], "Location Description": ["STREET", "SIDEWALK"], "Arrest": [True]},
+}
+
+
+# ------------------------------
+# Measurement
+# ------------------------------
+class PeakRSS:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _poll(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, perf.rss_bytes())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        gc.collect()
+        self.start = self.peak = perf.rss_bytes()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, perf.rss_bytes())
+
+    @property
+    def delta(self) -> int:
+        return max(self.peak - self.start, 0)
+
+def measure(fn, repeat: int = 1):
+    # คืน (ผลลัพธ์รอบสุดท้าย, [วินาทีต่อรอบ], peak RSS delta)
+    times = []
+    result = None
+    with PeakRSS() as mem:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - t0)
+    return result, times, mem.delta
+
+
+# ------------------------------
+# Synthetic inputs
+# ------------------------------
+def synthetic_csvs(n: int, seed: int, workdir: str):
+    os.makedirs(workdir, exist_ok=True)
+    stem = os.path.join(workdir, f"synthetic-v{synthetic.GENERATOR_VERSION}-s{seed}-{n}")
+    paths = (stem + "-before.csv", stem + "-after.csv")
+    if not all(os.path.exists(p) for p in paths):
+        before = synthetic.generate(n, seed)
+        synthetic.write_csv(before, paths[0])
+        synthetic.write_csv(synthetic.clean(before), paths[1])
+    return paths
+
+
+# ------------------------------
+# Stages
+# ------------------------------
+def run_size(n: int, seed: int, repeat: int, workdir: str) -> list:
+    before_csv, after_csv = synthetic_csvs(n, seed, workdir)
+    results = []
+
+    def record(stage: str, fn, rows: int, repeat_: int = 1, **extra):
+        value, times, peak = measure(fn, repeat_)
+        results.append({
+            "rows": n,
+            "stage": stage,
+            "input_rows": int(rows),
+            "repeat": repeat_,
+            "seconds": float(np.median(times)),
+            "seconds_min": float(min(times)),
+            "peak_rss_bytes": int(peak),
+            **extra,
+        })
+        print(f"  {stage:<34} {np.median(times):>9.4f}s  peak +{peak / 1e6:>8.1f} MB", flush=True)
+        return value
+
+    print(f"[{n:,} rows]", flush=True)
+    paths = {}
+    for name, csv_path in [("before", before_csv), ("after", after_csv)]:
+        parquet_path = os.path.join(workdir, os.path.basename(csv_path)[: -len(".csv")] + ".parquet")
+        record(f"ingest_csv_{name}", lambda: data_cache.csv_to_parquet(csv_path, parquet_path, schema.read_csv_typed), n)
+        paths[name] = parquet_path
+
+    raw = record("read_parquet", lambda: data_cache.read_parquet_mmap(paths["after"]), n)
+    # ชื่อ stage คงเดิม (เทียบกับ baseline เก่าได้) แม้ prep_dates ถูกแทนด้วย temporal.prep
+    df_after = record("prep_dates", lambda: temporal.prep(raw), len(raw))
+    del raw
+
+    # load_data: ครั้งแรกสร้าง Arrow store (รวม prep), ครั้งต่อไปเปิดแบบ memory map
+    arrow_after = dataset_store.arrow_path(paths["after"], PREP_VERSION)
+    if os.path.exists(arrow_after):
+        os.remove(arrow_after)
+    record("load_data_cold", lambda: dataset_store.open_shared(paths["after"], temporal.prep, PREP_VERSION), n)
+    df_after = record("load_data_warm", lambda: dataset_store.open_shared(paths["after"], temporal.prep, PREP_VERSION), n, repeat)
+    df_before = dataset_store.open_shared(paths["before"], temporal.prep, PREP_VERSION)
+
+    crime_cube = record(
+        "build_cube", lambda: cube.build_cubes({"Before": df_before, "After": df_after}), len(df_before) + len(df_after)
+    )
+    # เทียบกับ build_cube: นับแยกตามช่วงแถวของ Arrow store ใน process pool (CRIMES_WORKERS) แล้วรวม
+    record(
+        "build_cube_parallel",
+        lambda: cube.combine([
+            parallel.build_cube(parallel.arrow_sources(dataset_store.arrow_path(paths["before"], PREP_VERSION), len(df_before)), "Before"),
+            parallel.build_cube(parallel.arrow_sources(arrow_after, len(df_after)), "After"),
+        ]),
+        len(df_before) + len(df_after),
+    )
+    # เทียบกับ build_cube_parallel: DuckDB query ตรงบน Parquet (ไม่ต้องมี Arrow store / pandas frame)
+    if backend.duckdb is not None:
+        duck = backend.get("duckdb")
+        record(
+            "build_cube_duckdb",
+            lambda: cube.combine([duck.build_cube(duck.open(paths["before"]), "Before"), duck.build_cube(duck.open(paths["after"]), "After")]),
+            len(df_before) + len(df_after),
+        )
+    index_after = record("build_filter_index", lambda: filter_index.FilterIndex(df_after), len(df_after))
+    spatial = record(
+        "build_spatial_index",
+        lambda: geo.SpatialIndex(df_after["Latitude"].to_numpy(), df_after["Longitude"].to_numpy()),
+        len(df_after),
+    )
+    record("build_quantile_sketches", lambda: quantiles.sketches_by(df_after, "Latitude", "Year"), len(df_after))
+
+    for preset, spec in FILTER_PRESETS.items():
+        # select + materialize row-id (RowSelection.rows ถูก cache ไว้ จึงสร้าง selection ใหม่ทุกรอบ)
+        rows = record(f"apply_filters[{preset}]", lambda: index_after.select(spec).rows, len(df_after), repeat)
+        results[-1]["selected"] = int(len(rows))
+
+    def top_k():
+        sliced = cube.slice_cube(crime_cube, FILTER_PRESETS["all"], "After")
+        return cube.counts(sliced, "Primary Type").head(10)
+    top = record("top_k_cube", top_k, len(crime_cube), repeat)
+    # ตัวเลือก sidebar แบบ faceted: จำนวนต่อค่าภายใต้ตัวกรองอื่น ทุกคอลัมน์ตัวกรอง
+    record(
+        "facet_counts",
+        lambda: [cube.facet_counts(crime_cube, FILTER_PRESETS["all"], col, "After") for col in schema.FILTER_COLUMNS],
+        len(crime_cube),
+        repeat,
+    )
+    # พรีวิวโดยประมาณ: sample สร้างครั้งเดียว แล้ว KPI + Top-K (พร้อม CI) ต่อ filter
+    sample_after, _ = record("build_sample", lambda: sampling.build(df_after, "After"), len(df_after))
+    results[-1]["sample_rows"] = int(len(sample_after))
+
+    def approx_preview():
+        sliced = cube.slice_cube(sample_after, FILTER_PRESETS["all"])
+        return sampling.kpis(sliced, sliced), sampling.counts(sliced, "Primary Type").head(10)
+    record("approx_preview", approx_preview, len(sample_after), repeat)
+    # Top-K ของคอลัมน์ cardinality สูง: รายการที่ตัดไว้ต่อ (ปี × เขต) สร้างครั้งเดียว แล้ว merge ต่อช่วงปี
+    tops = record(
+        "build_partition_top_k",
+        lambda: heavy_hitters.merge_partials([heavy_hitters.build_partition_top_k(df_after, "After")]),
+        len(df_after),
+    )
+    results[-1]["top_k_rows"] = int(len(tops))
+    record(
+        "partition_top_k_query",
+        lambda: heavy_hitters.top_k(tops, "Block", {"Year": (2015, 2024)}, "After", 15),
+        len(tops),
+        repeat,
+    )
+    # ตรวจแถวซ้ำทั้งชุด: fingerprint 64-bit + sort (แทน df.duplicated บนคอลัมน์ object)
+    dups = record(
+        "duplicate_detection",
+        lambda: duplicates.summarize(duplicates.fingerprints(df_after), "After"),
+        len(df_after),
+    )
+    results[-1]["duplicates"] = int(dups["ExactRows"].sum() + dups["NearRows"].sum())
+    # explorer: argsort ต่อคอลัมน์ครั้งเดียว แล้วเรียง + ค้นหา + ตัดหน้าของชุดที่กรองต่อคำขอ
+    row_explorer = explorer.RowExplorer(df_after)
+    record("build_sort_index", lambda: explorer.RowExplorer(df_after).sort_order("Date"), len(df_after))
+    row_explorer.sort_order("Date")
+    selection = index_after.select(FILTER_PRESETS["all"])
+    record(
+        "explorer_page",
+        lambda: row_explorer.page(row_explorer.rows(selection.mask, "Date", False, "Block", "0"), 0, 50),
+        len(df_after),
+        repeat,
+    )
+    # rollup รายชั่วโมงสร้างครั้งเดียว แล้ว heatmap / แนวโน้มรายวันต่อช่วงปี
+    time_rollup = record("build_time_rollup", lambda: temporal.rollup(df_after[temporal.TIME_KEY], "After"), len(df_after))
+    results[-1]["rollup_rows"] = int(len(time_rollup))
+    record(
+        "time_heatmap_daily",
+        lambda: (temporal.heatmap(temporal.slice_rollup(time_rollup, (2015, 2024))), temporal.by(time_rollup, "Day")),
+        len(time_rollup),
+        repeat,
+    )
+    top_frame = top.rename("Count").rename_axis("Primary Type").reset_index()
+    record(
+        "top_k_figure_json",
+        lambda: px.bar(top_frame, x="Count", y="Primary Type", orientation="h").to_json(),
+        len(top_frame),
+        repeat,
+    )
+
+    record(
+        "missing_compare_profiles",
+        lambda: (schema.dataset_profile(df_before), schema.dataset_profile(df_after)),
+        len(df_before) + len(df_after),
+        repeat,
+    )
+    record("row_diff", lambda: diff.diff(df_before, df_after), len(df_before) + len(df_after))
+    record(
+        "missing_counts_selection",
+        lambda: index_after.select(FILTER_PRESETS["type_district"]).missing_counts(),
+        len(df_after),
+        repeat,
+    )
+    if backend.duckdb is not None:
+        duck_after = duck.open(paths["after"])
+        record(
+            "missing_counts_duckdb",
+            lambda: duck.missing_counts(duck_after, FILTER_PRESETS["type_district"]),
+            len(df_after),
+            repeat,
+        )
+
+    geo_sel = index_after.select({}).intersect(spatial.valid_mask)
+    record(
+        "map_density_grid",
+        lambda: geo.density_grid(geo_sel["Latitude"].to_numpy(), geo_sel["Longitude"].to_numpy(), 11),
+        len(geo_sel),
+        repeat,
+    )
+    record(
+        "map_sample_points",
+        lambda: geo_sel[["Latitude", "Longitude", "Primary Type"]].sample(min(3000, len(geo_sel)), random_state=42),
+        len(geo_sel),
+        repeat,
+    )
+    record("map_radius_query", lambda: spatial.radius_rows(41.8781, -87.6298, 1000), len(geo_sel), repeat)
+    return results
+
+
+# ------------------------------
+# Results
+# ------------------------------
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": parallel.WORKERS,
+        "generator_version": synthetic.GENERATOR_VERSION,
+    }
+
+def compare(results: list, baseline_path: str, threshold: float) -> list:
+    # คืนขั้นที่ช้ากว่า baseline เกิน threshold (ตัดขั้นที่เร็วกว่า 10 ms ออกเพราะ noise)
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["rows"], r["stage"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get((r["rows"], r["stage"]))
+        if base is None or base["seconds"] < 0.01:
+            continue
+        ratio = r["seconds"] / base["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append({"rows": r["rows"], "stage": r["stage"], "baseline": base["seconds"], "seconds": r["seconds"], "ratio": ratio})
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Chicago crimes dashboard engine benchmark (offline, synthetic data)")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="จำนวนรอบของขั้นที่เร็ว (ใช้ค่ามัธยฐาน)")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR)
+    parser.add_argument("--out", default=None, help="ไฟล์ผล JSON (ค่าเริ่มต้น: bench_results/bench-<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="ไฟล์ผล baseline สำหรับตรวจ regression")
+    parser.add_argument("--threshold", type=float, default=0.25, help="ช้ากว่า baseline เกินสัดส่วนนี้ = regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    for n in args.rows:
+        results.extend(run_size(n, args.seed, args.repeat, args.workdir))
+        gc.collect()
+
+    report = {"meta": {**environment(), "seed": args.seed, "repeat": args.repeat}, "results": results}
+    regressions = compare(results, args.compare, args.threshold) if args.compare else []
+    if args.compare:
+        report["baseline"] = args.compare
+        report["regressions"] = regressions
+
+    out = args.out or os.path.join(DEFAULT_OUT_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results → {out}")
+
+    for r in regressions:
+        print(f"REGRESSION {r['stage']} @ {r['rows']:,}: {r['baseline']:.4f}s → {r['seconds']:.4f}s (x{r['ratio']:.2f})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
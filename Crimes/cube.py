@@ -0,0 +1,159 @@
+# cube.py
+# ==============================
+# Aggregate cube (precomputed counts)
+# ==============================
+# นับล่วงหน้าครั้งเดียวตามมิติ (Dataset, Year, Month, Primary Type, District,
+# Location Description, Arrest, Domestic) → ทุกตัวกรองใน sidebar และกราฟ
+# tab1/tab3 ตอบได้ด้วยการ slice + sum บน cube แทนการ scan แถวดิบ
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_cache
+import schema
+
+CUBE_DIMS = ["Year", "Month", "Primary Type", "District", "Location Description", "Arrest", "Domestic"]
+# Count = จำนวนแถว, Missing = จำนวนช่องว่างรวม, Geo = แถวที่มี Latitude+Longitude
+MEASURES = ["Count", "Missing", "Geo"]
+
+
+# ------------------------------
+# Build
+# ------------------------------
+def row_missing(df: pd.DataFrame) -> np.ndarray:
+    # จำนวนค่าว่างต่อแถว (รวม Location ที่ derive จาก Latitude/Longitude)
+    out = np.zeros(len(df), dtype=np.int16)
+    for col in df.columns:
+        if col == schema.TIME_KEY:
+            continue  # derive จาก Date → ไม่นับซ้ำ
+        out += df[col].isna().to_numpy()
+    if schema.has_derived_location(df):
+        out += (df["Latitude"].isna() | df["Longitude"].isna()).to_numpy()
+    return out
+
+def measure_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # มิติ + measure ต่อแถว (ก่อน groupby) → ใช้ร่วมกับ sampling
+    keys = {}
+    for col in CUBE_DIMS:
+        if col == "Month" and "Date" in df.columns:
+            keys["Month"] = df["Date"].dt.month.astype("Int8")
+        elif col in df.columns:
+            keys[col] = df[col]
+    frame = pd.DataFrame(keys)
+    frame["Count"] = np.ones(len(df), dtype=np.int32)
+    frame["Missing"] = row_missing(df).astype(np.int32)
+    if "Latitude" in df.columns and "Longitude" in df.columns:
+        frame["Geo"] = (df["Latitude"].notna() & df["Longitude"].notna()).to_numpy().astype(np.int32)
+    else:
+        frame["Geo"] = np.zeros(len(df), dtype=np.int32)
+    return frame
+
+def build_cube(df: pd.DataFrame, dataset: str) -> pd.DataFrame:
+    frame = measure_frame(df)
+    dims = [c for c in frame.columns if c not in MEASURES]
+    cube = frame.groupby(dims, observed=True, dropna=False, sort=False)[MEASURES].sum().reset_index()
+    cube.insert(0, "Dataset", dataset)
+    return cube
+
+def combine(cubes: list) -> pd.DataFrame:
+    cube = pd.concat(cubes, ignore_index=True)
+    for col in ["Dataset", "Primary Type", "Location Description"]:
+        if col in cube.columns:
+            cube[col] = cube[col].astype("category")
+    return cube
+
+def build_cubes(parts: dict) -> pd.DataFrame:
+    # parts = {"Before": df_before, "After": df_after}
+    return combine([build_cube(df, name) for name, df in parts.items()])
+
+def merge_partials(cubes: list) -> pd.DataFrame:
+    # cube เป็นผลรวม → cube ย่อย (ต่อ partition / delta) รวมกันได้ด้วย groupby + sum
+    if len(cubes) == 1:
+        return cubes[0]
+    dims = [c for c in cubes[0].columns if c not in MEASURES]
+    merged = schema.concat_typed(cubes)
+    out = merged.groupby(dims, observed=True, dropna=False, sort=False)[MEASURES].sum().reset_index()
+    return out[out["Count"] != 0].reset_index(drop=True)
+
+
+# ------------------------------
+# Persist + incremental maintenance
+# ------------------------------
+def cube_path(parquet_path: str, version: str) -> str:
+    return data_cache.derived_path(parquet_path, f".{version}.cube.parquet")
+
+def save_cube(cube: pd.DataFrame, path: str):
+    tmp = path + ".tmp"
+    cube.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+def load_or_build(parquet_path: str, version: str, df: pd.DataFrame, dataset: str, build=None) -> pd.DataFrame:
+    # build() -> cube: วิธีสร้างแทน build_cube(df) (เช่น parallel.build_cube)
+    path = cube_path(parquet_path, version)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    cube = build() if build is not None else build_cube(df, dataset)
+    save_cube(cube, path)
+    return cube
+
+def apply_delta(cube: pd.DataFrame, removed: pd.DataFrame, added: pd.DataFrame, dataset: str) -> pd.DataFrame:
+    # cube เป็นผลรวม → ลบส่วนของแถวเดิมที่ถูกแทนที่ แล้วบวกแถวใหม่ (ไม่ต้องนับทั้งชุดใหม่)
+    parts = [cube]
+    if len(removed):
+        neg = build_cube(removed, dataset)
+        neg[MEASURES] = -neg[MEASURES]
+        parts.append(neg)
+    if len(added):
+        parts.append(build_cube(added, dataset))
+    return merge_partials(parts)
+
+
+# ------------------------------
+# Query (slice + sum)
+# ------------------------------
+def slice_cube(cube: pd.DataFrame, filters: dict, dataset: str = None) -> pd.DataFrame:
+    mask = np.ones(len(cube), dtype=bool)
+    if dataset is not None:
+        mask &= (cube["Dataset"] == dataset).to_numpy()
+    year_range = filters.get("Year")
+    if year_range is not None and "Year" in cube.columns:
+        year = cube["Year"]
+        mask &= ((year >= year_range[0]) & (year <= year_range[1])).fillna(False).to_numpy(dtype=bool)
+    for col in schema.FILTER_COLUMNS:
+        vals = filters.get(col)
+        if vals and col in cube.columns:
+            mask &= cube[col].isin(vals).to_numpy(dtype=bool)
+    return cube[mask]
+
+def total(sliced: pd.DataFrame, measure: str = "Count") -> int:
+    return int(sliced[measure].sum())
+
+def counts(sliced: pd.DataFrame, col: str, fill: str = None) -> pd.Series:
+    # เทียบเท่า df[col].value_counts() (หรือ fillna(fill).value_counts())
+    keys = sliced[col]
+    if fill is not None:
+        keys = keys.astype(object).where(keys.notna(), fill)
+    out = sliced["Count"].groupby(keys, observed=True).sum()
+    out = out[out > 0].sort_values(ascending=False, kind="stable")
+    out.index.name = col
+    out.name = "count"
+    return out
+
+def shares(sliced: pd.DataFrame, col: str) -> pd.Series:
+    # เทียบเท่า df[col].value_counts(normalize=True) * 100
+    out = counts(sliced, col)
+    return out / max(out.sum(), 1) * 100
+
+def rate(sliced: pd.DataFrame, col: str) -> float:
+    # % ของแถวที่ col เป็น True (ค่าว่างนับเป็น False)
+    n = total(sliced)
+    if n == 0:
+        return 0.0
+    hit = sliced[col].eq(True).fillna(False).to_numpy(dtype=bool)
+    return float(sliced["Count"].to_numpy()[hit].sum() / n * 100)
+
+def facet_counts(cube: pd.DataFrame, filters: dict, col: str, dataset: str = None) -> pd.Series:
+    # จำนวนต่อค่าของ col ภายใต้ตัวกรองอื่นทั้งหมด (ไม่นับตัวกรองของ col เอง) → ตัวเลือก sidebar แบบ faceted
+    others = {k: v for k, v in filters.items() if k != col}
+    return counts(slice_cube(cube, others, dataset), col)
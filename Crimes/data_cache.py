@@ -0,0 +1,178 @@
+# data_cache.py
+# ==============================
+# Local columnar cache for the source CSVs
+# ==============================
+# - ดาวน์โหลด CSV ครั้งแรก → แปลงเป็น Parquet เก็บในเครื่อง (keyed by URL + SHA-256 ของเนื้อไฟล์)
+# - รอบถัดไปอ่าน Parquet แบบ memory-map ไม่ต้องใช้ network และไม่ต้อง parse CSV ใหม่
+# - invalidate() = บังคับดึงใหม่รอบถัดไป (ถ้า offline ยังใช้ไฟล์เดิมได้), purge() = ลบทั้งหมด
+# - ดาวน์โหลดผ่าน fetch (resume + checksum + parse ระหว่างดาวน์โหลด), หลาย URL พร้อมกันด้วย ensure_cached_many
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import fetch
+
+CACHE_DIR = os.environ.get(
+    "CRIMES_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data_cache"),
+)
+MANIFEST_NAME = "manifest.json"
+DOWNLOAD_DIR = "downloads"
+
+# read-modify-write ของ manifest จากหลาย thread (ensure_cached_many)
+_manifest_lock = threading.RLock()
+
+
+# ------------------------------
+# Manifest (url -> entry)
+# ------------------------------
+def _manifest_path(cache_dir: str) -> str:
+    return os.path.join(cache_dir, MANIFEST_NAME)
+
+def read_manifest(cache_dir: str = CACHE_DIR) -> dict:
+    path = _manifest_path(cache_dir)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def manifest_lock() -> threading.RLock:
+    # สำหรับโมดูลอื่นที่ read-modify-write manifest (เช่น incremental) → lock เดียวกับ ensure_cached
+    # ถือไว้เฉพาะช่วงอ่าน/เขียน manifest ไม่ใช่ระหว่างอ่าน/เขียนข้อมูลชุดใหญ่
+    return _manifest_lock
+
+def write_manifest(manifest: dict, cache_dir: str = CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, _manifest_path(cache_dir))
+
+
+# ------------------------------
+# Fetch + convert
+# ------------------------------
+def download_path(url: str, cache_dir: str) -> str:
+    # path คงที่ต่อ URL → ไฟล์ .part ที่ค้างจากรอบก่อน (process ตาย / network หลุด) ต่อได้
+    name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16] + ".csv"
+    return os.path.join(cache_dir, DOWNLOAD_DIR, name)
+
+def read_csv_default(path: str) -> pd.DataFrame:
+    return pd.read_csv(path, low_memory=False)
+
+def csv_to_parquet(csv_path: str, parquet_path: str, reader=read_csv_default, df: pd.DataFrame = None):
+    # df: ผลที่ parse ไว้แล้ว (เช่นระหว่างดาวน์โหลด) → ไม่ต้องอ่าน CSV ซ้ำ
+    if df is None:
+        df = reader(csv_path)
+    tmp = parquet_path + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, parquet_path)
+
+def read_parquet_mmap(path: str) -> pd.DataFrame:
+    table = pq.read_table(path, memory_map=True)
+    return table.to_pandas()
+
+
+# ------------------------------
+# Public API
+# ------------------------------
+def ensure_cached(url: str, reader=read_csv_default, version: str = "", cache_dir: str = CACHE_DIR, sha256: str = None) -> str:
+    # คืน path ของ Parquet ที่พร้อมใช้
+    # reader/version: ตัวแปลง CSV → DataFrame (เช่น apply schema) และเวอร์ชันของมัน
+    # เปลี่ยน version = ต้องแปลงใหม่ (ถือว่า stale)
+    # sha256: checksum ที่คาดไว้ของ CSV (ไม่ตรง = ไม่ใช้ไฟล์นั้น)
+    manifest = read_manifest(cache_dir)
+    entry = manifest.get(url)
+    cached_path = os.path.join(cache_dir, entry["parquet"]) if entry else None
+    has_cached = (
+        cached_path is not None
+        and os.path.exists(cached_path)
+        and (not sha256 or entry.get("sha256") == sha256.lower())
+    )
+    is_current = has_cached and entry.get("version", "") == version
+
+    if is_current and not entry.get("stale"):
+        return cached_path
+
+    csv_path = download_path(url, cache_dir)
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    try:
+        try:
+            digest, df = fetch.fetch(url, csv_path, reader, sha256)
+        except OSError:
+            # offline / source ล่ม / checksum ไม่ตรง → ใช้สำเนาเดิมถ้ามี
+            if has_cached:
+                return cached_path
+            raise
+
+        parquet_name = f"{digest}-{version}.parquet" if version else f"{digest}.parquet"
+        parquet_path = os.path.join(cache_dir, parquet_name)
+        if not os.path.exists(parquet_path):
+            csv_to_parquet(csv_path, parquet_path, reader, df)
+    finally:
+        if os.path.exists(csv_path):
+            os.remove(csv_path)
+
+    with _manifest_lock:
+        manifest = read_manifest(cache_dir)
+        previous = manifest.get(url)
+        manifest[url] = {
+            "sha256": digest,
+            "parquet": parquet_name,
+            "version": version,
+            "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        write_manifest(manifest, cache_dir)
+        if previous and previous["parquet"] != parquet_name:
+            remove_if_unreferenced(previous["parquet"], manifest, cache_dir)
+
+    return parquet_path
+
+def ensure_cached_many(urls: list, reader=read_csv_default, version: str = "", cache_dir: str = CACHE_DIR, checksums: dict = None) -> list:
+    # ดาวน์โหลด/แปลงทุก URL พร้อมกัน (งานหลักเป็น network I/O) → cold start ≈ เวลาของไฟล์ที่ช้าที่สุด
+    checksums = checksums or {}
+    if len(urls) <= 1:
+        return [ensure_cached(u, reader, version, cache_dir, checksums.get(u)) for u in urls]
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        futures = [pool.submit(ensure_cached, u, reader, version, cache_dir, checksums.get(u)) for u in urls]
+        return [f.result() for f in futures]
+
+def invalidate(url: str = None, cache_dir: str = CACHE_DIR):
+    # mark stale: รอบถัดไปจะดึงใหม่ แต่ยังเก็บไฟล์ไว้ใช้ตอน offline
+    with _manifest_lock:
+        manifest = read_manifest(cache_dir)
+        for key, entry in manifest.items():
+            if url is None or key == url:
+                entry["stale"] = True
+        write_manifest(manifest, cache_dir)
+
+def purge(cache_dir: str = CACHE_DIR):
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+def derived_path(parquet_path: str, suffix: str) -> str:
+    # ไฟล์ที่สร้างต่อจาก Parquet (เช่น Arrow IPC ของ dataset_store) ใช้ stem เดียวกัน
+    return parquet_path[: -len(".parquet")] + suffix
+
+def remove_if_unreferenced(parquet_name: str, manifest: dict, cache_dir: str):
+    if any(e.get("parquet") == parquet_name for e in manifest.values()):
+        return
+    stem = parquet_name[: -len(".parquet")]
+    for name in os.listdir(cache_dir):
+        if name == parquet_name or name.startswith(stem + "."):
+            path = os.path.join(cache_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)  # เช่น partitions (Year=YYYY/)
+            else:
+                os.remove(path)
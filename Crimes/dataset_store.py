@@ -0,0 +1,51 @@
+# dataset_store.py
+# ==============================
+# Shared, read-only dataset store (memory-mapped Arrow IPC)
+# ==============================
+# - ชุดข้อมูลที่เตรียมแล้ว (schema + prep) ถูกเขียนเป็น Arrow IPC แบบไม่บีบอัดครั้งเดียว
+# - เปิดด้วย memory map → คอลัมน์ตัวเลข/วันเวลา/รหัส category เป็น view บน page cache
+#   (ไม่ copy, read-only) ใช้ร่วมกันทุก session และแม้แต่ข้าม process
+# - app ถือ DataFrame นี้ไว้ใน st.cache_resource → ไม่มีการ pickle/copy ต่อผู้ใช้
+# ห้ามแก้ DataFrame ที่ได้จาก store แบบ in-place (เป็นข้อมูลที่ทุก session ใช้ร่วมกัน)
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+import data_cache
+import schema
+
+ARROW_SUFFIX = ".arrow"
+
+
+def arrow_path(parquet_path: str, version: str) -> str:
+    return data_cache.derived_path(parquet_path, f".{version}{ARROW_SUFFIX}")
+
+def write_arrow(df: pd.DataFrame, path: str):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+def open_arrow(path: str) -> pd.DataFrame:
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    # split_blocks: ไม่รวมคอลัมน์เป็น 2D block → คอลัมน์ที่ layout ตรงกันเป็น zero-copy view
+    return table.to_pandas(split_blocks=True)
+
+def apply_delta(path: str, new_path: str, removed: pd.DataFrame, added: pd.DataFrame, key: str):
+    # Incremental Refresh: store ใหม่ = store เดิมที่ตัดแถวถูกแทนที่ + แถวใหม่ (prepare แล้ว)
+    # ลำดับแถวเดียวกับ Parquet ที่ upsert แล้ว → ไม่ต้องอ่าน Parquet ทั้งชุดมา prepare ใหม่
+    old = open_arrow(path)
+    kept = old[~old[key].isin(removed[key]).to_numpy()]
+    write_arrow(schema.concat_typed([kept, added]), new_path)
+
+def open_shared(parquet_path: str, prepare, version: str) -> pd.DataFrame:
+    # prepare(df) -> df: ขั้นเตรียมข้อมูลที่ทำครั้งเดียวก่อนเก็บ (version เปลี่ยน = สร้างใหม่)
+    path = arrow_path(parquet_path, version)
+    if not os.path.exists(path):
+        df = prepare(data_cache.read_parquet_mmap(parquet_path))
+        write_arrow(df, path)
+    return open_arrow(path)
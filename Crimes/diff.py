@@ -0,0 +1,183 @@
+# diff.py
+# ==============================
+# Row-level Before/After diff (audit ขั้นทำความสะอาด)
+# ==============================
+# - จับคู่แถวด้วย key: ID (ถ้ามีครบทั้งสองชุด) ไม่งั้น hash 64-bit ของ Case Number + Date + IUCR
+# - จับคู่ด้วย sort + intersect บน key array → ได้ตำแหน่งแถว ไม่ merge DataFrame (ไม่ copy คอลัมน์)
+# - เทียบค่าทีละ chunk ของคู่แถว ทีละคอลัมน์ (ผ่านข้อมูลรอบเดียว หน่วยความจำคงที่ต่อ chunk)
+# ผล: dropped (อยู่ใน Before แต่ไม่อยู่ใน After), kept, modified (ค่าบางคอลัมน์เปลี่ยน), added,
+#     จำนวนที่เปลี่ยนต่อคอลัมน์ (changed / filled = ว่าง→มีค่า / cleared = มีค่า→ว่าง)
+import numpy as np
+import pandas as pd
+
+import schema
+
+KEY_COLUMNS = ["ID"]
+FALLBACK_KEY_COLUMNS = ["Case Number", "Date", "IUCR"]
+CHUNK_ROWS = 1_000_000
+
+
+# ------------------------------
+# Keys
+# ------------------------------
+def choose_key(df_b: pd.DataFrame, df_a: pd.DataFrame) -> list:
+    # คืนคอลัมน์ key ที่ใช้ได้ หรือ None
+    for cols in [KEY_COLUMNS, FALLBACK_KEY_COLUMNS]:
+        if all(c in df_b.columns and c in df_a.columns for c in cols):
+            if cols is KEY_COLUMNS and (df_b["ID"].isna().any() or df_a["ID"].isna().any()):
+                continue
+            return cols
+    return None
+
+def row_keys(df: pd.DataFrame, cols: list) -> np.ndarray:
+    if cols == KEY_COLUMNS:
+        return df["ID"].to_numpy(dtype="int64")
+    # hash ของ categorical คิดจากค่า (ไม่ขึ้นกับลำดับ categories) → เทียบข้ามชุดได้
+    return pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+
+
+# ------------------------------
+# Value comparison
+# ------------------------------
+def _comparable(b: pd.Series, a: pd.Series):
+    # แปลงสองฝั่งให้เทียบด้วย == ได้ตรง ๆ (ค่าว่างเข้ารหัสเหมือนกันทั้งสองฝั่ง)
+    if isinstance(b.dtype, pd.CategoricalDtype) and isinstance(a.dtype, pd.CategoricalDtype):
+        # รหัสของ After → รหัสของ Before (category ที่ไม่มีใน Before ได้รหัสใหม่)
+        remap = b.cat.categories.get_indexer(a.cat.categories)
+        missing = remap < 0
+        remap[missing] = len(b.cat.categories) + np.arange(missing.sum())
+        codes_a = a.cat.codes.to_numpy()
+        return b.cat.codes.to_numpy().astype(np.int64), np.where(codes_a < 0, -1, remap[codes_a])
+    if pd.api.types.is_datetime64_any_dtype(b.dtype) and pd.api.types.is_datetime64_any_dtype(a.dtype):
+        return (
+            b.to_numpy(dtype="datetime64[ns]").view("int64"),
+            a.to_numpy(dtype="datetime64[ns]").view("int64"),
+        )
+    numeric = pd.api.types.is_numeric_dtype
+    if numeric(b.dtype) and numeric(a.dtype):
+        # float64 + NaN แทนค่าว่าง (bool/int ที่ nullable ก็เข้าทางนี้)
+        vb = b.to_numpy(dtype="float64", na_value=np.nan)
+        va = a.to_numpy(dtype="float64", na_value=np.nan)
+        return np.where(np.isnan(vb), np.inf, vb), np.where(np.isnan(va), np.inf, va)
+    # อื่น ๆ (string/object/ต่างชนิด) → hash ของค่าเป็นข้อความ
+    def text_hash(s):
+        return pd.util.hash_array(s.astype("string").fillna("\0").to_numpy(dtype=object))
+    return text_hash(b), text_hash(a)
+
+
+# ------------------------------
+# Diff
+# ------------------------------
+class RowDiff:
+    def __init__(self, key: list, before_rows: int, after_rows: int, dropped: np.ndarray, added: np.ndarray,
+                 kept_before: np.ndarray, kept_after: np.ndarray, modified: np.ndarray,
+                 duplicates_before: int, duplicates_after: int, column_changes: pd.DataFrame, dropped_missing: pd.Series):
+        self.key = key
+        self.before_rows = before_rows
+        self.after_rows = after_rows
+        self.dropped = dropped
+        self.added = added
+        self.kept_before = kept_before
+        self.kept_after = kept_after
+        self.modified = modified
+        self.duplicates_before = duplicates_before
+        self.duplicates_after = duplicates_after
+        self.column_changes = column_changes
+        self.dropped_missing = dropped_missing
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.dropped, self.added, self.kept_before, self.kept_after, self.modified]
+        return sum(x.nbytes for x in arrays)
+
+    def summary(self) -> dict:
+        return {
+            "key": " + ".join(self.key),
+            "before_rows": self.before_rows,
+            "after_rows": self.after_rows,
+            "dropped": int(len(self.dropped)),
+            "kept": int(len(self.kept_before)),
+            "modified": int(self.modified.sum()),
+            "added": int(len(self.added)),
+            "duplicates_before": self.duplicates_before,
+            "duplicates_after": self.duplicates_after,
+        }
+
+    def dropped_rows(self, df_b: pd.DataFrame, n: int = 100) -> pd.DataFrame:
+        return df_b.take(self.dropped[:n])
+
+    def modified_rows(self, df_b: pd.DataFrame, df_a: pd.DataFrame, n: int = 100) -> pd.DataFrame:
+        # ตัวอย่างแถวที่เปลี่ยน: key + (ก่อน, หลัง) เฉพาะคอลัมน์ที่มีการเปลี่ยน
+        pos = np.flatnonzero(self.modified)[:n]
+        rows_b = df_b.take(self.kept_before[pos]).reset_index(drop=True)
+        rows_a = df_a.take(self.kept_after[pos]).reset_index(drop=True)
+        cols = self.column_changes.loc[self.column_changes["changed"] > 0, "column"].tolist()
+        out = rows_b[[c for c in self.key if c in rows_b.columns]].copy()
+        for col in cols:
+            out[f"{col} (Before)"] = rows_b[col].astype(object)
+            out[f"{col} (After)"] = rows_a[col].astype(object)
+        return out
+
+
+def compare_columns(df_b: pd.DataFrame, df_a: pd.DataFrame) -> list:
+    # คอลัมน์ต้นฉบับที่อยู่ทั้งสองชุด (ไม่รวมคอลัมน์ที่ derive ตอน prep เช่น Month)
+    features = [col for col, *_ in schema.FEATURE_INFO]
+    return [c for c in features if c in df_b.columns and c in df_a.columns]
+
+def diff(df_b: pd.DataFrame, df_a: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> RowDiff:
+    key = choose_key(df_b, df_a)
+    if key is None:
+        raise ValueError("ไม่มีคอลัมน์ key สำหรับจับคู่แถว (ID หรือ Case Number + Date + IUCR)")
+    kb, ka = row_keys(df_b, key), row_keys(df_a, key)
+
+    # --- จับคู่: key ไม่ซ้ำ (แถวแรกของ key ที่ซ้ำ) ทั้งสองฝั่ง
+    ub, first_b = np.unique(kb, return_index=True)
+    ua, first_a = np.unique(ka, return_index=True)
+    _, ib, ia = np.intersect1d(ub, ua, assume_unique=True, return_indices=True)
+    kept_b, kept_a = first_b[ib], first_a[ia]
+    order = np.argsort(kept_b, kind="stable")  # เดินตามลำดับแถวของ Before (อ่านต่อเนื่อง)
+    pos_dtype = np.int32 if max(len(kb), len(ka)) < 2**31 else np.int64
+    kept_b, kept_a = kept_b[order].astype(pos_dtype), kept_a[order].astype(pos_dtype)
+    dropped = np.flatnonzero(~np.isin(kb, ua)).astype(pos_dtype)
+    added = np.flatnonzero(~np.isin(ka, ub)).astype(pos_dtype)
+
+    # --- เทียบค่าทีละ chunk
+    cols = [c for c in compare_columns(df_b, df_a) if c not in key]
+    changed = dict.fromkeys(cols, 0)
+    filled = dict.fromkeys(cols, 0)
+    cleared = dict.fromkeys(cols, 0)
+    modified = np.zeros(len(kept_b), dtype=bool)
+    for start in range(0, len(kept_b), chunk_rows):
+        pb, pa = kept_b[start:start + chunk_rows], kept_a[start:start + chunk_rows]
+        for col in cols:
+            sb, sa = df_b[col].take(pb), df_a[col].take(pa)
+            vb, va = _comparable(sb, sa)
+            neq = vb != va
+            if not neq.any():
+                continue
+            nb, na = sb.isna().to_numpy(), sa.isna().to_numpy()
+            changed[col] += int(neq.sum())
+            filled[col] += int((nb & ~na).sum())
+            cleared[col] += int((~nb & na).sum())
+            modified[start:start + chunk_rows] |= neq
+
+    column_changes = pd.DataFrame({
+        "column": cols,
+        "changed": [changed[c] for c in cols],
+        "filled": [filled[c] for c in cols],
+        "cleared": [cleared[c] for c in cols],
+    })
+    column_changes["changed_%"] = column_changes["changed"] / max(len(kept_b), 1) * 100
+    column_changes = column_changes.sort_values("changed", ascending=False, kind="stable").reset_index(drop=True)
+
+    # ทำไมถูกลบ: ค่าว่างต่อคอลัมน์ในแถวที่หายไป (take ทีละคอลัมน์ → ไม่ copy แถวที่หายไปทั้งตาราง)
+    dropped_missing = pd.Series({col: int(df_b[col].take(dropped).isna().sum()) for col in df_b.columns}, dtype="int64")
+    if schema.has_derived_location(df_b):
+        lat, lon = df_b["Latitude"].take(dropped), df_b["Longitude"].take(dropped)
+        dropped_missing["Location"] = int((lat.isna() | lon.isna()).sum())
+    dropped_missing = dropped_missing[dropped_missing > 0].sort_values(ascending=False)
+
+    return RowDiff(
+        key, int(len(df_b)), int(len(df_a)), dropped, added, kept_b, kept_a, modified,
+        int(len(kb) - len(ub)), int(len(ka) - len(ua)), column_changes, dropped_missing,
+    )
@@ -0,0 +1,153 @@
+# duplicates.py
+# ==============================
+# Duplicate detection (exact / near) ทั้งชุด
+# ==============================
+# - fingerprint 64-bit ต่อแถว (pd.util.hash_pandas_object: vectorized, categorical hash จากค่าไม่ใช่รหัส)
+#     Exact = hash(Case Number + Date + IUCR), Case = hash(Case Number) → ไม่ต้อง duplicated() บนคอลัมน์ object
+#   สร้างต่อ partition แบบขนาน (parallel) แล้วต่อกัน (แถวซ้ำอาจอยู่คนละ partition)
+# - exact: sort ตาม Exact → แถวที่ fingerprint เท่ากับแถวก่อนหน้า = สำเนาซ้ำ
+# - near: ตัดสำเนา exact ออกก่อน (เหลือแถวแรกของแต่ละกลุ่ม) แล้วแยกตาม Case Number เรียงตามเวลา
+#   → ต่อกลุ่มแบบ gap chaining: แถวอยู่กลุ่มเดียวกับแถวก่อนหน้า (Case เดียวกัน) ถ้าเวลาห่างกัน ≤ NEAR_MINUTES นาที
+#   กลุ่มจึงยาวเกิน NEAR_MINUTES ได้ (เช่น 10:00, 10:50, 11:40 = กลุ่มเดียว) แต่ไม่มีช่องว่างใดในกลุ่มเกิน NEAR_MINUTES;
+#   แถวของ Case อื่นไม่คั่นกลุ่ม (แยกตาม Case ก่อน) และสำเนา exact ไม่นับซ้ำเป็น near
+# - ผลสรุปต่อ (Dataset, Year, District): Rows, ExactRows/NearRows (แถวส่วนเกิน), ExactGroups/NearGroups (จำนวนกลุ่ม)
+#   คำนวณครั้งเดียว เก็บข้าง Parquet → slice ตามช่วงปี / District เหมือน cube
+# - แถวที่ key ไม่ครบ (ค่าว่างใน Case Number / Date / IUCR) ไม่นับเป็นแถวซ้ำ
+import os
+
+import numpy as np
+import pandas as pd
+
+import cube
+import data_cache
+
+KEY_COLUMNS = ["Case Number", "Date", "IUCR"]
+GROUP_COLUMNS = ["Year", "District"]
+NEAR_MINUTES = 60
+MEASURES = ["Rows", "ExactRows", "ExactGroups", "NearRows", "NearGroups"]
+
+
+# ------------------------------
+# Fingerprints (ต่อ partition)
+# ------------------------------
+def fingerprints(df: pd.DataFrame) -> pd.DataFrame:
+    # แถว = ทุกแถวของ partition: [Year, District, Valid, Exact, Case, Time]
+    out = pd.DataFrame({c: df[c] if c in df.columns else pd.Series(pd.NA, index=df.index, dtype="Int16") for c in GROUP_COLUMNS})
+    n = len(df)
+    exact = np.zeros(n, dtype=np.uint64)
+    case = np.zeros(n, dtype=np.uint64)
+    time = np.zeros(n, dtype=np.int64)
+    valid = np.zeros(n, dtype=bool)
+    if all(c in df.columns for c in KEY_COLUMNS):
+        valid = df[KEY_COLUMNS].notna().all(axis=1).to_numpy()
+        keys = df.loc[valid, KEY_COLUMNS]
+        exact[valid] = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+        case[valid] = pd.util.hash_pandas_object(keys["Case Number"], index=False).to_numpy()
+        time[valid] = keys["Date"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    out["Valid"] = valid
+    out["Exact"] = exact
+    out["Case"] = case
+    out["Time"] = time
+    return out.reset_index(drop=True)
+
+def merge_partials(partials: list) -> pd.DataFrame:
+    return pd.concat(partials, ignore_index=True)
+
+
+# ------------------------------
+# Detect (ทั้งชุดของ dataset เดียว)
+# ------------------------------
+def _starts(same: np.ndarray) -> np.ndarray:
+    # same[i] = แถวที่ i (ตามลำดับ sort) อยู่กลุ่มเดียวกับแถวก่อนหน้า → แถวแรกของกลุ่มที่มีสมาชิก > 1
+    return ~same & np.r_[same[1:], False]
+
+def flags(fp: pd.DataFrame, near_minutes: int = NEAR_MINUTES) -> dict:
+    # {ExactRows, ExactGroups, NearRows, NearGroups}: bool ต่อแถวของ fp
+    n = len(fp)
+    out = {m: np.zeros(n, dtype=bool) for m in MEASURES[1:]}
+    rows = np.flatnonzero(fp["Valid"].to_numpy())
+    if len(rows) == 0:
+        return out
+
+    exact = fp["Exact"].to_numpy()[rows]
+    order = np.argsort(exact, kind="stable")
+    s = exact[order]
+    dup = np.r_[False, s[1:] == s[:-1]]
+    out["ExactRows"][rows[order]] = dup
+    out["ExactGroups"][rows[order]] = _starts(dup)
+
+    # near: เฉพาะแถวที่ไม่ใช่สำเนา exact → sort (Case, Time) แล้วต่อกลุ่มเมื่อ Case เดียวกันและช่องว่างถึงแถวก่อนหน้า ≤ window
+    rest = rows[order][~dup]
+    case, time = fp["Case"].to_numpy()[rest], fp["Time"].to_numpy()[rest]
+    order = np.lexsort((time, case))
+    c, t = case[order], time[order]
+    window = np.int64(near_minutes) * 60 * 1_000_000_000
+    near = np.r_[False, (c[1:] == c[:-1]) & (t[1:] - t[:-1] <= window)]
+    out["NearRows"][rest[order]] = near
+    out["NearGroups"][rest[order]] = _starts(near)
+    return out
+
+def summarize(fp: pd.DataFrame, dataset: str, near_minutes: int = NEAR_MINUTES) -> pd.DataFrame:
+    frame = fp[GROUP_COLUMNS].copy()
+    frame["Rows"] = 1
+    for name, flag in flags(fp, near_minutes).items():
+        frame[name] = flag.astype(np.int64)
+    out = frame.groupby(GROUP_COLUMNS, observed=True, dropna=False, sort=True)[MEASURES].sum().reset_index()
+    out.insert(0, "Dataset", dataset)
+    return out
+
+
+# ------------------------------
+# Delta (Incremental Refresh)
+# ------------------------------
+def related(df: pd.DataFrame, removed: pd.DataFrame, added: pd.DataFrame, key: str) -> np.ndarray:
+    # แถวของ df ที่ผลแถวซ้ำอาจเปลี่ยน: แถวที่ถูกแทนที่ / แถวใหม่ (ตาม key) หรือ Case Number เดียวกับแถวเหล่านั้น
+    # ทั้งเวอร์ชันเดิมและใหม่ (กลุ่ม exact / near อยู่ภายใน Case Number เดียวเสมอ → Case อื่นไม่ต้องนับใหม่)
+    mask = df[key].isin(added[key]).to_numpy(copy=True)
+    if "Case Number" in df.columns:
+        cases = pd.concat([removed["Case Number"], added["Case Number"]]).dropna().unique()
+        mask |= df["Case Number"].isin(cases).to_numpy()
+    return mask
+
+def apply_delta(summary: pd.DataFrame, before: pd.DataFrame, after: pd.DataFrame, dataset: str,
+                near_minutes: int = NEAR_MINUTES) -> pd.DataFrame:
+    # before / after = แถวของ Case ที่ delta แตะ ในชุดเดิม / ชุดใหม่ (ลำดับเดียวกับชุดเต็ม)
+    # → ลบผลของกลุ่มเหล่านั้นแล้วบวกผลที่นับใหม่ เฉพาะ (ปี × เขต) ที่แถวของกลุ่มอยู่
+    neg = summarize(fingerprints(before), dataset, near_minutes)
+    neg[MEASURES] = -neg[MEASURES]
+    parts = [summary, neg, summarize(fingerprints(after), dataset, near_minutes)]
+    out = pd.concat(parts, ignore_index=True)
+    out = out.groupby(["Dataset"] + GROUP_COLUMNS, observed=True, dropna=False, sort=True)[MEASURES].sum().reset_index()
+    return out[out["Rows"] != 0].reset_index(drop=True)
+
+
+# ------------------------------
+# Persist (ข้าง Parquet เหมือน cube)
+# ------------------------------
+def summary_path(parquet_path: str, version: str, near_minutes: int = NEAR_MINUTES) -> str:
+    return data_cache.derived_path(parquet_path, f".{version}.dups{near_minutes}.parquet")
+
+def load_or_build(parquet_path: str, version: str, build_fn, near_minutes: int = NEAR_MINUTES) -> pd.DataFrame:
+    # build_fn() -> summarize(...) เช่น parallel.duplicate_summary(...)
+    path = summary_path(parquet_path, version, near_minutes)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    out = build_fn()
+    cube.save_cube(out, path)
+    return out
+
+
+# ------------------------------
+# Query
+# ------------------------------
+def slice_summary(summary: pd.DataFrame, filters: dict, dataset: str) -> pd.DataFrame:
+    # ตัวกรองที่ใช้ได้: ช่วงปี + District (เหมือน cube.slice_cube)
+    return cube.slice_cube(summary, {"Year": filters.get("Year"), "District": filters.get("District")}, dataset)
+
+def totals(sliced: pd.DataFrame) -> dict:
+    return {m: int(sliced[m].sum()) for m in MEASURES}
+
+def by(sliced: pd.DataFrame, col: str) -> pd.DataFrame:
+    # [col, ExactRows, NearRows, ...] เฉพาะกลุ่มที่มีแถวซ้ำ
+    out = sliced.groupby(col, observed=True, sort=True)[MEASURES].sum().reset_index()
+    return out[(out["ExactRows"] + out["NearRows"]) > 0].reset_index(drop=True)
@@ -0,0 +1,94 @@
+# explorer.py
+# ==============================
+# Server-side row explorer (page / sort / prefix search)
+# ==============================
+# - ทำงานบนชุดที่ตรงตัวกรองทั้งหมด (filter_index.RowSelection) แต่ส่งไป browser ทีละหน้าเท่านั้น
+# - sort: argsort ต่อคอลัมน์ของทั้ง frame สร้างครั้งเดียวเมื่อถูกใช้ครั้งแรก
+#   → ชุดที่เลือกเรียงแล้ว = order[mask[order]] (O(n) ต่อครั้ง ไม่ sort ใหม่ตามตัวกรอง); ค่าว่างอยู่ท้ายเสมอ
+# - prefix search (Block / Description): categories เรียงแล้ว + searchsorted → รหัสที่ตรง → bitmap ของแถว
+import numpy as np
+import pandas as pd
+
+SEARCH_COLUMNS = ["Block", "Description"]
+PAGE_SIZES = [25, 50, 100]
+
+
+def _row_dtype(n: int):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+
+class RowExplorer:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.n = len(df)
+        self._orders = {}
+        self._labels = {}
+
+    # ------------------------------
+    # Sort index (lazy ต่อคอลัมน์)
+    # ------------------------------
+    def sort_order(self, col: str) -> tuple:
+        # (row-id เรียงตามค่า ค่าว่างอยู่ท้าย, จำนวนแถวที่มีค่า)
+        cached = self._orders.get(col)
+        if cached is not None:
+            return cached
+        s = self.df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # ลำดับตามข้อความของ category (categories อาจไม่เรียง หลังรวมหลายชุด)
+            cats = s.cat.categories
+            rank = np.empty(len(cats), dtype=np.int64)
+            rank[np.argsort(cats.to_numpy(dtype=object).astype(str), kind="stable")] = np.arange(len(cats))
+            codes = s.cat.codes.to_numpy()
+            valid = codes >= 0
+            keys = rank[codes[valid]]
+        else:
+            valid = s.notna().to_numpy()
+            keys = s[valid].to_numpy()
+            if keys.dtype == object:
+                keys = keys.astype(str)
+        rows = np.flatnonzero(valid)
+        order = np.concatenate([rows[np.argsort(keys, kind="stable")], np.flatnonzero(~valid)]).astype(_row_dtype(self.n))
+        self._orders[col] = (order, len(rows))
+        return self._orders[col]
+
+    # ------------------------------
+    # Prefix search (ไม่สนตัวพิมพ์เล็ก/ใหญ่)
+    # ------------------------------
+    def search_mask(self, col: str, prefix: str) -> np.ndarray:
+        prefix = prefix.strip().upper()
+        s = self.df[col]
+        if not isinstance(s.dtype, pd.CategoricalDtype):
+            return s.astype("string").str.upper().str.startswith(prefix).fillna(False).to_numpy(dtype=bool)
+        labels = self._labels.get(col)
+        if labels is None:
+            upper = s.cat.categories.to_numpy(dtype=object).astype(str)
+            upper = np.char.upper(upper)
+            perm = np.argsort(upper, kind="stable")
+            labels = self._labels[col] = (upper[perm], perm)
+        sorted_labels, perm = labels
+        lo = np.searchsorted(sorted_labels, prefix, side="left")
+        hi = np.searchsorted(sorted_labels, prefix + "\U0010ffff", side="left")
+        hit = np.zeros(len(perm) + 1, dtype=bool)  # ช่องสุดท้าย = ค่าว่าง (code -1)
+        hit[perm[lo:hi]] = True
+        return hit[s.cat.codes.to_numpy()]
+
+    # ------------------------------
+    # Query
+    # ------------------------------
+    def rows(self, mask: np.ndarray = None, sort: str = None, ascending: bool = True,
+             search_col: str = None, prefix: str = "") -> np.ndarray:
+        # mask = RowSelection.mask (None = ทุกแถว) → row-id ของชุดที่เลือก ตามลำดับที่ขอ
+        if search_col and prefix.strip():
+            found = self.search_mask(search_col, prefix)
+            mask = found if mask is None else (mask & found)
+        if sort is None:
+            return np.arange(self.n, dtype=_row_dtype(self.n)) if mask is None else np.flatnonzero(mask).astype(_row_dtype(self.n))
+        order, n_valid = self.sort_order(sort)
+        if not ascending:
+            order = np.concatenate([order[:n_valid][::-1], order[n_valid:]])
+        return order if mask is None else order[mask[order]]
+
+    def page(self, rows: np.ndarray, offset: int, limit: int, columns: list = None) -> pd.DataFrame:
+        take = rows[offset:offset + limit]
+        frame = self.df.iloc[take] if columns is None else self.df.iloc[take, [self.df.columns.get_loc(c) for c in columns]]
+        return frame.set_axis(take, axis=0)
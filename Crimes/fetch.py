@@ -0,0 +1,249 @@
+# fetch.py
+# ==============================
+# Source download (resumable, checksummed, parse while downloading)
+# ==============================
+# - stream ลง <dest>.part ทีละ chunk; หลุดกลางทาง → ต่อจากไบต์ล่าสุดด้วย HTTP Range
+#   (.part ที่ค้างจากรอบก่อนก็ต่อได้ ถ้า ETag/Last-Modified ยังตรง ผ่าน If-Range)
+# - ตรวจความครบ: ขนาดตรง Content-Length และ SHA-256 ตรงค่าที่ระบุ (ถ้ามี) → ไม่ตรง = ChecksumError
+# - reader (เช่น schema.read_csv_typed) parse จากไฟล์ที่กำลังเขียนใน thread แยก
+#   → ดาวน์โหลดเสร็จก็ได้ DataFrame แทบทันที (ถ้าต้องเริ่มไฟล์ใหม่กลางทาง → parse จากไฟล์ที่เสร็จแล้วแทน)
+# - Google Drive (uc?id=...) → endpoint ดาวน์โหลดตรง (ข้ามหน้ายืนยันไฟล์ใหญ่) ไม่ต้องใช้ gdown
+import hashlib
+import http.client
+import io
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+CHUNK_SIZE = 1 << 20
+TIMEOUT = float(os.environ.get("CRIMES_FETCH_TIMEOUT", "60"))
+RETRIES = 5
+BACKOFF_SECONDS = 1.0
+DRIVE_DOWNLOAD = "https://drive.usercontent.google.com/download"
+
+
+class ChecksumError(OSError):
+    pass
+
+
+# ------------------------------
+# Source
+# ------------------------------
+def resolve_url(url: str) -> str:
+    # drive.google.com/uc?id=X (หรือ /file/d/X/view) → ดาวน์โหลดตรงพร้อม confirm
+    parsed = urllib.parse.urlparse(url)
+    if parsed.netloc != "drive.google.com":
+        return url
+    file_id = urllib.parse.parse_qs(parsed.query).get("id", [None])[0]
+    if file_id is None and "/file/d/" in parsed.path:
+        file_id = parsed.path.split("/file/d/")[1].split("/")[0]
+    if file_id is None:
+        return url
+    return f"{DRIVE_DOWNLOAD}?{urllib.parse.urlencode({'id': file_id, 'export': 'download', 'confirm': 't'})}"
+
+def _open(url: str, offset: int, validator: str):
+    # คืน (stream, ไบต์เริ่มต้นจริง, ขนาดทั้งไฟล์หรือ None, validator ของ response)
+    if "://" not in url:
+        f = open(url, "rb")
+        f.seek(offset)
+        return f, offset, os.path.getsize(url), None
+
+    headers = {"User-Agent": "crimes-dashboard"}
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+        if validator:
+            headers["If-Range"] = validator
+    resp = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=TIMEOUT)
+    if resp.headers.get_content_type() == "text/html" and "google" in urllib.parse.urlparse(resp.geturl()).netloc:
+        resp.close()
+        raise OSError("Google Drive ส่งหน้า HTML แทนไฟล์ (สิทธิ์การเข้าถึง / โควตาดาวน์โหลด)")
+    new_validator = resp.headers.get("ETag") or resp.headers.get("Last-Modified")
+    if resp.status == 206:
+        # Content-Range: bytes <start>-<end>/<total>
+        total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+        return resp, offset, int(total) if total.isdigit() else None, new_validator
+    length = resp.headers.get("Content-Length")
+    # 200 = server ไม่รองรับ Range หรือไฟล์เปลี่ยน (If-Range ไม่ตรง) → เริ่มใหม่จาก 0
+    return resp, 0, int(length) if length and length.isdigit() else None, new_validator
+
+
+# ------------------------------
+# Resume state (<dest>.part.json)
+# ------------------------------
+def _read_state(part: str, url: str) -> dict:
+    try:
+        with open(part + ".json", "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if state.get("url") == url else {}
+
+def _write_state(part: str, state: dict):
+    with open(part + ".json", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+def _clear(part: str):
+    for path in [part, part + ".json"]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# ------------------------------
+# Parse while downloading
+# ------------------------------
+class _Progress:
+    # สถานะที่ส่งจาก thread ดาวน์โหลด → TailReader
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.done = False
+        self.broken = False
+
+    def notify(self, done: bool = False, broken: bool = False):
+        with self.cond:
+            self.done = self.done or done
+            self.broken = self.broken or broken
+            self.cond.notify_all()
+
+class TailReader(io.RawIOBase):
+    # อ่านไฟล์ที่กำลังถูกเขียน: ถึงท้ายไฟล์แล้วรอจนมีข้อมูลเพิ่มหรือดาวน์โหลดจบ
+    def __init__(self, path: str, progress: _Progress):
+        self._f = open(path, "rb")
+        self._progress = progress
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while True:
+            if self._progress.broken:
+                raise OSError("download restarted")
+            n = self._f.readinto(b)
+            if n:
+                return n
+            with self._progress.cond:
+                if self._progress.done and not self._progress.broken:
+                    # อ่านอีกรอบหลัง done (อาจมีไบต์สุดท้ายที่เขียนก่อน notify)
+                    n = self._f.readinto(b)
+                    return n or 0
+                self._progress.cond.wait(0.5)
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+class _Parser(threading.Thread):
+    def __init__(self, reader, path: str, progress: _Progress):
+        super().__init__(daemon=True)
+        self.reader = reader
+        self.path = path
+        self.progress = progress
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            with io.BufferedReader(TailReader(self.path, self.progress), CHUNK_SIZE) as stream:
+                self.result = self.reader(stream)
+        except Exception as e:
+            self.error = e
+
+
+# ------------------------------
+# Fetch
+# ------------------------------
+def _hash_prefix(path: str, size: int):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = size
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            h.update(chunk)
+            remaining -= len(chunk)
+    return h
+
+def _download(url: str, part: str, state: dict, progress: _Progress) -> str:
+    # ดาวน์โหลดจนครบ (retry + resume) แล้วคืน SHA-256 ของทั้งไฟล์
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        try:
+            stream, start, total, validator = _open(url, offset, state.get("validator"))
+            with stream:
+                if start != offset:
+                    progress.notify(broken=True)
+                state = {"url": url, "validator": validator}
+                _write_state(part, state)
+                h = _hash_prefix(part, start) if start else hashlib.sha256()
+                with open(part, "r+b" if os.path.exists(part) else "wb") as out:
+                    out.seek(start)
+                    out.truncate()
+                    size = start
+                    while True:
+                        chunk = stream.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        out.flush()
+                        h.update(chunk)
+                        size += len(chunk)
+                        progress.notify()
+            if total is not None and size != total:
+                raise OSError(f"incomplete download: {size:,}/{total:,} bytes")
+            return h.hexdigest()
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset > 0:
+                # ช่วงที่ขอเกินขนาดไฟล์ (ไฟล์ต้นทางเปลี่ยน) → เริ่มใหม่
+                progress.notify(broken=True)
+                _clear(part)
+                state = {}
+                continue
+            if e.code < 500:
+                raise
+            error = e
+        except (OSError, http.client.HTTPException) as e:
+            error = e
+        attempt += 1
+        if attempt > RETRIES:
+            raise OSError(f"download failed after {RETRIES} retries: {error}") from error
+        time.sleep(BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+def fetch(url: str, dest: str, reader=None, sha256: str = None):
+    # คืน (sha256, DataFrame จาก reader หรือ None)
+    # dest ที่ได้ = ไฟล์ครบและตรง checksum เท่านั้น; ระหว่างดาวน์โหลดอยู่ที่ dest + ".part"
+    url = resolve_url(url)
+    part = dest + ".part"
+    state = _read_state(part, url)
+    if not state:
+        # .part ที่ไม่มีสถานะ (หรือของ URL อื่น) ต่อไม่ได้
+        _clear(part)
+    if not os.path.exists(part):
+        open(part, "wb").close()
+    progress = _Progress()
+    parser = None
+    if reader is not None:
+        parser = _Parser(reader, part, progress)
+        parser.start()
+    try:
+        digest = _download(url, part, state, progress)
+    except BaseException:
+        progress.notify(done=True, broken=True)
+        raise
+    finally:
+        if parser is not None:
+            progress.notify(done=True)
+            parser.join()
+
+    if sha256 and digest != sha256.lower():
+        _clear(part)
+        raise ChecksumError(f"SHA-256 mismatch for {url}: expected {sha256}, got {digest}")
+    os.replace(part, dest)
+    _clear(part)
+    # parse ระหว่างทางไม่สำเร็จ (เริ่มใหม่กลางทาง / reader error) → ให้ผู้เรียก parse จาก dest เอง
+    df = parser.result if parser is not None and parser.error is None and not progress.broken else None
+    return digest, df
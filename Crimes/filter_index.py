@@ -0,0 +1,176 @@
+# filter_index.py
+# ==============================
+# Index-backed filter engine (แทน df.copy() + boolean mask ต่อเนื่อง)
+# ==============================
+# - สร้างครั้งเดียวต่อ dataset: ต่อคอลัมน์ที่กรองได้ เก็บ row-id เรียงตามค่า (posting lists)
+# - กรอง = รวม row-id ของค่าที่เลือก (OR) แล้ว AND ข้ามคอลัมน์เป็น bitmap (np.bool_)
+# - ผลลัพธ์เป็น RowSelection (ไม่ copy ทั้งตาราง) → ดึงเฉพาะคอลัมน์/แถวที่ต้องใช้จริง
+import numpy as np
+import pandas as pd
+
+import schema
+
+INDEX_COLUMNS = ["Year"] + schema.FILTER_COLUMNS
+
+
+# ------------------------------
+# Posting lists
+# ------------------------------
+def _row_dtype(n: int):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+def build_postings(s: pd.Series):
+    # คืน (order, spans): order = row-id เรียงตามค่า, spans = {value: (start, end)} ใน order
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy()
+        labels = s.cat.categories
+    else:
+        valid = s.notna().to_numpy()
+        values = s[valid]
+        values = values.to_numpy(dtype=getattr(values.dtype, "numpy_dtype", None))
+        labels, inverse = np.unique(values, return_inverse=True)
+        codes = np.full(len(s), -1, dtype=np.int64)
+        codes[valid] = inverse
+
+    order = np.argsort(codes, kind="stable").astype(_row_dtype(len(s)))
+    sorted_codes = codes[order]
+    first_valid = int(np.searchsorted(sorted_codes, 0))
+    order = order[first_valid:]
+    sorted_codes = sorted_codes[first_valid:]
+
+    uniq, starts = np.unique(sorted_codes, return_index=True)
+    ends = np.append(starts[1:], len(sorted_codes))
+    spans = {}
+    for code, start, end in zip(uniq, starts, ends):
+        label = labels[code]
+        spans[label.item() if hasattr(label, "item") else label] = (int(start), int(end))
+    return order, spans
+
+
+class FilterIndex:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.n = len(df)
+        self.postings = {col: build_postings(df[col]) for col in INDEX_COLUMNS if col in df.columns}
+        # row-id ของค่าว่างต่อคอลัมน์ (ใช้นับ Missing ในชุดที่เลือกโดยไม่ต้อง isna() ทั้งตาราง)
+        self.null_rows = {}
+        for col in df.columns:
+            isna = df[col].isna().to_numpy()
+            if isna.any():
+                self.null_rows[col] = np.flatnonzero(isna).astype(_row_dtype(self.n))
+
+    def value_mask(self, col: str, values) -> np.ndarray:
+        order, spans = self.postings[col]
+        mask = np.zeros(self.n, dtype=bool)
+        for v in values:
+            span = spans.get(v)
+            if span is not None:
+                mask[order[span[0]:span[1]]] = True
+        return mask
+
+    def range_mask(self, col: str, lo, hi):
+        # None = ครอบคลุมทุกแถวที่มีค่า (ไม่ต้องกรอง)
+        order, spans = self.postings[col]
+        keys = sorted(spans)
+        inside = [k for k in keys if lo <= k <= hi]
+        if len(inside) == len(keys) and len(order) == self.n:
+            return None
+        mask = np.zeros(self.n, dtype=bool)
+        if inside:
+            mask[order[spans[inside[0]][0]:spans[inside[-1]][1]]] = True
+        return mask
+
+    def select(self, filters: dict) -> "RowSelection":
+        mask = None
+        year_range = filters.get("Year")
+        if year_range is not None and "Year" in self.postings:
+            mask = self.range_mask("Year", year_range[0], year_range[1])
+        for col in schema.FILTER_COLUMNS:
+            vals = filters.get(col)
+            if not vals or col not in self.postings:
+                continue
+            m = self.value_mask(col, vals)
+            mask = m if mask is None else (mask & m)
+        return RowSelection(self, mask)
+
+
+# ------------------------------
+# Lightweight selection view
+# ------------------------------
+class RowSelection:
+    def __init__(self, index: FilterIndex, mask: np.ndarray = None):
+        self.index = index
+        self.df = index.df
+        self.mask = mask
+        self._rows = None
+
+    @property
+    def rows(self) -> np.ndarray:
+        if self._rows is None:
+            if self.mask is None:
+                self._rows = np.arange(self.index.n, dtype=_row_dtype(self.index.n))
+            else:
+                self._rows = np.flatnonzero(self.mask).astype(_row_dtype(self.index.n))
+        return self._rows
+
+    def __len__(self) -> int:
+        if self.mask is None:
+            return self.index.n
+        return len(self.rows)
+
+    @property
+    def nbytes(self) -> int:
+        # ขนาดโดยประมาณ (ใช้กับ memory budget ของ result cache)
+        if self.mask is None:
+            return 0
+        return self.mask.nbytes + len(self) * np.dtype(_row_dtype(self.index.n)).itemsize
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @property
+    def columns(self) -> pd.Index:
+        return self.df.columns
+
+    def __getitem__(self, key):
+        # materialize เฉพาะคอลัมน์ที่ขอ
+        if self.mask is None:
+            return self.df[key]
+        if isinstance(key, str):
+            return self.df[key].iloc[self.rows]
+        return self.df.iloc[self.rows, [self.df.columns.get_loc(c) for c in key]]
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        if self.mask is None:
+            return self.df.head(n)
+        return self.df.iloc[self.rows[:n]]
+
+    def dropna(self, subset: list) -> "RowSelection":
+        # เทียบเท่า df.dropna(subset=...) แต่คืน selection ใหม่ (ไม่ copy ข้อมูล)
+        mask = np.ones(self.index.n, dtype=bool) if self.mask is None else self.mask.copy()
+        for col in subset:
+            null = self.index.null_rows.get(col)
+            if null is not None:
+                mask[null] = False
+        return RowSelection(self.index, mask)
+
+    def intersect(self, mask: np.ndarray) -> "RowSelection":
+        # AND กับ bitmap ภายนอก (เช่น valid_mask ของ geo.SpatialIndex)
+        return RowSelection(self.index, mask if self.mask is None else (self.mask & mask))
+
+    def missing_counts(self) -> pd.Series:
+        # เทียบเท่า schema.missing_counts(frame) แต่นับจาก null row-id ของ index
+        counts = {}
+        for col in self.df.columns:
+            null = self.index.null_rows.get(col)
+            if null is None:
+                counts[col] = 0
+            elif self.mask is None:
+                counts[col] = len(null)
+            else:
+                counts[col] = int(self.mask[null].sum())
+        if schema.has_derived_location(self.df):
+            geo = self.dropna(["Latitude", "Longitude"])
+            counts["Location"] = len(self) - len(geo)
+        return pd.Series(counts, dtype="int64")
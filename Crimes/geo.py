@@ -0,0 +1,127 @@
+# geo.py
+# ==============================
+# Server-side spatial binning for the Hotspot Map
+# ==============================
+# รวมทุกแถวที่มีพิกัดเป็นช่องกริด (square grid) ด้วย NumPy แทนการสุ่ม 3000 จุด
+# - ความละเอียดของกริดขึ้นกับระดับซูม (ช่อง ≈ CELL_PX พิกเซลบนจอ)
+# - ถ้าจำนวนช่องเกิน max_cells จะลดความละเอียดลงจน payload ไม่เกินขอบเขต
+import math
+
+import numpy as np
+import pandas as pd
+
+TILE_PX = 256
+CELL_PX = 16
+MAX_CELLS = 4000
+
+
+def valid_coords(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    # เทียบเท่า dropna + between(-90, 90) / between(-180, 180)
+    return np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+
+def cell_size(zoom: float, ref_lat: float, cell_px: int = CELL_PX):
+    # ขนาดช่อง (องศา) ให้ใกล้สี่เหลี่ยมจัตุรัสบน Web Mercator ที่ละติจูดอ้างอิง
+    lon_step = 360.0 / (TILE_PX * 2 ** zoom) * cell_px
+    lat_step = lon_step * max(math.cos(math.radians(ref_lat)), 0.01)
+    return lat_step, lon_step
+
+def bin_points(lat: np.ndarray, lon: np.ndarray, lat_step: float, lon_step: float):
+    iy = np.floor((lat + 90.0) / lat_step).astype(np.int64)
+    ix = np.floor((lon + 180.0) / lon_step).astype(np.int64)
+    ncols = int(math.ceil(360.0 / lon_step)) + 1
+    keys, counts = np.unique(iy * ncols + ix, return_counts=True)
+    cy, cx = np.divmod(keys, ncols)
+    return (cy + 0.5) * lat_step - 90.0, (cx + 0.5) * lon_step - 180.0, counts
+
+def density_grid(lat, lon, zoom: float, max_cells: int = MAX_CELLS) -> pd.DataFrame:
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    ok = valid_coords(lat, lon)
+    lat, lon = lat[ok], lon[ok]
+    if len(lat) == 0:
+        return pd.DataFrame({"Latitude": [], "Longitude": [], "Count": []})
+
+    ref_lat = float(np.median(lat))
+    z = float(zoom)
+    while True:
+        lat_step, lon_step = cell_size(z, ref_lat)
+        c_lat, c_lon, counts = bin_points(lat, lon, lat_step, lon_step)
+        if len(counts) <= max_cells or z <= 0:
+            break
+        z -= 1
+
+    return pd.DataFrame({"Latitude": c_lat, "Longitude": c_lon, "Count": counts}).assign(Zoom=z)
+
+
+# ==============================
+# Spatial grid index (After dataset)
+# ==============================
+# สร้างครั้งเดียวตอนโหลด: row-id ของแถวที่พิกัดถูกต้อง เรียงตามช่องกริดละเอียด (~500 m)
+# → bbox/radius query แตะเฉพาะช่องที่เกี่ยวข้อง (แต่ละแถวของกริดเป็นช่วงต่อเนื่องใน array)
+EARTH_RADIUS_M = 6371008.8
+INDEX_CELL_DEG = 0.005
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dp = p2 - p1
+    dl = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class SpatialIndex:
+    def __init__(self, lat, lon, cell_deg: float = INDEX_CELL_DEG):
+        lat = np.asarray(lat, dtype="float64")
+        lon = np.asarray(lon, dtype="float64")
+        self.n = len(lat)
+        self.cell_deg = cell_deg
+        self.ncols = int(math.ceil(360.0 / cell_deg)) + 1
+        # map-ready rows (แทน dropna + between ทุก rerun)
+        self.valid_mask = valid_coords(lat, lon)
+
+        rows = np.flatnonzero(self.valid_mask)
+        keys = self._keys(lat[rows], lon[rows])
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.rows = rows[order].astype(np.int32 if self.n < np.iinfo(np.int32).max else np.int64)
+        self.lat = lat[rows][order]
+        self.lon = lon[rows][order]
+
+    def _cell(self, lat, lon):
+        iy = np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype(np.int64)
+        ix = np.floor((np.asarray(lon) + 180.0) / self.cell_deg).astype(np.int64)
+        return iy, ix
+
+    def _keys(self, lat, lon) -> np.ndarray:
+        iy, ix = self._cell(lat, lon)
+        return iy * self.ncols + ix
+
+    def _candidates(self, lat_min, lat_max, lon_min, lon_max) -> np.ndarray:
+        # ตำแหน่ง (ใน array ที่เรียงแล้ว) ของแถวในช่องที่ทับ bbox
+        iy0, ix0 = self._cell(max(lat_min, -90.0), max(lon_min, -180.0))
+        iy1, ix1 = self._cell(min(lat_max, 90.0), min(lon_max, 180.0))
+        parts = []
+        for iy in range(int(iy0), int(iy1) + 1):
+            lo = np.searchsorted(self.keys, iy * self.ncols + ix0, side="left")
+            hi = np.searchsorted(self.keys, iy * self.ncols + ix1, side="right")
+            if hi > lo:
+                parts.append(np.arange(lo, hi))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def bbox_rows(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> np.ndarray:
+        pos = self._candidates(lat_min, lat_max, lon_min, lon_max)
+        lat, lon = self.lat[pos], self.lon[pos]
+        inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        return np.sort(self.rows[pos[inside]])
+
+    def radius_rows(self, lat: float, lon: float, meters: float):
+        # คืน (row ids, ระยะทางเมตร) เรียงตาม row id
+        dlat = math.degrees(meters / EARTH_RADIUS_M)
+        dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+        pos = self._candidates(lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+        dist = haversine_m(lat, lon, self.lat[pos], self.lon[pos])
+        inside = dist <= meters
+        rows, dist = self.rows[pos[inside]], dist[inside]
+        order = np.argsort(rows, kind="stable")
+        return rows[order], dist[order]
@@ -0,0 +1,141 @@
+# heavy_hitters.py
+# ==============================
+# Top-K แบบตัดรายการต่อ partition (per-partition truncated top-K)
+# ==============================
+# คอลัมน์ cardinality สูง (Block / Description / IUCR) ใส่ใน cube ไม่ได้ (cube จะใหญ่เท่าข้อมูล)
+# → เก็บรายการ Top-K ขนาดคงที่ต่อ partition (Year × District) แล้วรวมตามตัวกรองแทนการ scan แถว
+# - ไม่ใช่ streaming sketch: นับจริง (groupby) ต่อ partition ตอน build แล้วเก็บเฉพาะ CAPACITY ค่าที่พบบ่อยสุด
+#   + Floor = จำนวนของค่าอันดับแรกที่ถูกตัดทิ้ง (ค่าที่ถูกตัดทุกค่ามีจำนวนไม่เกินนี้)
+# - รวมหลาย partition:
+#     Count (ขอบล่าง) = ผลรวมของ partition ที่มีค่านั้นในรายการ
+#     Max (ขอบบน)    = Count + Floor ของ partition ที่ไม่มีค่านั้นในรายการ
+#   ค่าที่ไม่อยู่ในผลรวมเลยมีจำนวนไม่เกิน Σ Floor; ช่วง Count..Max มาจากส่วนที่ถูกตัดเท่านั้น (ไม่ใช่ค่าคลาดเคลื่อนเชิงสถิติ)
+# - partition ที่ไม่ถูกตัด (ค่าน้อยกว่า CAPACITY) มี Floor = 0 → ผลเป็นค่าจริง
+import os
+
+import numpy as np
+import pandas as pd
+
+import cube
+import data_cache
+
+HH_COLUMNS = ["Block", "Description", "IUCR"]
+PARTITION_KEYS = ["Year", "District"]
+CAPACITY = 200  # ค่าต่อ partition ต่อคอลัมน์
+
+
+# ------------------------------
+# Build (ต่อ partition)
+# ------------------------------
+def build_partition_top_k(df: pd.DataFrame, dataset: str, capacity: int = CAPACITY) -> pd.DataFrame:
+    # แถว = (Dataset, Column, Year, District, Value, Count, Floor)
+    keys = pd.DataFrame({k: df[k] if k in df.columns else pd.Series(pd.NA, index=df.index, dtype="Int16") for k in PARTITION_KEYS})
+    frames = []
+    for col in HH_COLUMNS:
+        if col not in df.columns:
+            continue
+        valid = df[col].notna().to_numpy()
+        sub = keys[valid].assign(Value=df[col][valid])
+        sizes = sub.groupby(PARTITION_KEYS + ["Value"], observed=True, dropna=False).size().reset_index(name="Count")
+        sizes = sizes.sort_values(PARTITION_KEYS + ["Count"], ascending=[True, True, False], kind="stable")
+        rank = sizes.groupby(PARTITION_KEYS, dropna=False, sort=False).cumcount().to_numpy()
+        # Floor ของ partition = จำนวนของค่าอันดับ capacity+1 (ค่าแรกที่ถูกตัด)
+        floors = sizes.loc[rank == capacity, PARTITION_KEYS + ["Count"]].rename(columns={"Count": "Floor"})
+        kept = sizes[rank < capacity].merge(floors, on=PARTITION_KEYS, how="left")
+        kept["Value"] = kept["Value"].astype(str)
+        kept.insert(0, "Column", col)
+        frames.append(kept)
+    if not frames:
+        return pd.DataFrame(columns=["Dataset", "Column"] + PARTITION_KEYS + ["Value", "Count", "Floor"])
+    out = pd.concat(frames, ignore_index=True)
+    out.insert(0, "Dataset", dataset)
+    out["Count"] = out["Count"].astype(np.int64)
+    out["Floor"] = out["Floor"].fillna(0).astype(np.int64)
+    return out
+
+def merge_partials(partials: list) -> pd.DataFrame:
+    # partial ต่อ source (ช่วงแถว / ไฟล์ปี) เก็บแยกด้วย Part → Floor ของแต่ละ partition ยังถูกต้อง
+    out = pd.concat([p.assign(Part=i) for i, p in enumerate(partials)], ignore_index=True)
+    for col in ["Dataset", "Column", "Value"]:
+        out[col] = out[col].astype("category")
+    out["Part"] = out["Part"].astype(np.int32)
+    return out
+
+def apply_delta(tops: pd.DataFrame, removed: pd.DataFrame, added: pd.DataFrame, dataset: str,
+                capacity: int = CAPACITY) -> pd.DataFrame:
+    # ต่อรายการของ delta เป็น Part ใหม่ (ไม่ต้องนับทั้งชุดใหม่):
+    # - แถวใหม่ → รายการที่ตัดที่ capacity พร้อม Floor ของตัวเอง (เหมือน partition เพิ่มอีกหนึ่ง)
+    # - แถวเดิมที่ถูกแทนที่ → จำนวนติดลบ (ไม่ตัด, Floor = 0) เฉพาะค่าที่อยู่ในรายการของ partition เดียวกันแล้ว
+    #   ค่าที่ถูกตัดทิ้งไม่ถูกลบ → Count ยังเป็นขอบล่างและ Max ยังเป็นขอบบน
+    parts = [tops]
+    part = int(tops["Part"].max()) + 1 if len(tops) else 0
+    if len(removed):
+        neg = build_partition_top_k(removed, dataset, len(removed))
+        listed = tops[["Column"] + PARTITION_KEYS + ["Value"]].drop_duplicates().astype({"Column": object, "Value": object})
+        neg = neg.merge(listed, on=["Column"] + PARTITION_KEYS + ["Value"], how="inner")
+        neg["Count"] = -neg["Count"]
+        parts.append(neg.assign(Part=part))
+        part += 1
+    if len(added):
+        parts.append(build_partition_top_k(added, dataset, capacity).assign(Part=part))
+    out = pd.concat(parts, ignore_index=True)
+    for col in ["Dataset", "Column", "Value"]:
+        out[col] = out[col].astype("category")
+    out["Part"] = out["Part"].astype(np.int32)
+    return out
+
+
+# ------------------------------
+# Persist (ข้าง Parquet เหมือน cube)
+# ------------------------------
+def top_k_path(parquet_path: str, version: str) -> str:
+    return data_cache.derived_path(parquet_path, f".{version}.topk.parquet")
+
+def load_or_build(parquet_path: str, version: str, build_fn) -> pd.DataFrame:
+    # build_fn() -> รายการ Top-K เช่น parallel.partition_top_k(...)
+    path = top_k_path(parquet_path, version)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    tops = build_fn()
+    cube.save_cube(tops, path)
+    return tops
+
+
+# ------------------------------
+# Query (merge ตามตัวกรอง)
+# ------------------------------
+def covers(filters: dict) -> bool:
+    # รายการแยกตาม Year × District เท่านั้น → ตัวกรองอื่นต้องนับจากแถวจริง
+    return not any(filters.get(c) for c in ["Primary Type", "Location Description", "Arrest", "Domestic"])
+
+def select(tops: pd.DataFrame, col: str, filters: dict, dataset: str) -> pd.DataFrame:
+    mask = ((tops["Dataset"] == dataset) & (tops["Column"] == col)).to_numpy(dtype=bool, copy=True)
+    year_range = filters.get("Year")
+    if year_range is not None:
+        year = tops["Year"]
+        mask &= ((year >= year_range[0]) & (year <= year_range[1])).fillna(False).to_numpy(dtype=bool)
+    if filters.get("District"):
+        mask &= tops["District"].isin(filters["District"]).to_numpy(dtype=bool)
+    return tops[mask]
+
+def top_k(tops: pd.DataFrame, col: str, filters: dict, dataset: str, k: int) -> tuple:
+    # คืน (DataFrame [col, Count, Max, Error] เรียงจากมากไปน้อย, จำนวนสูงสุดของค่าที่ไม่อยู่ในรายการ)
+    sel = select(tops, col, filters, dataset)
+    if sel.empty:
+        return pd.DataFrame(columns=[col, "Count", "Max", "Error"]), 0
+    floor_total = int(sel.drop_duplicates(["Part"] + PARTITION_KEYS)["Floor"].sum())
+    merged = sel.groupby("Value", observed=True).agg(Count=("Count", "sum"), ListedFloor=("Floor", "sum"))
+    merged = merged.sort_values("Count", ascending=False, kind="stable").head(k)
+    merged["Max"] = merged["Count"] + floor_total - merged["ListedFloor"]
+    merged["Error"] = merged["Max"] - merged["Count"]
+    out = merged.reset_index().rename(columns={"Value": col})[[col, "Count", "Max", "Error"]]
+    return out, floor_total
+
+def exact_top_k(counts: pd.Series, col: str, k: int) -> tuple:
+    # ตัวกรองที่รายการต่อ partition ไม่รองรับ → value_counts ของแถวที่เลือก (จาก backend, เรียงมากไปน้อย; Error = 0)
+    counts = counts.sort_values(ascending=False, kind="stable").head(k)
+    out = counts.rename_axis(col).reset_index(name="Count")
+    out[col] = out[col].astype(str)
+    out["Max"] = out["Count"]
+    out["Error"] = 0
+    return out, 0
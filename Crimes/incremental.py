@@ -0,0 +1,224 @@
+# incremental.py
+# ==============================
+# Incremental refresh ("Updated On" + ID watermark)
+# ==============================
+# - แหล่งข้อมูลส่วนเพิ่ม = ไฟล์ CSV ใน drop directory (หรือไฟล์เดียว) คอลัมน์เดียวกับชุดหลัก
+# - เก็บ watermark (Updated On สูงสุด, ID) ต่อ URL ไว้ใน manifest ของ data_cache
+#   → อ่านเฉพาะแถวที่ (Updated On, ID) ใหม่กว่า watermark (แถวที่ถูกแก้ไขจะมี Updated On ใหม่)
+# - upsert ตาม ID ลง Parquet ชุดใหม่ (แถวเดิมที่ ID ซ้ำถูกแทนที่) แล้วชี้ manifest ไปที่ไฟล์ใหม่
+# - aggregate ที่เก็บไว้ (cube / rollup เวลา / รายการ Top-K ต่อ partition / stratified sample / สรุปแถวซ้ำ) ถูกปรับด้วย delta
+#   (ลบแถวที่ถูกแทนที่ + บวกแถวใหม่) ไม่ต้องนับทั้งชุดใหม่; Arrow store / partition ปี ของชุดใหม่สร้างจาก store เดิม + delta
+import glob
+import hashlib
+import os
+import threading
+import time
+
+import pandas as pd
+
+import cube
+import data_cache
+import dataset_store
+import duplicates
+import heavy_hitters
+import partitions
+import sampling
+import schema
+import temporal
+
+KEY_COL = "ID"
+UPDATED_COL = "Updated On"
+
+# refresh ทีละรอบต่อ process (delta เดียวกัน → ชื่อไฟล์ชุดใหม่เดียวกัน)
+_refresh_lock = threading.Lock()
+
+
+# ------------------------------
+# Watermark
+# ------------------------------
+def compute_watermark(df: pd.DataFrame):
+    # (Updated On สูงสุด, ID สูงสุดในเวลานั้น) หรือ None ถ้าไม่มีข้อมูลเวลา
+    if UPDATED_COL not in df.columns or KEY_COL not in df.columns:
+        return None
+    updated = df[UPDATED_COL]
+    if not updated.notna().any():
+        return None
+    latest = updated.max()
+    ids = df.loc[updated == latest, KEY_COL]
+    return {"updated_on": latest.isoformat(), "id": int(ids.max())}
+
+def newer_than(df: pd.DataFrame, watermark) -> pd.DataFrame:
+    # แถวที่ไม่มี Updated On เรียงลำดับไม่ได้ → ไม่นำเข้า
+    updated = df[UPDATED_COL]
+    if watermark is None:
+        return df[updated.notna()]
+    wm_time = pd.Timestamp(watermark["updated_on"])
+    keep = (updated > wm_time) | ((updated == wm_time) & (df[KEY_COL] > watermark["id"]))
+    return df[keep.fillna(False).to_numpy(dtype=bool)]
+
+
+# ------------------------------
+# Drop files
+# ------------------------------
+def drop_files(source: str) -> list:
+    if not source:
+        return []
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "*.csv")))
+    return [source] if os.path.isfile(source) else []
+
+def file_fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+def read_delta(paths: list, reader=schema.read_csv_typed) -> pd.DataFrame:
+    frames = [reader(p) for p in paths]
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return None
+    delta = schema.concat_typed(frames)
+    # ID เดียวกันหลายเวอร์ชัน → เก็บเวอร์ชันล่าสุด
+    delta = delta.sort_values(UPDATED_COL, kind="stable", na_position="first")
+    return delta.drop_duplicates(KEY_COL, keep="last").reset_index(drop=True)
+
+
+# ------------------------------
+# Upsert
+# ------------------------------
+def upsert(base: pd.DataFrame, delta: pd.DataFrame):
+    # คืน (merged, removed): removed = แถวเดิมที่ถูกแทนที่ (ใช้ปรับ aggregate)
+    replaced = base[KEY_COL].isin(delta[KEY_COL]).to_numpy()
+    removed = base[replaced]
+    kept = base[~replaced] if replaced.any() else base
+    return schema.concat_typed([kept, delta]), removed
+
+def _delta_name(entry: dict, delta: pd.DataFrame) -> str:
+    stem = entry["parquet"][: -len(".parquet")].split("+")[0]
+    h = hashlib.sha256(entry["parquet"].encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(delta, index=False).to_numpy().tobytes())
+    return f"{stem}+{h.hexdigest()[:12]}.parquet"
+
+def _dataset(stored: pd.DataFrame, url: str) -> str:
+    return stored["Dataset"].iloc[0] if len(stored) else url
+
+def update_aggregates(base_path: str, new_path: str, prep_version: str, url: str, removed: pd.DataFrame, added: pd.DataFrame,
+                      related_before: pd.DataFrame = None, related_after: pd.DataFrame = None):
+    # aggregate ที่เก็บไว้ของชุดเดิม (cube / rollup เวลา / รายการ Top-K / sample / สรุปแถวซ้ำ) → ปรับด้วย delta แล้วเก็บคู่กับไฟล์ใหม่
+    # แทนการสร้างใหม่ทั้งชุด; ตัวที่ยังไม่เคยสร้างจะถูกสร้างตอนโหลดครั้งแรกตามปกติ
+    # removed / added = แถวที่ผ่าน prepare แล้ว; related_* = แถวของ Case ที่ delta แตะ ในชุดเดิม / ชุดใหม่ (duplicates.related)
+    old_cube = cube.cube_path(base_path, prep_version)
+    if os.path.exists(old_cube):
+        stored = pd.read_parquet(old_cube)
+        updated_cube = cube.apply_delta(stored, removed, added, _dataset(stored, url))
+        cube.save_cube(updated_cube, cube.cube_path(new_path, prep_version))
+
+    old_time = temporal.rollup_path(base_path, prep_version)
+    if os.path.exists(old_time):
+        stored = pd.read_parquet(old_time)
+        rollup = temporal.apply_delta(stored, removed, added, _dataset(stored, url))
+        cube.save_cube(rollup, temporal.rollup_path(new_path, prep_version))
+
+    old_tops = heavy_hitters.top_k_path(base_path, prep_version)
+    if os.path.exists(old_tops):
+        stored = pd.read_parquet(old_tops)
+        tops = heavy_hitters.apply_delta(stored, removed, added, _dataset(stored, url))
+        cube.save_cube(tops, heavy_hitters.top_k_path(new_path, prep_version))
+
+    samples = sampling.load(base_path, prep_version)
+    if samples is not None:
+        stored, values = samples
+        sample, values = sampling.apply_delta(stored, values, removed, added, _dataset(stored, url))
+        sampling.save(sample, values, new_path, prep_version)
+
+    old_dups = duplicates.summary_path(base_path, prep_version)
+    if os.path.exists(old_dups) and related_before is not None:
+        stored = pd.read_parquet(old_dups)
+        dups = duplicates.apply_delta(stored, related_before, related_after, _dataset(stored, url))
+        cube.save_cube(dups, duplicates.summary_path(new_path, prep_version))
+
+def update_stores(base_path: str, new_path: str, prep_version: str, removed: pd.DataFrame, added: pd.DataFrame):
+    # store ที่สร้างไว้ของชุดเดิม (Arrow store / partition ปี) → ของชุดใหม่จาก delta
+    # (partition: เขียนใหม่เฉพาะปีที่ delta แตะ) แทนการ prepare + เขียนทั้งชุดใหม่ตอนเปิดครั้งแรก
+    old_arrow = dataset_store.arrow_path(base_path, prep_version)
+    if os.path.exists(old_arrow):
+        dataset_store.apply_delta(old_arrow, dataset_store.arrow_path(new_path, prep_version), removed, added, KEY_COL)
+
+    old_parts = partitions.partition_root(base_path, prep_version)
+    if os.path.exists(os.path.join(old_parts, partitions.METADATA_NAME)):
+        partitions.apply_delta(old_parts, partitions.partition_root(new_path, prep_version), removed, added, KEY_COL)
+
+def _commit(url: str, old_name: str, changes: dict, cache_dir: str) -> bool:
+    # อัปเดต entry ใน manifest ถ้ายังชี้ไฟล์เดิม (ไม่มี refresh เต็มชุดแทรกระหว่างรอบนี้)
+    with data_cache.manifest_lock():
+        manifest = data_cache.read_manifest(cache_dir)
+        entry = manifest.get(url)
+        if entry is None or entry["parquet"] != old_name:
+            return False
+        entry.update(changes)
+        data_cache.write_manifest(manifest, cache_dir)
+        new_name = entry["parquet"]
+        if old_name != new_name:
+            data_cache.remove_if_unreferenced(old_name, manifest, cache_dir)
+    return True
+
+def refresh(url: str, source: str, prepare, prep_version: str,
+            reader=schema.read_csv_typed, version: str = schema.SCHEMA_VERSION,
+            cache_dir: str = data_cache.CACHE_DIR) -> dict:
+    # คืนสรุปการ refresh ({"files", "added", "updated", "watermark"}) หรือ None ถ้าไม่มีอะไรใหม่
+    # prepare/prep_version = ขั้นเตรียมข้อมูลของ app (ใช้ปรับ aggregate / store ที่เก็บไว้ของชุดนี้)
+    data_cache.ensure_cached(url, reader, version, cache_dir)
+    with _refresh_lock:
+        # อ่าน manifest ใต้ lock แล้วปล่อย → อ่าน / upsert / เขียนไฟล์ชุดใหม่นอก lock (ensure_cached ของ URL อื่นไม่ต้องรอ)
+        with data_cache.manifest_lock():
+            entry = dict(data_cache.read_manifest(cache_dir)[url])
+        old_name = entry["parquet"]
+        base_path = os.path.join(cache_dir, old_name)
+        applied = set(entry.get("applied", []))
+        paths = [p for p in drop_files(source) if file_fingerprint(p) not in applied]
+        if not paths:
+            return None
+
+        base = data_cache.read_parquet_mmap(base_path)
+        watermark = entry.get("watermark") or compute_watermark(base)
+        delta = read_delta(paths, reader)
+        delta = newer_than(delta, watermark) if delta is not None else None
+        fingerprints = sorted(applied | {file_fingerprint(p) for p in paths})
+
+        if delta is None or len(delta) == 0:
+            if not _commit(url, old_name, {"applied": fingerprints, "watermark": watermark}, cache_dir):
+                return None
+            return {"files": len(paths), "added": 0, "updated": 0, "watermark": watermark}
+
+        delta = delta[base.columns.intersection(delta.columns)]
+        merged, removed = upsert(base, delta)
+        new_name = _delta_name(entry, delta)
+        new_path = os.path.join(cache_dir, new_name)
+        tmp = new_path + ".tmp"
+        merged.to_parquet(tmp, index=False)
+        os.replace(tmp, new_path)
+        related_before = prepare(base[duplicates.related(base, removed, delta, KEY_COL)])
+        related_after = prepare(merged[duplicates.related(merged, removed, delta, KEY_COL)])
+        removed, added = prepare(removed), prepare(delta)
+        update_stores(base_path, new_path, prep_version, removed, added)
+        update_aggregates(base_path, new_path, prep_version, url, removed, added, related_before, related_after)
+
+        # ทุกแถวใน delta ใหม่กว่า watermark เดิมแล้ว
+        watermark = compute_watermark(delta)
+        changes = {
+            "parquet": new_name,
+            "watermark": watermark,
+            "applied": fingerprints,
+            "refreshed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        if not _commit(url, old_name, changes, cache_dir):
+            # ชุดหลักถูกดึงใหม่ระหว่างรอบนี้ → ทิ้งไฟล์ที่สร้าง (delta จะถูกนำเข้ากับชุดใหม่รอบถัดไป)
+            with data_cache.manifest_lock():
+                data_cache.remove_if_unreferenced(new_name, data_cache.read_manifest(cache_dir), cache_dir)
+            return None
+
+    return {
+        "files": len(paths),
+        "added": int(len(delta) - len(removed)),
+        "updated": int(len(removed)),
+        "watermark": watermark,
+    }
@@ -0,0 +1,203 @@
+# parallel.py
+# ==============================
+# Parallel aggregation over partitions (process pool)
+# ==============================
+# - แบ่งงานเป็น partition: ช่วงแถวของ Arrow store (dataset_store) หรือไฟล์ Year=YYYY (partitions)
+# - input ใช้หน่วยความจำร่วมกัน: worker เปิดไฟล์ Arrow เดียวกันแบบ memory map (page cache ร่วม, ไม่ pickle ข้อมูล)
+#   → ส่งข้าม process แค่ (path, ช่วงแถว) ไปและผลรวมย่อย (partial) กลับ
+# - partial รวมกันได้ด้วยการบวก: cube, missing counts, rollup เวลา (ต่อ TimeKey)
+#   (stratified sample / Top-K ที่ตัดรายการต่อ partition รวมด้วยการต่อกัน)
+# - worker = process `python -m parallel_worker` (ดู parallel_worker.py) → ไม่รัน app.py ซ้ำใน worker
+#   และไม่ต้องแก้ sys.modules ของ process หลัก; เริ่ม worker ไม่ได้ → คำนวณใน process หลักแทน
+# - ข้อมูลเล็ก / CRIMES_WORKERS=1 → คำนวณใน process เดียว (ไม่เสียเวลาเปิด pool)
+import os
+import queue
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client
+
+import pandas as pd
+
+import cube
+import duplicates
+import heavy_hitters
+import parallel_worker
+import sampling
+import temporal
+
+WORKERS = int(os.environ.get("CRIMES_WORKERS", "0")) or (os.cpu_count() or 1)
+MIN_ROWS_PER_TASK = 250_000
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ------------------------------
+# Sources (อ่านใน worker: parallel_worker.load_source)
+# ------------------------------
+def arrow_sources(path: str, n_rows: int, workers: int = None) -> list:
+    # แบ่ง Arrow store เป็นช่วงแถวเท่า ๆ กัน (ไม่เล็กกว่า MIN_ROWS_PER_TASK)
+    workers = workers or WORKERS
+    parts = max(1, min(workers, n_rows // MIN_ROWS_PER_TASK))
+    bounds = [n_rows * i // parts for i in range(parts + 1)]
+    return [("arrow", path, bounds[i], bounds[i + 1]) for i in range(parts)]
+
+def parquet_sources(paths: list) -> list:
+    return [("parquet", p, None, None) for p in paths]
+
+
+# ------------------------------
+# Merge (process หลัก)
+# ------------------------------
+def _merge(op: str, partials: list):
+    if op == "cube":
+        return cube.merge_partials(partials)
+    if op == "missing":
+        return pd.concat(partials, axis=1).fillna(0).sum(axis=1).astype("int64")
+    if op == "sample":
+        return sampling.merge_partials(partials)
+    if op == "topk":
+        return heavy_hitters.merge_partials(partials)
+    if op == "fingerprints":
+        return duplicates.merge_partials(partials)
+    if op == "time":
+        return temporal.merge_partials(partials)
+    raise ValueError(f"unknown op: {op}")
+
+
+# ------------------------------
+# Pool
+# ------------------------------
+class _Worker:
+    # process ลูก `python -m parallel_worker` + การเชื่อมต่อ (worker อ่าน address ให้ทาง stdout)
+    def __init__(self):
+        authkey = os.urandom(32)
+        env = dict(os.environ)
+        env[parallel_worker.AUTHKEY_ENV] = authkey.hex()
+        env["PYTHONPATH"] = os.pathsep.join(p for p in [_MODULE_DIR, env.get("PYTHONPATH")] if p)
+        self.proc = subprocess.Popen([sys.executable, "-m", "parallel_worker"], env=env, stdout=subprocess.PIPE, text=True)
+        address = self.proc.stdout.readline().strip()
+        if not address:
+            self.proc.wait()
+            raise OSError(f"parallel worker exited with code {self.proc.returncode}")
+        self.conn = Client(address, authkey=authkey)
+
+    def call(self, task: tuple) -> tuple:
+        self.conn.send(task)
+        return self.conn.recv()
+
+    def close(self):
+        self.conn.close()  # worker ได้ EOF แล้วออกเอง
+        self.proc.stdout.close()
+        self.proc.wait()
+
+class _Pool:
+    # worker แต่ละตัวทำทีละงาน; thread ของ dispatcher ยืม worker ว่างจากคิว
+    # worker เริ่มเมื่อใช้ครั้งแรก; worker ตาย/เริ่มไม่ได้ → งานนั้นคำนวณใน process หลัก แล้วเริ่มใหม่ในงานถัดไป
+    def __init__(self, workers: int):
+        self._idle = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(None)
+        self._workers = workers
+        self._dispatch = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parallel")
+
+    def _run(self, task: tuple):
+        worker = self._idle.get()
+        try:
+            if worker is None:
+                worker = _Worker()
+            ok, value = worker.call(task)
+        except (EOFError, OSError):
+            if worker is not None:
+                worker.close()
+            worker = None
+            return parallel_worker.partial(*task)
+        finally:
+            self._idle.put(worker)
+        if not ok:
+            raise value
+        return value
+
+    def submit(self, op: str, source, args: dict):
+        return self._dispatch.submit(self._run, (op, source, args))
+
+    def shutdown(self):
+        self._dispatch.shutdown()
+        for _ in range(self._workers):
+            worker = self._idle.get()
+            if worker is not None:
+                worker.close()
+
+def _get_pool() -> _Pool:
+    # pool เดียวต่อ process ของ app (ใช้ซ้ำทุก rerun)
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _Pool(WORKERS)
+        return _pool
+
+def aggregate(op: str, sources: list, **args):
+    if len(sources) <= 1 or WORKERS <= 1:
+        partials = [parallel_worker.partial(op, s, args) for s in sources]
+    else:
+        pool = _get_pool()
+        futures = [pool.submit(op, s, args) for s in sources]
+        partials = [f.result() for f in futures]
+    return _merge(op, partials)
+
+
+# ------------------------------
+# Background refinement (thread)
+# ------------------------------
+class Refiner:
+    # งานคำนวณค่าจริงเบื้องหลังของโหมดพรีวิว (ทีละงาน): key ใหม่ยกเลิกงานที่ยังไม่เริ่มของ key อื่น
+    # → ลาก slider ผ่านหลายช่วงปี คำนวณจริงแค่ช่วงที่กำลังทำอยู่ + ช่วงล่าสุด
+    def __init__(self, max_jobs: int = 8):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="refine")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.cancelled():
+                self._jobs.move_to_end(key)
+                return job
+            for other in self._jobs.values():
+                other.cancel()
+            job = self._executor.submit(fn)
+            self._jobs[key] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            return job
+
+
+# ------------------------------
+# Public helpers
+# ------------------------------
+def build_cube(sources: list, dataset: str) -> pd.DataFrame:
+    return aggregate("cube", sources, dataset=dataset)
+
+def missing_counts(sources: list) -> pd.Series:
+    return aggregate("missing", sources)
+
+def sample(sources: list, dataset: str, seed: int = sampling.SEED) -> tuple:
+    # (stratified sample, ค่าที่มีจริงต่อปี) ดู sampling.py
+    return aggregate("sample", sources, dataset=dataset, seed=seed)
+
+def partition_top_k(sources: list, dataset: str, capacity: int = heavy_hitters.CAPACITY) -> pd.DataFrame:
+    # Top-K ที่ตัดรายการต่อ partition (Year × District) ของคอลัมน์ cardinality สูง ดู heavy_hitters.py
+    return aggregate("topk", sources, dataset=dataset, capacity=capacity)
+
+def time_rollup(sources: list, dataset: str) -> pd.DataFrame:
+    # จำนวนแถวต่อชั่วโมง (TimeKey) ทั้งชุด ดู temporal.py
+    return aggregate("time", sources, dataset=dataset)
+
+def duplicate_summary(sources: list, dataset: str, near_minutes: int = duplicates.NEAR_MINUTES) -> pd.DataFrame:
+    # fingerprint แบบขนานต่อ partition แล้ว sort รวมทั้งชุดใน process หลัก ดู duplicates.py
+    return duplicates.summarize(aggregate("fingerprints", sources), dataset, near_minutes)
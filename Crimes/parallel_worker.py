@@ -0,0 +1,92 @@
+# parallel_worker.py
+# ==============================
+# Worker entry point ของ process pool (parallel.py)
+# ==============================
+# - worker เริ่มด้วย `python -m parallel_worker` (__main__ = โมดูลนี้ ไม่ใช่ app.py)
+#   → ไม่ import streamlit / ไม่รันสคริปต์ของ app ซ้ำ; รู้จักแค่ partition ที่ได้รับและฟังก์ชันคำนวณ partial
+# - สื่อสารกับ process หลักผ่าน multiprocessing.connection (authkey ต่อ worker, ใช้ได้ทุก OS)
+# - source = (kind, path, start, end): ช่วงแถวของ Arrow store หรือไฟล์ Parquet ต่อ partition
+import os
+import zlib
+from multiprocessing.connection import Listener
+
+import pandas as pd
+import pyarrow as pa
+
+import cube
+import data_cache
+import duplicates
+import heavy_hitters
+import sampling
+import schema
+import temporal
+
+AUTHKEY_ENV = "CRIMES_WORKER_AUTHKEY"
+MAX_OPEN_TABLES = 4  # Before/After × (ชุดปัจจุบัน + ชุดก่อน refresh)
+
+_tables = {}
+
+
+# ------------------------------
+# Sources
+# ------------------------------
+def _open_table(path: str) -> pa.Table:
+    # เปิดครั้งเดียวต่อ worker (memory map → ไม่ copy)
+    table = _tables.get(path)
+    if table is None:
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        _tables[path] = table
+        while len(_tables) > MAX_OPEN_TABLES:
+            _tables.pop(next(iter(_tables)))
+    return table
+
+def load_source(source) -> pd.DataFrame:
+    kind, path, start, end = source
+    if kind == "arrow":
+        return _open_table(path).slice(start, end - start).to_pandas(split_blocks=True)
+    return data_cache.read_parquet_mmap(path)
+
+
+# ------------------------------
+# Partial aggregates
+# ------------------------------
+def partial(op: str, source, args: dict):
+    df = load_source(source)
+    if op == "cube":
+        return cube.build_cube(df, args["dataset"])
+    if op == "missing":
+        return schema.missing_counts(df)
+    if op == "sample":
+        # seed ต่อ partition คงที่ (ผลซ้ำได้) แต่ไม่เหมือนกันทุก partition
+        return sampling.build(df, args["dataset"], [args["seed"], zlib.crc32(repr(source).encode("utf-8"))])
+    if op == "topk":
+        return heavy_hitters.build_partition_top_k(df, args["dataset"], args["capacity"])
+    if op == "fingerprints":
+        return duplicates.fingerprints(df)
+    if op == "time":
+        return temporal.rollup(df.get(schema.TIME_KEY, pd.Series(dtype="Int32")), args["dataset"])
+    raise ValueError(f"unknown op: {op}")
+
+
+# ------------------------------
+# Entry point (python -m parallel_worker)
+# ------------------------------
+def serve():
+    # บอก address ให้ process หลักทาง stdout แล้วรับงาน (op, source, args) ทีละงานจนการเชื่อมต่อปิด
+    authkey = bytes.fromhex(os.environ.pop(AUTHKEY_ENV))
+    with Listener(authkey=authkey) as listener:
+        print(listener.address, flush=True)
+        with listener.accept() as conn:
+            while True:
+                try:
+                    op, source, args = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    conn.send((True, partial(op, source, args)))
+                except Exception as exc:
+                    conn.send((False, exc))
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,189 @@
+# partitions.py
+# ==============================
+# Year-partitioned on-disk dataset (Hive-style: Year=2001/part-0.parquet)
+# ==============================
+# - เขียนครั้งเดียวจากชุดข้อมูลที่เตรียมแล้ว พร้อม _metadata.json (จำนวนแถว/Missing ต่อ partition)
+# - query ตัด partition จาก year_range ก่อนอ่าน (partition pruning) → ปีที่ไม่เลือกไม่ถูกอ่านเลย
+# - partition ถูกโหลดเมื่อต้องใช้ (lazy) และเก็บไว้ใน LRU ขนาดจำกัด
+# - สรุปทั้งชุด (rows/dtypes/missing) ตอบจาก metadata ได้โดยไม่ต้องอ่านข้อมูล
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import data_cache
+import schema
+
+PARTITION_COL = "Year"
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+METADATA_NAME = "_metadata.json"
+PART_FILE = "part-0.parquet"
+MAX_LOADED_PARTITIONS = int(os.environ.get("CRIMES_MAX_PARTITIONS", "32"))
+
+
+# ------------------------------
+# Write
+# ------------------------------
+def partition_root(parquet_path: str, version: str) -> str:
+    return data_cache.derived_path(parquet_path, f".{version}.parts")
+
+def partition_name(value) -> str:
+    return NULL_PARTITION if pd.isna(value) else f"{PARTITION_COL}={int(value)}"
+
+def write_partitions(df: pd.DataFrame, root: str):
+    tmp = root + ".tmp"
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+
+    parts = {}
+    for value, part in df.groupby(PARTITION_COL, dropna=False, observed=True, sort=True):
+        name = partition_name(value)
+        os.makedirs(os.path.join(tmp, name))
+        part.to_parquet(os.path.join(tmp, name, PART_FILE), index=False)
+        parts[name] = {
+            "value": None if pd.isna(value) else int(value),
+            "rows": int(len(part)),
+            "missing": {k: int(v) for k, v in schema.missing_counts(part).items()},
+        }
+
+    meta = {
+        "partition_col": PARTITION_COL,
+        "columns": schema.feature_columns(df),
+        "dtypes": schema.dataset_profile(df.head(0))["dtypes"],
+        "partitions": parts,
+    }
+    with open(os.path.join(tmp, METADATA_NAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+    os.replace(tmp, root)
+
+def _partition_value(name: str):
+    return None if name == NULL_PARTITION else int(name.split("=", 1)[1])
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:  # ไม่รองรับ hard link (เช่นข้าม filesystem)
+        shutil.copy2(src, dst)
+
+def apply_delta(root: str, new_root: str, removed: pd.DataFrame, added: pd.DataFrame, key: str):
+    # Incremental Refresh: เขียนใหม่เฉพาะ partition ปีที่มีแถวถูกแทนที่/เพิ่ม, partition อื่นใช้ไฟล์เดิม (hard link)
+    # removed / added = แถวที่ผ่าน prepare แล้ว (removed = แถวเดิมที่ถูกแทนที่ ตาม key)
+    with open(os.path.join(root, METADATA_NAME), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    touched = {partition_name(v) for v in pd.concat([removed[PARTITION_COL], added[PARTITION_COL]]).unique()}
+    tmp = new_root + ".tmp"
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+
+    parts = {}
+    for name in sorted(set(meta["partitions"]) | touched):
+        os.makedirs(os.path.join(tmp, name))
+        path = os.path.join(tmp, name, PART_FILE)
+        if name not in touched:
+            _link_or_copy(os.path.join(root, name, PART_FILE), path)
+            parts[name] = meta["partitions"][name]
+            continue
+        frames = []
+        if name in meta["partitions"]:
+            old = data_cache.read_parquet_mmap(os.path.join(root, name, PART_FILE))
+            frames.append(old[~old[key].isin(removed[key]).to_numpy()])
+        value = _partition_value(name)
+        years = added[PARTITION_COL]
+        frames.append(added[(years.isna() if value is None else years.eq(value).fillna(False)).to_numpy(dtype=bool)])
+        part = schema.concat_typed(frames)
+        if not len(part):
+            os.rmdir(os.path.dirname(path))
+            continue
+        part.to_parquet(path, index=False)
+        parts[name] = {
+            "value": value,
+            "rows": int(len(part)),
+            "missing": {k: int(v) for k, v in schema.missing_counts(part).items()},
+        }
+
+    meta["partitions"] = parts
+    with open(os.path.join(tmp, METADATA_NAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    if os.path.isdir(new_root):
+        shutil.rmtree(new_root)
+    os.replace(tmp, new_root)
+
+def open_partitioned(parquet_path: str, prepare, version: str) -> "PartitionedDataset":
+    # prepare(df) -> df: เหมือน dataset_store.open_shared (version เปลี่ยน = เขียนใหม่)
+    root = partition_root(parquet_path, version)
+    if not os.path.exists(os.path.join(root, METADATA_NAME)):
+        write_partitions(prepare(data_cache.read_parquet_mmap(parquet_path)), root)
+    return PartitionedDataset(root)
+
+
+# ------------------------------
+# Read (pruning + lazy load)
+# ------------------------------
+class PartitionedDataset:
+    def __init__(self, root: str, max_loaded: int = MAX_LOADED_PARTITIONS):
+        self.root = root
+        with open(os.path.join(root, METADATA_NAME), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def years(self) -> list:
+        return sorted(p["value"] for p in self.meta["partitions"].values() if p["value"] is not None)
+
+    def prune(self, year_range) -> list:
+        lo, hi = year_range
+        return [partition_name(y) for y in self.years if lo <= y <= hi]
+
+    def partition_path(self, name: str) -> str:
+        return os.path.join(self.root, name, PART_FILE)
+
+    def load_partition(self, name: str) -> pd.DataFrame:
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                return self._loaded[name]
+        df = data_cache.read_parquet_mmap(self.partition_path(name))
+        with self._lock:
+            self._loaded[name] = df
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return df
+
+    def load(self, year_range) -> pd.DataFrame:
+        names = self.prune(year_range)
+        if not names:
+            return self.empty_frame()
+        frames = [self.load_partition(n) for n in names]
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def empty_frame(self) -> pd.DataFrame:
+        first = next(iter(self.meta["partitions"]), None)
+        if first is None:
+            return pd.DataFrame()
+        return self.load_partition(first).head(0)
+
+    def profile(self, year_range=None) -> dict:
+        # สรุปจาก metadata (ไม่อ่านข้อมูล): year_range=None = ทั้งชุด (รวมแถวที่ไม่มีปี)
+        names = list(self.meta["partitions"]) if year_range is None else self.prune(year_range)
+        missing = {}
+        rows = 0
+        for name in names:
+            part = self.meta["partitions"][name]
+            rows += part["rows"]
+            for col, cnt in part["missing"].items():
+                missing[col] = missing.get(col, 0) + cnt
+        return {
+            "rows": rows,
+            "columns": list(self.meta["columns"]),
+            "dtypes": dict(self.meta["dtypes"]),
+            "missing": missing,
+        }
@@ -0,0 +1,137 @@
+# perf.py
+# ==============================
+# Hot-path instrumentation (ต่อ 1 rerun)
+# ==============================
+# - trace.stage("name") = span จับเวลา (ms), RSS ที่เพิ่มขึ้น, จำนวนแถว, ขนาดผลลัพธ์, cache hit/miss
+# - span ซ้อนกันได้ (depth) → เห็นว่าเวลาไปอยู่ที่ขั้นไหนของ load / filter / aggregate / figure
+# - loader ที่อยู่ใต้ st.cache_resource ห่อด้วย @computes → ถ้า body ถูกรันจริง span นั้น = miss
+# - จบ rerun: แสดงใน developer panel และ/หรือเขียน JSON lines (CRIMES_PERF_LOG=path)
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LOG_PATH = os.environ.get("CRIMES_PERF_LOG", "")
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ไม่มี /proc (เช่น macOS) → ใช้ peak ของทั้ง process แทน
+        if resource is None:
+            return 0
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def row_count(value):
+    if hasattr(value, "shape") and len(getattr(value, "shape", ())) >= 1:
+        return int(value.shape[0])
+    if hasattr(value, "__len__") and not isinstance(value, (str, bytes, dict)):
+        return len(value)
+    return None
+
+
+class RerunTrace:
+    def __init__(self, session: str = None, rerun: int = None):
+        self.session = session
+        self.rerun = rerun
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self._stack = []
+        self.total_ms = None
+
+    @contextmanager
+    def stage(self, name: str, rows: int = None, cached: bool = False, **fields):
+        # cached=True: ขั้นที่อยู่หลัง cache (ค่าเริ่มต้น hit, เปลี่ยนเป็น miss เมื่อ @computes ถูกเรียก)
+        span = {
+            "stage": name,
+            "depth": len(self._stack),
+            "start_ms": (time.perf_counter() - self._t0) * 1000,
+            "ms": None,
+            "rows": rows,
+            "bytes": None,
+            "rss_delta_bytes": None,
+            "cache": "hit" if cached else None,
+            **fields,
+        }
+        self.spans.append(span)
+        self._stack.append(span)
+        rss0 = rss_bytes()
+        t0 = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span["ms"] = (time.perf_counter() - t0) * 1000
+            span["rss_delta_bytes"] = rss_bytes() - rss0
+            self._stack.pop()
+
+    def mark_miss(self):
+        for span in reversed(self._stack):
+            if span["cache"] is not None:
+                span["cache"] = "miss"
+                return
+
+    def finish(self) -> dict:
+        if self.total_ms is None:
+            self.total_ms = (time.perf_counter() - self._t0) * 1000
+        return self.summary()
+
+    def summary(self) -> dict:
+        hits = sum(1 for s in self.spans if s["cache"] == "hit")
+        misses = sum(1 for s in self.spans if s["cache"] == "miss")
+        return {
+            "ts": self.started_at,
+            "session": self.session,
+            "rerun": self.rerun,
+            "total_ms": self.total_ms,
+            "cache_hits": hits,
+            "cache_misses": misses,
+            "spans": self.spans,
+        }
+
+
+# ------------------------------
+# Active trace (ต่อ thread ของ script run)
+# ------------------------------
+def activate(trace: RerunTrace) -> RerunTrace:
+    _local.trace = trace
+    return trace
+
+def current() -> RerunTrace:
+    return getattr(_local, "trace", None)
+
+def computes(fn):
+    # วางใต้ @st.cache_resource: body ถูกรัน = cache miss ของ span ที่ครอบอยู่
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = current()
+        if trace is not None:
+            trace.mark_miss()
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+# ------------------------------
+# Structured log (JSON lines)
+# ------------------------------
+def write_jsonl(record: dict, path: str = LOG_PATH):
+    if not path:
+        return
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _log_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
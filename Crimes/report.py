@@ -0,0 +1,155 @@
+# report.py
+# ==============================
+# Batch report generation (CLI, ไม่ต้องเปิด app)
+# ==============================
+# สร้าง KPI + ตารางข้อมูลกราฟของ dashboard ล่วงหน้าสำหรับหลาย filter preset แล้วเขียนเป็นไฟล์
+#
+#   python report.py                                            # preset "all" (ไม่กรอง)
+#   python report.py --filter '{"Year": [2015, 2020], "Primary Type": ["THEFT"]}'
+#   python report.py --presets presets.json --workers 4 --out reports
+#   python report.py --backend duckdb                           # aggregate บน Parquet โดยตรง (ไม่โหลดทั้งชุด)
+#
+# presets.json = {"ชื่อ preset": {filter spec}, ...}; filter spec ใช้คีย์เดียวกับ sidebar
+# (Year = [ต้น, ปลาย], คอลัมน์อื่น = list ของค่า, ไม่ระบุ = ไม่กรอง)
+#
+# ผล: <out>/<preset>/report.json (filters + KPI + รายชื่อตาราง) และ <out>/<preset>/<table>.parquet|json
+#     <out>/index.json = {preset: filter_key} (key เดียวกับ result cache ของ app)
+# - ข้อมูลมาจาก cache เดียวกับ app (Parquet / Arrow store / cube บนดิสก์) → เตรียมครั้งเดียวใน process หลัก
+# - preset กระจายไป process pool: worker เปิด Arrow store แบบ memory map (ไม่ copy ข้อมูลข้าม process)
+#   หรือ view ของ DuckDB บนไฟล์ Parquet (--backend duckdb)
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import analytics
+import backend
+import parallel
+
+DEFAULT_OUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
+FORMATS = ["parquet", "json"]
+MODES = ["Count", "Share"]
+
+_engine = None
+
+
+# ------------------------------
+# Output
+# ------------------------------
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+def write_table(df: pd.DataFrame, path: str, fmt: str) -> str:
+    if fmt == "parquet":
+        path += ".parquet"
+        # ค่าปนชนิด (เช่น Yes/No + bool) → เก็บเป็นข้อความแทน
+        out = df.copy()
+        for col in out.columns:
+            if out[col].dtype == object:
+                out[col] = out[col].astype("string")
+        out.to_parquet(path, index=False)
+    else:
+        path += ".json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(df.to_dict(orient="records"), f, ensure_ascii=False, default=_json_default)
+    return path
+
+def write_report(name: str, result: dict, out_dir: str, fmt: str) -> dict:
+    preset_dir = os.path.join(out_dir, name)
+    os.makedirs(preset_dir, exist_ok=True)
+    tables = {}
+    for table, df in result["tables"].items():
+        tables[table] = os.path.basename(write_table(df, os.path.join(preset_dir, table), fmt))
+    filters = {k: list(v) for k, v in result["filters"].items()}
+    meta = {"preset": name, "filter_key": result["filter_key"], "filters": filters, "kpis": result["kpis"], "tables": tables}
+    with open(os.path.join(preset_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2, default=_json_default)
+    return meta
+
+
+# ------------------------------
+# Workers
+# ------------------------------
+def _init_worker(paths: tuple, profiles: tuple, engine: str):
+    # เปิดข้อมูลครั้งเดียวต่อ worker (cube/profile เตรียมไว้แล้วใน process หลัก) และไม่เปิด pool ซ้อน
+    global _engine
+    parallel.WORKERS = 1
+    _engine = analytics.Analytics.open(*paths, profiles=profiles, engine=engine)
+
+def _run_preset(name: str, spec: dict, out_dir: str, fmt: str, top_k: int, mode: str) -> tuple:
+    start = time.perf_counter()
+    meta = write_report(name, _engine.report(spec, top_k, mode), out_dir, fmt)
+    return name, meta, time.perf_counter() - start
+
+
+def load_presets(args) -> dict:
+    if args.presets:
+        with open(args.presets, "r", encoding="utf-8") as f:
+            presets = json.load(f)
+    else:
+        presets = {}
+    if args.filter:
+        presets[args.name] = json.loads(args.filter)
+    return presets or {"all": {}}
+
+def run(presets: dict, out_dir: str, fmt: str = "parquet", top_k: int = 10, mode: str = "Count", workers: int = None,
+        engine_name: str = None) -> dict:
+    # เตรียม cache ทั้งหมด (ดาวน์โหลด/แปลง/Arrow store/cube/profile) ก่อนแยก process
+    global _engine
+    engine_name = engine_name or backend.BACKEND
+    paths = analytics.source_paths()
+    engine = analytics.Analytics.open(*paths, engine=engine_name)
+    profiles = (engine.profile_before, engine.profile_after)
+    workers = max(1, min(workers or parallel.WORKERS, len(presets)))
+    os.makedirs(out_dir, exist_ok=True)
+
+    index = {}
+    if workers == 1:
+        _engine = engine
+        results = [_run_preset(name, spec, out_dir, fmt, top_k, mode) for name, spec in presets.items()]
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker, initargs=(paths, profiles, engine_name)) as pool:
+            futures = [pool.submit(_run_preset, name, spec, out_dir, fmt, top_k, mode) for name, spec in presets.items()]
+            results = [f.result() for f in futures]
+    for name, meta, seconds in results:
+        index[name] = meta["filter_key"]
+        print(f"{name}: {meta['kpis']['rows_after']:,} rows (After) → {os.path.join(out_dir, name)} [{seconds:.2f}s]")
+
+    with open(os.path.join(out_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    return index
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Chicago crimes dashboard batch report generator")
+    parser.add_argument("--filter", default=None, help="filter spec แบบ JSON (preset เดียว)")
+    parser.add_argument("--name", default="custom", help="ชื่อ preset ของ --filter")
+    parser.add_argument("--presets", default=None, help="ไฟล์ JSON {ชื่อ: filter spec}")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--top-k", type=int, default=10, help="จำนวนประเภทคดีใน Top Crime Types")
+    parser.add_argument("--mode", choices=MODES, default="Count", help="ค่าของ Top Crime Types (จำนวน หรือ สัดส่วน %%)")
+    parser.add_argument("--workers", type=int, default=None, help="จำนวน process (ค่าเริ่มต้น: CRIMES_WORKERS / จำนวน CPU)")
+    parser.add_argument("--backend", choices=backend.BACKENDS, default=backend.BACKEND, help="query backend (ค่าเริ่มต้น: CRIMES_BACKEND)")
+    args = parser.parse_args(argv)
+
+    try:
+        presets = load_presets(args)
+    except (OSError, ValueError) as e:
+        print(f"อ่าน preset ไม่ได้: {e}", file=sys.stderr)
+        return 2
+    run(presets, args.out, args.format, args.top_k, args.mode, args.workers, args.backend)
+    print(f"index → {os.path.join(args.out, 'index.json')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
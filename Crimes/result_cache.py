@@ -0,0 +1,122 @@
+# result_cache.py
+# ==============================
+# Memoized filter results / aggregates (shared LRU)
+# ==============================
+# Streamlit rerun ทั้งสคริปต์ทุกครั้งที่ขยับ widget → ผลกรอง/aggregate ของ filter ชุดเดิม
+# ควรใช้ซ้ำได้ทันที (และแชร์ข้ามผู้ใช้ที่ดู preset เดียวกัน)
+# - key = hash แบบ canonical ของ filter spec (+ ชื่อผลลัพธ์)
+# - จำกัดด้วย memory budget, ไล่ออกแบบ LRU, มีตัวนับ hit/miss
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BUDGET_MB = int(os.environ.get("CRIMES_RESULT_CACHE_MB", "512"))
+
+
+# ------------------------------
+# Canonical key
+# ------------------------------
+def _canonical(value):
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, set)):
+        return sorted((_canonical(v) for v in value), key=repr)
+    if isinstance(value, tuple):
+        return [_canonical(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def filter_key(filters: dict) -> str:
+    # ลำดับที่เลือกใน multiselect ไม่มีผล: ["A","B"] กับ ["B","A"] ได้ key เดียวกัน
+    payload = json.dumps(_canonical(filters), sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+# ------------------------------
+# Size estimate
+# ------------------------------
+def sizeof(value) -> int:
+    if hasattr(value, "nbytes") and not isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.nbytes)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=False))
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(v) for v in value) + 64
+    if isinstance(value, dict):
+        return sum(sizeof(v) for v in value.values()) + 64
+    return 64
+
+
+# ------------------------------
+# LRU cache
+# ------------------------------
+class ResultCache:
+    def __init__(self, max_bytes: int = DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return True, self._items[key][0]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        size = sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self.bytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._items:
+                _, (_, old_size) = self._items.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute) -> tuple:
+        # (พบใน cache หรือไม่, ค่า) → ผู้เรียกบันทึก hit/miss ต่อ stage ได้
+        found, value = self.get(key)
+        if not found:
+            value = compute()
+            self.put(key, value)
+        return found, value
+
+    def clear(self):
+        # ล้างตัวนับด้วย → hit rate หลัง refresh นับเฉพาะข้อมูลชุดใหม่
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total * 100) if total else 0.0,
+            }
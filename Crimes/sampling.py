@@ -0,0 +1,277 @@
+# sampling.py
+# ==============================
+# Stratified sample (approximate preview)
+# ==============================
+# ตัวอย่างแบบแบ่งชั้น (stratified) ตามปีของแต่ละ partition → ตอบ KPI / Top-K โดยประมาณพร้อมช่วงความเชื่อมั่น 95%
+# ภายในไม่กี่ ms ระหว่างที่ค่าจริง (exact) กำลังคำนวณอยู่เบื้องหลัง
+# - แถวตัวอย่างเก็บเป็นรูปเดียวกับ cube (มิติ + Count=1, Missing, Geo ต่อแถว) → slice ด้วย cube.slice_cube ได้เลย
+#   พร้อม Stratum, Population (N_h) และ Sampled (n_h) ของชั้นนั้น
+# - ตัวประมาณ: ผลรวม = Σ N_h/n_h · Σy, variance พร้อม finite population correction;
+#   อัตรา/สัดส่วน = ratio estimator (linearization)
+# - ไม่มีตัวกรองอื่นนอกจากช่วงปี → จำนวนแถวได้ค่าจริง (ชั้น = ปี)
+# - values: ค่าที่มีจริงต่อปีของคอลัมน์ตัวกรอง (ครบทุกค่า ไม่ได้มาจากตัวอย่าง) → ตัวเลือกใน sidebar ตรงกับโหมด exact
+# - incremental refresh ปรับตัวอย่างด้วย delta (apply_delta) แทนการสุ่มทั้งชุดใหม่
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+import cube
+import data_cache
+import schema
+
+FRACTION = 0.01
+MIN_PER_STRATUM = 1_000
+SEED = 0
+Z = 1.96  # 95% CI
+STRATA_PER_PART = 100_000  # Stratum = ลำดับ partition × ค่านี้ + ปี
+OPTION_COLUMNS = ["Primary Type", "District", "Location Description"]
+KEY_COL = "ID"  # เก็บในตัวอย่าง → รู้ว่าแถวที่ถูกแทนที่ตอน refresh ถูกสุ่มมาหรือไม่
+
+
+# ------------------------------
+# Build (ต่อ partition)
+# ------------------------------
+def draw(df: pd.DataFrame, seed: int = SEED):
+    # คืน (ตำแหน่งแถวที่สุ่มได้, ชั้นของแต่ละแถว, N_h, n_h ต่อแถว)
+    if "Year" in df.columns:
+        strata = df["Year"].astype("float64").fillna(-1).to_numpy().astype(np.int64)
+    else:
+        strata = np.zeros(len(df), dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    perm = rng.permutation(len(df))
+    perm = perm[np.argsort(strata[perm], kind="stable")]  # เรียงตามชั้น ลำดับในชั้นสุ่ม
+    keys, start, population = np.unique(strata[perm], return_index=True, return_counts=True)
+    sampled = np.minimum(population, np.maximum(MIN_PER_STRATUM, np.ceil(population * FRACTION).astype(np.int64)))
+    rank = np.arange(len(perm)) - np.repeat(start, population)
+    take = rank < np.repeat(sampled, population)
+    rows = perm[take]
+    order = np.argsort(rows)  # อ่านตามลำดับแถวเดิม
+    return (
+        rows[order],
+        np.repeat(keys, sampled)[order],
+        np.repeat(population, sampled)[order],
+        np.repeat(sampled, sampled)[order],
+    )
+
+def sample_frame(df: pd.DataFrame, dataset: str, seed: int = SEED) -> pd.DataFrame:
+    rows, strata, population, sampled = draw(df, seed)
+    frame = cube.measure_frame(df.take(rows)).reset_index(drop=True)
+    frame.insert(0, "Dataset", dataset)
+    if KEY_COL in df.columns:
+        frame[KEY_COL] = df[KEY_COL].iloc[rows].reset_index(drop=True)
+    frame["Stratum"] = strata.astype(np.int32)
+    frame["Population"] = population.astype(np.int32)
+    frame["Sampled"] = sampled.astype(np.int32)
+    return frame
+
+def present_values(df: pd.DataFrame) -> dict:
+    # {col: {ปี: [ค่า]}} ของแถวที่มีปี (ช่วงปีไม่เคยรวมแถวที่ไม่มีปี)
+    out = {}
+    if "Year" not in df.columns:
+        return out
+    for col in OPTION_COLUMNS:
+        if col not in df.columns:
+            continue
+        pairs = df[["Year", col]].dropna().drop_duplicates()
+        out[col] = {int(y): g[col].tolist() for y, g in pairs.groupby("Year", observed=True)}
+    return out
+
+def build(df: pd.DataFrame, dataset: str, seed: int = SEED) -> tuple:
+    return sample_frame(df, dataset, seed), present_values(df)
+
+def merge_partials(partials: list) -> tuple:
+    # ชั้นของแต่ละ partition แยกกัน (partition ตามช่วงแถวอาจมีปีเดียวกัน)
+    frames = []
+    values = {}
+    for i, (frame, part_values) in enumerate(partials):
+        frames.append(frame.assign(Stratum=frame["Stratum"] + i * STRATA_PER_PART))
+        for col, by_year in part_values.items():
+            merged = values.setdefault(col, {})
+            for year, vals in by_year.items():
+                merged.setdefault(year, set()).update(vals)
+    sample = schema.concat_typed(frames) if frames else pd.DataFrame()
+    values = {col: {y: sorted(v) for y, v in by_year.items()} for col, by_year in values.items()}
+    return sample, values
+
+def _stratum_year(strata: np.ndarray) -> np.ndarray:
+    # Stratum = ลำดับ partition × STRATA_PER_PART + ปี (ปี -1 = ไม่มีปี)
+    return (strata + 1) % STRATA_PER_PART - 1
+
+def apply_delta(sample: pd.DataFrame, values: dict, removed: pd.DataFrame, added: pd.DataFrame, dataset: str,
+                seed: int = SEED) -> tuple:
+    # ตัวอย่างของแต่ละชั้นเป็น simple random sample → เอาแถวที่ถูกแทนที่ออกจากประชากรของชั้น:
+    #   ถูกสุ่มมา (ID อยู่ในตัวอย่าง) → ลบแถวนั้น ลด N_h และ n_h; ไม่ถูกสุ่ม → ลด N_h ของชั้นปีเดียวกัน
+    #   (partition ตามไฟล์ปีมีชั้นเดียวต่อปี; หลายชั้น → ลดจากชั้นที่มีแถวนอกตัวอย่างมากสุดก่อน)
+    # แถวใหม่ → สุ่มเป็น partition ใหม่ต่อท้าย (ชั้นใหม่) เหมือน merge_partials
+    # values: เพิ่มค่าของแถวใหม่; ค่าของแถวที่ถูกแทนที่คงไว้ (ตัวเลือกอาจเหลือค่าที่ไม่มีแถวแล้ว)
+    strata = sample.groupby("Stratum")[["Population", "Sampled"]].first()
+    hit = np.zeros(len(sample), dtype=bool)
+    if len(removed) and KEY_COL in sample.columns and KEY_COL in removed.columns:
+        hit = sample[KEY_COL].isin(removed[KEY_COL]).to_numpy()
+    dropped = sample.loc[hit, "Stratum"].value_counts().reindex(strata.index, fill_value=0).to_numpy()
+    sampled = strata["Sampled"].to_numpy(dtype=np.int64) - dropped
+    free = strata["Population"].to_numpy(dtype=np.int64) - dropped - sampled
+
+    if len(removed):
+        hit_ids = set(sample.loc[hit, KEY_COL]) if hit.any() else set()
+        rest = removed[~removed[KEY_COL].isin(hit_ids)] if hit_ids else removed
+        years = rest["Year"].astype("float64").fillna(-1).to_numpy().astype(np.int64) if "Year" in rest.columns else np.zeros(len(rest), dtype=np.int64)
+        stratum_years = _stratum_year(strata.index.to_numpy())
+        for year, k in zip(*np.unique(years, return_counts=True)):
+            for i in sorted(np.flatnonzero(stratum_years == year), key=lambda i: -free[i]):
+                take = min(k, free[i])
+                free[i] -= take
+                k -= take
+                if not k:
+                    break
+
+    sizes = pd.DataFrame({"Population": sampled + free, "Sampled": sampled}, index=strata.index).astype(np.int32)
+    kept = sample[~hit] if hit.any() else sample
+    kept = kept.assign(
+        Population=kept["Stratum"].map(sizes["Population"]).to_numpy(dtype=np.int32),
+        Sampled=kept["Stratum"].map(sizes["Sampled"]).to_numpy(dtype=np.int32),
+    )
+    frames = [kept]
+    values = {col: {y: set(v) for y, v in by_year.items()} for col, by_year in values.items()}
+    if len(added):
+        part = (int(sample["Stratum"].max()) + 1) // STRATA_PER_PART + 1 if len(sample) else 0
+        frame, part_values = build(added, dataset, [seed, part])
+        frames.append(frame.assign(Stratum=frame["Stratum"] + part * STRATA_PER_PART))
+        for col, by_year in part_values.items():
+            merged = values.setdefault(col, {})
+            for year, vals in by_year.items():
+                merged.setdefault(year, set()).update(vals)
+    values = {col: {y: sorted(v) for y, v in by_year.items()} for col, by_year in values.items()}
+    return schema.concat_typed(frames), values
+
+
+# ------------------------------
+# Persist (ข้าง Parquet เหมือน cube)
+# ------------------------------
+def sample_path(parquet_path: str, version: str) -> str:
+    return data_cache.derived_path(parquet_path, f".{version}.sample.parquet")
+
+def values_path(parquet_path: str, version: str) -> str:
+    return data_cache.derived_path(parquet_path, f".{version}.values.json")
+
+def load(parquet_path: str, version: str):
+    # (sample, values) ที่เก็บไว้ หรือ None
+    spath, vpath = sample_path(parquet_path, version), values_path(parquet_path, version)
+    if not (os.path.exists(spath) and os.path.exists(vpath)):
+        return None
+    with open(vpath, "r", encoding="utf-8") as f:
+        values = {col: {int(y): v for y, v in by_year.items()} for col, by_year in json.load(f).items()}
+    return pd.read_parquet(spath), values
+
+def load_or_build(parquet_path: str, version: str, build_fn) -> tuple:
+    # build_fn() -> (sample, values) เช่น parallel.sample(...)
+    stored = load(parquet_path, version)
+    if stored is not None:
+        return stored
+    sample, values = build_fn()
+    save(sample, values, parquet_path, version)
+    return sample, values
+
+def save(sample: pd.DataFrame, values: dict, parquet_path: str, version: str):
+    cube.save_cube(sample, sample_path(parquet_path, version))
+    vpath = values_path(parquet_path, version)
+    tmp = vpath + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(values, f, ensure_ascii=False)
+    os.replace(tmp, vpath)
+
+def options(values: dict, col: str, year_range) -> list:
+    # เทียบเท่า sorted(df[col].dropna().unique()) ของข้อมูลในช่วงปี
+    lo, hi = year_range
+    out = set()
+    for year, vals in values.get(col, {}).items():
+        if lo <= year <= hi:
+            out.update(vals)
+    return sorted(out)
+
+
+# ------------------------------
+# Estimators (บน sample ที่ slice แล้ว)
+# ------------------------------
+def estimate(value: float, var: float) -> dict:
+    se = math.sqrt(max(var, 0.0))
+    return {"value": float(value), "low": float(value - Z * se), "high": float(value + Z * se), "se": se}
+
+def _strata(sliced: pd.DataFrame):
+    codes, _ = pd.factorize(sliced["Stratum"])
+    k = codes.max() + 1 if len(codes) else 0
+    population = np.zeros(k)
+    sampled = np.ones(k)
+    population[codes] = sliced["Population"].to_numpy()
+    sampled[codes] = sliced["Sampled"].to_numpy()
+    return codes, population, sampled
+
+def _total(codes, population, sampled, y: np.ndarray) -> tuple:
+    # ผลรวมประมาณ + variance (ชั้นที่ไม่มีแถวใน slice มี y = 0 ทั้งชั้น → ไม่มีผล)
+    k = len(population)
+    sy = np.bincount(codes, weights=y, minlength=k)
+    sy2 = np.bincount(codes, weights=y * y, minlength=k)
+    value = float((population / sampled * sy).sum())
+    s2 = np.where(sampled > 1, (sy2 - sy * sy / sampled) / np.maximum(sampled - 1, 1), 0.0)
+    var = float((population ** 2 * (1 - sampled / population) * s2 / sampled).sum())
+    return value, var
+
+def total(sliced: pd.DataFrame, measure: str = "Count") -> dict:
+    if sliced.empty:
+        return estimate(0.0, 0.0)
+    codes, population, sampled = _strata(sliced)
+    return estimate(*_total(codes, population, sampled, sliced[measure].to_numpy(dtype="float64")))
+
+def _ratio(codes, population, sampled, y: np.ndarray, x: np.ndarray) -> tuple:
+    ty, _ = _total(codes, population, sampled, y)
+    tx, _ = _total(codes, population, sampled, x)
+    if tx == 0:
+        return 0.0, 0.0
+    r = ty / tx
+    _, var_d = _total(codes, population, sampled, y - r * x)
+    return r, var_d / tx ** 2
+
+def rate(sliced: pd.DataFrame, col: str) -> dict:
+    # เทียบเท่า cube.rate (%): ค่าว่างนับเป็น False
+    if sliced.empty or col not in sliced.columns:
+        return estimate(0.0, 0.0)
+    codes, population, sampled = _strata(sliced)
+    hit = sliced[col].eq(True).fillna(False).to_numpy(dtype="float64")
+    r, var = _ratio(codes, population, sampled, hit, np.ones(len(sliced)))
+    return estimate(r * 100, var * 100 ** 2)
+
+def counts(sliced: pd.DataFrame, col: str, fill: str = None) -> pd.DataFrame:
+    # เทียบเท่า cube.counts: [col, Count, Low, High] เรียงจากมากไปน้อย
+    if sliced.empty or col not in sliced.columns:
+        return pd.DataFrame(columns=[col, "Count", "Low", "High"])
+    keys = sliced[col]
+    if fill is not None:
+        keys = keys.astype(object).where(keys.notna(), fill)
+    codes, population, sampled = _strata(sliced)
+    cat_codes, cats = pd.factorize(keys)
+    valid = cat_codes >= 0
+    k, m = len(population), len(cats)
+    # จำนวนแถวต่อ (ชั้น, ค่า) → y ของแต่ละค่าเป็น indicator (Σy = Σy² = จำนวน)
+    hits = np.bincount(codes[valid] * m + cat_codes[valid], minlength=k * m).reshape(k, m).astype("float64")
+    n = sampled[:, None]
+    N = population[:, None]
+    value = (N / n * hits).sum(axis=0)
+    s2 = np.where(n > 1, (hits - hits * hits / n) / np.maximum(n - 1, 1), 0.0)
+    se = np.sqrt((N ** 2 * (1 - n / N) * s2 / n).sum(axis=0))
+    out = pd.DataFrame({col: cats, "Count": value, "Low": np.maximum(value - Z * se, 0.0), "High": value + Z * se})
+    return out.sort_values("Count", ascending=False, kind="stable").reset_index(drop=True)
+
+def kpis(sample_b: pd.DataFrame, sample_a: pd.DataFrame) -> dict:
+    # คีย์เดียวกับ analytics.kpis แต่ค่าเป็น estimate() (value / low / high / se)
+    return {
+        "rows_before": total(sample_b),
+        "rows_after": total(sample_a),
+        "missing_before": total(sample_b, "Missing"),
+        "missing_after": total(sample_a, "Missing"),
+        "arrest_rate_after": rate(sample_a, "Arrest"),
+        "domestic_rate_after": rate(sample_a, "Domestic"),
+        "geo_rows_after": total(sample_a, "Geo"),
+    }
@@ -0,0 +1,205 @@
+# schema.py
+# ==============================
+# Declared schema (ขับเคลื่อนจาก FEATURE_INFO)
+# ==============================
+# ใช้ตอน ingestion ครั้งเดียว: หมวดหมู่ → category, Boolean → bool จริง,
+# รหัสตัวเลข → int ขนาดเล็กสุดที่พอ, ทศนิยม → float32 เมื่อไม่เสียความแม่นยำ
+# "Location" (ข้อความ lat/long) ไม่เก็บซ้ำ แต่คำนวณจาก Latitude/Longitude เมื่อต้องใช้
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+FEATURE_INFO = [
+    ("Case Number", "รหัสคดีเฉพาะ (Case identifier)", "หมวดหมู่ (Categorical/String)", "Event"),
+    ("ID", "หมายเลขประจำเหตุการณ์ (Record ID)", "ตัวเลข (Numeric/Integer)", "Event"),
+    ("Date", "วันเวลาเกิดเหตุ (Incident datetime)", "วันเวลา (Datetime)", "Event"),
+    ("Updated On", "วันเวลาอัปเดตข้อมูล (Updated datetime)", "วันเวลา (Datetime)", "Event"),
+    ("Year", "ปีที่เกิดเหตุ (Year)", "ตัวเลข (Numeric/Integer)", "Event"),
+    ("IUCR", "รหัสประเภทคดีมาตรฐาน (IUCR code)", "หมวดหมู่ (Categorical)", "Crime"),
+    ("Primary Type", "ประเภทคดีหลัก (Primary type)", "หมวดหมู่ (Categorical)", "Crime"),
+    ("Description", "รายละเอียดคดี (Description)", "หมวดหมู่ (Categorical)", "Crime"),
+    ("FBI Code", "รหัสจัดกลุ่มตาม FBI (FBI code)", "หมวดหมู่ (Categorical)", "Crime"),
+    ("Arrest", "มีการจับกุมหรือไม่ (Arrested)", "ตรรกะ (Boolean)", "Status"),
+    ("Domestic", "คดีในครอบครัวหรือไม่ (Domestic)", "ตรรกะ (Boolean)", "Status"),
+    ("Block", "บล็อกที่เกิดเหตุ (Block)", "หมวดหมู่ (Categorical)", "Location"),
+    ("Beat", "รหัสเขตย่อยตำรวจ (Beat)", "ตัวเลข (Numeric/Integer)", "Location"),
+    ("District", "เขตตำรวจ (District)", "ตัวเลข (Numeric/Integer)", "Location"),
+    ("Ward", "เขตการเลือกตั้ง (Ward)", "ตัวเลข (Numeric)", "Location"),
+    ("Community Area", "เขตชุมชน (Community area)", "ตัวเลข (Numeric)", "Location"),
+    ("Location Description", "ประเภทสถานที่ (Location description)", "หมวดหมู่ (Categorical)", "Location"),
+    ("X Coordinate", "พิกัดแกน X (X coordinate)", "ตัวเลข (Numeric)", "Geo"),
+    ("Y Coordinate", "พิกัดแกน Y (Y coordinate)", "ตัวเลข (Numeric)", "Geo"),
+    ("Latitude", "ละติจูด (Latitude)", "ตัวเลขทศนิยม (Numeric/Float)", "Geo"),
+    ("Longitude", "ลองจิจูด (Longitude)", "ตัวเลขทศนิยม (Numeric/Float)", "Geo"),
+    ("Location", "พิกัดคู่ (Lat, Long) (Location tuple text)", "ข้อความ/ออบเจกต์ (Object/String)", "Geo"),
+]
+
+# --- Expected type (จาก FEATURE_INFO) → storage kind
+KIND_BY_EXPECTED_TYPE = {
+    "หมวดหมู่ (Categorical/String)": "string",
+    "หมวดหมู่ (Categorical)": "category",
+    "ตัวเลข (Numeric/Integer)": "int",
+    "ตัวเลข (Numeric)": "float",
+    "ตัวเลขทศนิยม (Numeric/Float)": "float",
+    "ตรรกะ (Boolean)": "bool",
+    "วันเวลา (Datetime)": "datetime",
+    "ข้อความ/ออบเจกต์ (Object/String)": "derived",
+}
+
+SCHEMA = {col: KIND_BY_EXPECTED_TYPE[expected] for col, _, expected, _ in FEATURE_INFO}
+# เปลี่ยนเมื่อแก้ตรรกะของตัวแปลงใน CONVERTERS (ชนิดเดิมแต่ค่าที่ได้ต่างไป) → Parquet cache ถูกแปลงใหม่
+CONVERTER_VERSION = "2"
+SCHEMA_VERSION = hashlib.sha1(repr((sorted(SCHEMA.items()), CONVERTER_VERSION)).encode("utf-8")).hexdigest()[:10]
+
+# รูปแบบวันที่ที่พบในไฟล์ Chicago / ไฟล์ที่ export จาก pandas (ลองตามลำดับก่อน fallback)
+DATE_FORMATS = ["%m/%d/%Y %I:%M:%S %p", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"]
+DATE_SAMPLE = 1000
+
+# คอลัมน์ที่กรองได้จาก sidebar (นอกเหนือจากช่วงปี)
+FILTER_COLUMNS = ["Primary Type", "District", "Location Description", "Arrest", "Domestic"]
+
+INT_DTYPES = [("int8", "Int8"), ("int16", "Int16"), ("int32", "Int32"), ("int64", "Int64")]
+
+
+# ------------------------------
+# Column converters
+# ------------------------------
+def to_bool(s: pd.Series) -> pd.Series:
+    if s.dtype == bool:
+        return s
+    if s.dtype == "boolean":
+        return s if s.isna().any() else s.astype(bool)
+    mapped = s.astype(str).str.strip().str.lower().map({"true": True, "false": False})
+    out = mapped.astype("boolean")
+    return out if out.isna().any() else out.astype(bool)
+
+def to_compact_int(s: pd.Series) -> pd.Series:
+    num = pd.to_numeric(s, errors="coerce")
+    valid = num.dropna()
+    if len(valid) and not np.array_equal(valid.to_numpy(dtype="float64"), np.floor(valid.to_numpy(dtype="float64"))):
+        return to_compact_float(num)
+    has_na = bool(num.isna().any())
+    lo = valid.min() if len(valid) else 0
+    hi = valid.max() if len(valid) else 0
+    for np_dtype, nullable_dtype in INT_DTYPES:
+        info = np.iinfo(np_dtype)
+        if info.min <= lo and hi <= info.max:
+            return num.astype(nullable_dtype if has_na else np_dtype)
+    return num
+
+def to_compact_float(s: pd.Series) -> pd.Series:
+    num = pd.to_numeric(s, errors="coerce").astype("float64")
+    f32 = num.astype("float32")
+    if np.array_equal(f32.to_numpy(dtype="float64"), num.to_numpy(), equal_nan=True):
+        return f32
+    return num
+
+def to_datetime_fast(s: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    sample = s.dropna().head(DATE_SAMPLE)
+    for fmt in DATE_FORMATS:
+        parsed = pd.to_datetime(sample, format=fmt, errors="coerce")
+        if len(sample) and parsed.notna().all():
+            out = pd.to_datetime(s, format=fmt, errors="coerce")
+            # แถวหลัง sample ที่ใช้รูปแบบอื่น → parse แยกทีละค่า (ไม่ปล่อยเป็น NaT)
+            failed = out.isna() & s.notna()
+            if failed.any():
+                out = out.fillna(pd.to_datetime(s[failed], format="mixed", errors="coerce"))
+            return out
+    return pd.to_datetime(s, format="mixed", errors="coerce")
+
+CONVERTERS = {
+    "string": lambda s: s.astype("string"),
+    "category": lambda s: s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category"),
+    "int": to_compact_int,
+    "float": to_compact_float,
+    "bool": to_bool,
+    "datetime": to_datetime_fast,
+}
+
+
+# ------------------------------
+# Ingestion
+# ------------------------------
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    for col, kind in SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if kind == "derived":
+            if "Latitude" in df.columns and "Longitude" in df.columns:
+                df = df.drop(columns=[col])
+            continue
+        df[col] = CONVERTERS[kind](df[col])
+    return df
+
+def read_csv_typed(path: str) -> pd.DataFrame:
+    # category ตั้งแต่ตอน parse → ไม่ต้องสร้าง object string ทั้งคอลัมน์ก่อนแปลง
+    dtypes = {col: "category" for col, kind in SCHEMA.items() if kind == "category"}
+    dtypes.update({col: "string" for col, kind in SCHEMA.items() if kind == "string"})
+    df = pd.read_csv(path, dtype=dtypes, low_memory=False)
+    return apply_schema(df)
+
+
+def concat_typed(frames: list) -> pd.DataFrame:
+    # pd.concat ที่คง category ไว้ (category ต่างชุดกัน → รวม categories ก่อน ไม่ตกเป็น object)
+    frames = [f for f in frames if f is not None]
+    for col in frames[0].columns:
+        if not all(col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames):
+            continue
+        cats = frames[0][col].cat.categories
+        for f in frames[1:]:
+            cats = cats.append(f[col].cat.categories.difference(cats))
+        frames = [f if f[col].cat.categories.equals(cats) else f.assign(**{col: f[col].cat.set_categories(cats)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+TIME_KEY = "TimeKey"  # คีย์เวลาจาก temporal.prep (ชั่วโมงนับจาก 1970-01-01) ว่างพร้อม Date
+
+
+# ------------------------------
+# Derived "Location" (lazy)
+# ------------------------------
+def has_derived_location(df: pd.DataFrame) -> bool:
+    return "Location" not in df.columns and "Latitude" in df.columns and "Longitude" in df.columns
+
+def location_text(df: pd.DataFrame) -> pd.Series:
+    lat = df["Latitude"].astype("float64")
+    lon = df["Longitude"].astype("float64")
+    text = "(" + lat.astype(str) + ", " + lon.astype(str) + ")"
+    return text.where(lat.notna() & lon.notna())
+
+def with_location(df: pd.DataFrame) -> pd.DataFrame:
+    # ใช้กับชุดเล็ก (เช่น head/หน้าตาราง) เท่านั้น
+    if not has_derived_location(df):
+        return df
+    df = df.copy()
+    df["Location"] = location_text(df)
+    return df
+
+def feature_columns(df: pd.DataFrame) -> list:
+    cols = list(df.columns)
+    return cols + ["Location"] if has_derived_location(df) else cols
+
+def missing_counts(df: pd.DataFrame) -> pd.Series:
+    # Missing ต่อคอลัมน์ (รวม Location ที่คำนวณจาก Latitude/Longitude)
+    counts = df.isna().sum()
+    if has_derived_location(df):
+        counts["Location"] = int((df["Latitude"].isna() | df["Longitude"].isna()).sum())
+    return counts
+
+def dataset_profile(df: pd.DataFrame, missing: pd.Series = None) -> dict:
+    # สรุประดับชุดข้อมูล (ใช้ใน Data Dictionary / Missing Compare / ขนาดข้อมูล)
+    # missing: missing_counts ที่คำนวณไว้แล้ว (เช่นจาก parallel.missing_counts)
+    if missing is None:
+        missing = missing_counts(df)
+    dtypes = {col: str(df[col].dtype) for col in df.columns}
+    if has_derived_location(df):
+        dtypes["Location"] = "derived (Latitude, Longitude)"
+    return {
+        "rows": int(len(df)),
+        "columns": feature_columns(df),
+        "dtypes": dtypes,
+        "missing": {k: int(v) for k, v in missing.items()},
+    }
@@ -0,0 +1,164 @@
+# synthetic.py
+# ==============================
+# Deterministic synthetic Chicago-crimes data (สำหรับ benchmark / ทดลองแบบ offline)
+# ==============================
+# - คอลัมน์ตาม schema.FEATURE_INFO และรูปแบบไฟล์ของ Chicago Data Portal (วันที่ "%m/%d/%Y %I:%M:%S %p")
+# - cardinality ใกล้ของจริง: Primary Type ~33, IUCR ~400, Location Description ~180, Beat ~280, Block ~30k
+# - missing ใกล้ของจริง: Ward ~69%, Community Area ~68%, Location Description ~0.41%, พิกัด ~1.1%
+# - seed เดียวกัน = ข้อมูลเดียวกันทุกครั้ง (เทียบผล benchmark ข้ามเวอร์ชันได้)
+# clean() จำลองขั้นทำความสะอาด (Before → After) ตาม MISSING_HANDLING ของ app
+import os
+
+import numpy as np
+import pandas as pd
+
+import schema
+
+GENERATOR_VERSION = "1"
+CSV_DATE_FORMAT = schema.DATE_FORMATS[0]
+
+PRIMARY_TYPES = [
+    "THEFT", "BATTERY", "CRIMINAL DAMAGE", "NARCOTICS", "ASSAULT", "OTHER OFFENSE", "BURGLARY",
+    "MOTOR VEHICLE THEFT", "DECEPTIVE PRACTICE", "ROBBERY", "CRIMINAL TRESPASS", "WEAPONS VIOLATION",
+    "PROSTITUTION", "OFFENSE INVOLVING CHILDREN", "PUBLIC PEACE VIOLATION", "SEX OFFENSE",
+    "CRIM SEXUAL ASSAULT", "INTERFERENCE WITH PUBLIC OFFICER", "GAMBLING", "LIQUOR LAW VIOLATION",
+    "ARSON", "HOMICIDE", "KIDNAPPING", "INTIMIDATION", "STALKING", "CONCEALED CARRY LICENSE VIOLATION",
+    "OBSCENITY", "PUBLIC INDECENCY", "HUMAN TRAFFICKING", "NON-CRIMINAL", "OTHER NARCOTIC VIOLATION",
+    "RITUALISM", "CRIMINAL SEXUAL ASSAULT",
+]
+FBI_CODES = [
+    "01A", "01B", "02", "03", "04A", "04B", "05", "06", "07", "08A", "08B", "09", "10", "11", "12",
+    "13", "14", "15", "16", "17", "18", "19", "20", "22", "24", "26",
+]
+LOCATION_WORDS = [
+    "STREET", "RESIDENCE", "APARTMENT", "SIDEWALK", "PARKING LOT", "ALLEY", "SCHOOL", "RESTAURANT",
+    "SMALL RETAIL STORE", "DEPARTMENT STORE", "GAS STATION", "VEHICLE", "CTA TRAIN", "CTA BUS",
+    "PARK PROPERTY", "HOSPITAL", "BANK", "HOTEL", "BAR OR TAVERN", "GROCERY FOOD STORE",
+]
+LOCATION_QUALIFIERS = ["", " - PRIVATE", " - PUBLIC", " - PORCH", " - GARAGE", " - YARD", " - HALLWAY", " - LOBBY", " - OTHER"]
+STREETS = ["STATE ST", "MICHIGAN AVE", "HALSTED ST", "ASHLAND AVE", "WESTERN AVE", "PULASKI RD", "CICERO AVE",
+           "MADISON ST", "CHICAGO AVE", "NORTH AVE", "ROOSEVELT RD", "CERMAK RD", "79TH ST", "63RD ST"]
+DISTRICTS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 14, 15, 16, 17, 18, 19, 20, 22, 24, 25]
+
+# อัตรา missing ใน Before (ค่าอื่นที่ไม่ระบุ = 0)
+MISSING_RATES = {
+    "Ward": 0.69,
+    "Community Area": 0.68,
+    "Location Description": 0.0041,
+    "Coordinates": 0.011,
+    "Case Number": 0.0001,
+    "District": 0.0002,
+    "Beat": 0.0001,
+    "FBI Code": 0.0001,
+    "Updated On": 0.0001,
+}
+# คอลัมน์แกนหลักที่ clean() ลบแถวทิ้งเมื่อว่าง (ตาม MISSING_HANDLING)
+DROP_ROW_COLUMNS = ["Case Number", "Date", "Block", "IUCR", "Primary Type", "Description",
+                    "Arrest", "Domestic", "Beat", "District", "FBI Code", "Year", "Updated On"]
+
+
+def _zipf_weights(n: int, s: float = 1.1) -> np.ndarray:
+    w = 1.0 / np.arange(1, n + 1) ** s
+    return w / w.sum()
+
+def _categorical(rng, labels: list, n: int, weights=None) -> pd.Categorical:
+    codes = rng.choice(len(labels), size=n, p=weights).astype(np.int32)
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+def _with_missing(rng, values, rate: float):
+    if rate <= 0:
+        return values
+    s = pd.Series(values)
+    return s.mask(rng.random(len(s)) < rate)
+
+
+def generate(n: int, seed: int = 0, start_year: int = 2001, end_year: int = 2024) -> pd.DataFrame:
+    # Before (ข้อมูลดิบ): คืน DataFrame ที่ dtype พร้อมเขียนเป็น CSV
+    rng = np.random.default_rng(seed)
+
+    # --- Crime taxonomy: IUCR ผูกกับ Primary Type, Description ผูกกับ IUCR
+    type_w = _zipf_weights(len(PRIMARY_TYPES), 1.3)
+    type_codes = rng.choice(len(PRIMARY_TYPES), size=n, p=type_w)
+    iucr_per_type = 12
+    iucr_sub = rng.choice(iucr_per_type, size=n, p=_zipf_weights(iucr_per_type, 1.5))
+    iucr_codes = type_codes * iucr_per_type + iucr_sub
+    iucr_labels = [f"{(t * 97 + k * 13) % 9000 + 100:04d}" for t in range(len(PRIMARY_TYPES)) for k in range(iucr_per_type)]
+    desc_labels = [f"{PRIMARY_TYPES[t][:12]} - TYPE {k + 1}" for t in range(len(PRIMARY_TYPES)) for k in range(iucr_per_type)]
+    fbi_codes = np.array([i % len(FBI_CODES) for i in range(len(PRIMARY_TYPES))])[type_codes]
+
+    # --- Time: 2001..2024, Updated On = หลังเกิดเหตุ 0–30 วัน
+    t0 = pd.Timestamp(f"{start_year}-01-01").value // 10**9
+    t1 = pd.Timestamp(f"{end_year + 1}-01-01").value // 10**9
+    seconds = rng.integers(t0, t1, size=n) // 60 * 60
+    date = pd.to_datetime(seconds, unit="s")
+    updated = date + pd.to_timedelta(rng.integers(0, 30 * 86400, size=n) // 60 * 60, unit="s")
+
+    # --- Place: District ← Beat, พิกัดเป็นกลุ่มรอบ hotspot ต่อ District
+    district_idx = rng.choice(len(DISTRICTS), size=n, p=_zipf_weights(len(DISTRICTS), 0.4))
+    district = np.array(DISTRICTS)[district_idx]
+    beat = district * 100 + rng.integers(11, 24, size=n)
+    centers_lat = 41.65 + (np.arange(len(DISTRICTS)) * 0.37 % 1.0) * 0.35
+    centers_lon = -87.85 + (np.arange(len(DISTRICTS)) * 0.61 % 1.0) * 0.28
+    lat = centers_lat[district_idx] + rng.normal(0, 0.015, size=n)
+    lon = centers_lon[district_idx] + rng.normal(0, 0.015, size=n)
+    x_coord = np.round(1_165_000 + (lon + 87.68) * 72_000)
+    y_coord = np.round(1_900_000 + (lat - 41.84) * 364_000)
+    no_geo = rng.random(n) < MISSING_RATES["Coordinates"]
+    lat[no_geo] = np.nan
+    lon[no_geo] = np.nan
+    x_coord[no_geo] = np.nan
+    y_coord[no_geo] = np.nan
+
+    loc_labels = [w + q for w in LOCATION_WORDS for q in LOCATION_QUALIFIERS]
+    block_labels = [f"{h:03d}XX {d} {st}" for st in STREETS for d in "NSEW" for h in range(0, 640)]
+    block_codes = rng.choice(len(block_labels), size=n, p=_zipf_weights(len(block_labels), 0.6))
+
+    ids = np.arange(1, n + 1, dtype=np.int64) + 10_000_000
+    case_numbers = pd.Series(ids % 1_000_000).map("{:06d}".format)
+    case_prefix = np.array(["HY", "JA", "JB", "JC", "JD", "JE"])[rng.integers(0, 6, size=n)]
+
+    df = pd.DataFrame({
+        "ID": ids,
+        "Case Number": _with_missing(rng, case_prefix + case_numbers.to_numpy(dtype=object), MISSING_RATES["Case Number"]),
+        "Date": date,
+        "Block": pd.Categorical.from_codes(block_codes.astype(np.int32), categories=block_labels),
+        "IUCR": pd.Categorical.from_codes(iucr_codes.astype(np.int32), categories=iucr_labels),
+        "Primary Type": pd.Categorical.from_codes(type_codes.astype(np.int32), categories=PRIMARY_TYPES),
+        "Description": pd.Categorical.from_codes(iucr_codes.astype(np.int32), categories=desc_labels),
+        "Location Description": _with_missing(
+            rng, _categorical(rng, loc_labels, n, _zipf_weights(len(loc_labels), 1.2)), MISSING_RATES["Location Description"]
+        ),
+        "Arrest": rng.random(n) < (0.12 + 0.5 * (type_codes == PRIMARY_TYPES.index("NARCOTICS"))),
+        "Domestic": rng.random(n) < (0.08 + 0.3 * (type_codes == PRIMARY_TYPES.index("BATTERY"))),
+        "Beat": _with_missing(rng, beat, MISSING_RATES["Beat"]),
+        "District": _with_missing(rng, district.astype("float64"), MISSING_RATES["District"]),
+        "Ward": _with_missing(rng, rng.integers(1, 51, size=n).astype("float64"), MISSING_RATES["Ward"]),
+        "Community Area": _with_missing(rng, rng.integers(1, 78, size=n).astype("float64"), MISSING_RATES["Community Area"]),
+        "FBI Code": _with_missing(rng, pd.Categorical.from_codes(fbi_codes.astype(np.int32), categories=FBI_CODES), MISSING_RATES["FBI Code"]),
+        "X Coordinate": x_coord,
+        "Y Coordinate": y_coord,
+        "Year": date.year,
+        "Updated On": _with_missing(rng, updated, MISSING_RATES["Updated On"]),
+        "Latitude": lat,
+        "Longitude": lon,
+    })
+    loc_text = "(" + df["Latitude"].astype(str) + ", " + df["Longitude"].astype(str) + ")"
+    df["Location"] = loc_text.where(~no_geo)
+    # เรียงตามวันที่เหมือนไฟล์ export จริง
+    return df.sort_values("Date", kind="stable").reset_index(drop=True)
+
+def clean(df: pd.DataFrame) -> pd.DataFrame:
+    # After: ลบแถวที่แกนหลักว่าง, เติม UNKNOWN, ตัด Ward/Community Area
+    out = df.dropna(subset=[c for c in DROP_ROW_COLUMNS if c in df.columns])
+    out = out.drop(columns=["Ward", "Community Area"], errors="ignore")
+    if "Location Description" in out.columns:
+        loc = out["Location Description"]
+        if isinstance(loc.dtype, pd.CategoricalDtype) and "UNKNOWN" not in loc.cat.categories:
+            loc = loc.cat.add_categories(["UNKNOWN"])
+        out = out.assign(**{"Location Description": loc.fillna("UNKNOWN")})
+    return out.reset_index(drop=True)
+
+def write_csv(df: pd.DataFrame, path: str):
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index=False, date_format=CSV_DATE_FORMAT)
+    os.replace(tmp, path)
@@ -0,0 +1,156 @@
+# temporal.py
+# ==============================
+# Time keys + temporal rollups
+# ==============================
+# - prep (ตอน ingestion ครั้งเดียว แทน prep_dates เดิม): Date parse ด้วย format คงที่ (schema.to_datetime_fast)
+#   แล้วเก็บคีย์เวลาเป็นจำนวนเต็ม: Year (Int16) + TimeKey = ชั่วโมงนับจาก 1970-01-01 (Int32)
+#   → ไม่ copy ทั้ง frame และไม่สร้าง string "YYYY-MM" ต่อแถว
+# - rollup = จำนวนแถวต่อ TimeKey (~8,800 แถวต่อปี ไม่ขึ้นกับจำนวนคดี)
+#   → ชั่วโมง / วันในสัปดาห์ / วัน / สัปดาห์ / เดือน / ปี และ heatmap ชั่วโมง × วัน คำนวณจาก rollup ทั้งหมด
+#   โดยไม่แตะแถวดิบ; rollup รวมกันได้ด้วยการบวก (ต่อ partition / ช่วงแถว)
+import os
+
+import numpy as np
+import pandas as pd
+
+import cube
+import data_cache
+import schema
+
+PREP_VERSION = "2"  # เปลี่ยนเมื่อแก้ prep (สร้าง Arrow store / partitions / cube / rollup ใหม่)
+TIME_KEY = schema.TIME_KEY
+GRAINS = ["Hour", "Weekday", "Day", "Week", "Month", "Year"]
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+# ------------------------------
+# Ingestion
+# ------------------------------
+def prep(df: pd.DataFrame) -> pd.DataFrame:
+    # คอลัมน์เวลาที่ app ใช้คำนวณจาก Date ครั้งเดียวก่อนเก็บลง store
+    if "Date" not in df.columns:
+        return df
+    date = schema.to_datetime_fast(df["Date"])
+    missing = date.isna().to_numpy()
+    hours = date.to_numpy(dtype="datetime64[h]")
+    years = hours.astype("datetime64[Y]").astype(np.int64) + 1970
+    keys = hours.astype(np.int64)
+    keys[missing] = 0
+    years[missing] = 0
+    return df.assign(
+        Date=date,
+        Year=pd.arrays.IntegerArray(years.astype(np.int16), missing),
+        **{TIME_KEY: pd.arrays.IntegerArray(keys.astype(np.int32), missing)},
+    )
+
+
+# ------------------------------
+# Build (ต่อ partition)
+# ------------------------------
+def rollup(keys: pd.Series, dataset: str) -> pd.DataFrame:
+    # keys = คอลัมน์ TimeKey ของแถว (ทั้งชุด หรือแถวที่ตรงตัวกรอง); แถวที่ไม่มี Date ไม่นับ
+    k = keys.dropna().to_numpy(dtype=np.int64)
+    if len(k) == 0:
+        return pd.DataFrame({"Dataset": pd.Series(dtype=object), TIME_KEY: pd.Series(dtype=np.int32), "Count": pd.Series(dtype=np.int64)})
+    lo = k.min()
+    counts = np.bincount(k - lo)
+    hit = np.flatnonzero(counts)
+    return pd.DataFrame({"Dataset": dataset, TIME_KEY: (hit + lo).astype(np.int32), "Count": counts[hit].astype(np.int64)})
+
+def merge_partials(partials: list) -> pd.DataFrame:
+    out = pd.concat(partials, ignore_index=True)
+    if len(partials) > 1:
+        out = out.groupby(["Dataset", TIME_KEY], sort=True)["Count"].sum().reset_index()
+    out["Dataset"] = out["Dataset"].astype("category")
+    return out
+
+def apply_delta(table: pd.DataFrame, removed: pd.DataFrame, added: pd.DataFrame, dataset: str) -> pd.DataFrame:
+    # เหมือน cube.apply_delta: ลบจำนวนของแถวเดิมที่ถูกแทนที่ แล้วบวกแถวใหม่ (ไม่ต้อง rollup ทั้งชุดใหม่)
+    parts = [table]
+    if len(removed):
+        neg = rollup(removed.get(TIME_KEY, pd.Series(dtype="Int32")), dataset)
+        neg["Count"] = -neg["Count"]
+        parts.append(neg)
+    if len(added):
+        parts.append(rollup(added.get(TIME_KEY, pd.Series(dtype="Int32")), dataset))
+    out = merge_partials(parts)
+    # TimeKey ที่ไม่เหลือแถว → ไม่เก็บ (เหมือน rollup ที่สร้างใหม่)
+    return out[out["Count"] != 0].reset_index(drop=True)
+
+
+# ------------------------------
+# Persist (ข้าง Parquet เหมือน cube)
+# ------------------------------
+def rollup_path(parquet_path: str, version: str) -> str:
+    return data_cache.derived_path(parquet_path, f".{version}.time.parquet")
+
+def load_or_build(parquet_path: str, version: str, build_fn) -> pd.DataFrame:
+    # build_fn() -> rollup เช่น parallel.time_rollup(...)
+    path = rollup_path(parquet_path, version)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    out = build_fn()
+    cube.save_cube(out, path)
+    return out
+
+
+# ------------------------------
+# Query
+# ------------------------------
+def covers(filters: dict) -> bool:
+    # rollup แยกตามเวลาอย่างเดียว → ตัวกรองอื่นต้อง rollup จากแถวที่เลือก
+    return not any(filters.get(c) for c in schema.FILTER_COLUMNS)
+
+def year_keys(year_range) -> tuple:
+    # [TimeKey แรกของปีต้น, TimeKey แรกของปีถัดจากปีปลาย)
+    lo, hi = year_range
+    start = np.datetime64(f"{int(lo):04d}-01-01", "h").astype(np.int64)
+    end = np.datetime64(f"{int(hi) + 1:04d}-01-01", "h").astype(np.int64)
+    return int(start), int(end)
+
+def slice_rollup(table: pd.DataFrame, year_range=None, dataset: str = None) -> pd.DataFrame:
+    mask = np.ones(len(table), dtype=bool)
+    if dataset is not None:
+        mask &= (table["Dataset"] == dataset).to_numpy(dtype=bool)
+    if year_range is not None:
+        start, end = year_keys(year_range)
+        key = table[TIME_KEY].to_numpy()
+        mask &= (key >= start) & (key < end)
+    return table[mask]
+
+def grain_keys(keys: np.ndarray, grain: str) -> np.ndarray:
+    hours = keys.astype(np.int64)
+    days = hours // 24
+    if grain == "Hour":
+        return hours % 24
+    if grain == "Weekday":
+        return (days + 3) % 7  # 1970-01-01 = วันพฤหัส → จันทร์ = 0
+    if grain == "Day":
+        return days.astype("datetime64[D]")
+    if grain == "Week":
+        return (days - (days + 3) % 7).astype("datetime64[D]")  # วันจันทร์ของสัปดาห์
+    if grain == "Month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]")
+    if grain == "Year":
+        return days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+    raise ValueError(f"unknown grain: {grain}")
+
+def by(table: pd.DataFrame, grain: str) -> pd.DataFrame:
+    # [grain, Count] เรียงตามเวลา (Weekday เป็นชื่อวัน Mon..Sun)
+    keys = grain_keys(table[TIME_KEY].to_numpy(), grain)
+    out = table["Count"].groupby(keys, sort=True).sum().rename_axis(grain).reset_index()
+    if grain == "Weekday":
+        out["Weekday"] = pd.Categorical.from_codes(out["Weekday"], categories=WEEKDAYS, ordered=True)
+    return out
+
+def trend(table: pd.DataFrame, grain: str) -> pd.DataFrame:
+    # [grain, Count, Dataset] ของ Before/After ต่อกัน (รูปเดียวกับ analytics.year_trend)
+    parts = [by(table[(table["Dataset"] == name).to_numpy(dtype=bool)], grain).assign(Dataset=name) for name in ["Before", "After"]]
+    return pd.concat(parts, ignore_index=True)
+
+def heatmap(table: pd.DataFrame) -> pd.DataFrame:
+    # จำนวนคดี: แถว = วันในสัปดาห์ (Mon..Sun), คอลัมน์ = ชั่วโมง 0..23
+    keys = table[TIME_KEY].to_numpy()
+    cell = grain_keys(keys, "Weekday") * 24 + grain_keys(keys, "Hour")
+    grid = np.bincount(cell, weights=table["Count"].to_numpy(dtype="float64"), minlength=7 * 24)
+    return pd.DataFrame(grid.reshape(7, 24).astype(np.int64), index=pd.Index(WEEKDAYS, name="Weekday"), columns=pd.Index(range(24), name="Hour"))
@@ -0,0 +1,5 @@
+# โมดูลของ app เป็นไฟล์ระดับบนสุดใน Crimes/ (import cube, import fetch, ...)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,47 @@
+# test_duplicates.py
+# ==============================
+# กฎการจัดกลุ่ม exact / near (gap chaining ต่อ Case Number)
+# ==============================
+import pandas as pd
+
+import duplicates
+
+
+def frame(rows: list) -> pd.DataFrame:
+    # rows = [(Case Number, Date, IUCR)]
+    case, date, iucr = zip(*rows)
+    return pd.DataFrame({"Case Number": case, "Date": pd.to_datetime(list(date)), "IUCR": iucr, "Year": 2020, "District": 1})
+
+
+def flags(rows: list) -> dict:
+    return {k: v.astype(int).tolist() for k, v in duplicates.flags(duplicates.fingerprints(frame(rows))).items()}
+
+
+def test_near_groups_chain_by_gap_within_case():
+    out = flags([
+        ("A", "2020-01-01 10:00", "1"),
+        ("A", "2020-01-01 10:50", "2"),
+        ("A", "2020-01-01 11:40", "3"),  # ห่างแถวแรก 100 นาที แต่ห่างแถวก่อนหน้า 50 → กลุ่มเดียวกัน
+        ("A", "2020-01-01 13:00", "4"),  # ช่องว่าง 80 นาที → ไม่ซ้ำ
+    ])
+    assert out["NearRows"] == [0, 1, 1, 0]
+    assert out["NearGroups"] == [1, 0, 0, 0]
+
+
+def test_other_cases_and_exact_copies_do_not_break_chain():
+    out = flags([
+        ("A", "2020-01-01 10:00", "1"),
+        ("A", "2020-01-01 10:00", "1"),  # สำเนา exact → ExactRows, ไม่นับเป็น near
+        ("B", "2020-01-01 10:20", "1"),  # Case อื่นระหว่างเวลา → ไม่คั่นกลุ่มของ A
+        ("A", "2020-01-01 10:40", "2"),
+    ])
+    assert out["ExactRows"] == [0, 1, 0, 0]
+    assert out["NearRows"] == [0, 0, 0, 1]
+    assert out["NearGroups"] == [1, 0, 0, 0]
+
+
+def test_rows_with_missing_keys_are_never_duplicates():
+    df = frame([("A", "2020-01-01 10:00", "1"), ("A", "2020-01-01 10:00", "1")])
+    df.loc[1, "IUCR"] = None
+    out = duplicates.flags(duplicates.fingerprints(df))
+    assert not any(v.any() for v in out.values())
@@ -0,0 +1,176 @@
+# test_fetch.py
+# ==============================
+# fetch กับ HTTP server จำลองในเครื่อง (Range / If-Range / 206 / 200 / 416 / ETag)
+# ==============================
+import hashlib
+import http.server
+import io
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fetch
+
+
+def make_csv(rows: int, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "ID": np.arange(rows),
+        "Primary Type": rng.choice(["THEFT", "BATTERY", "NARCOTICS"], rows),
+        "District": rng.integers(1, 26, rows),
+        "Latitude": rng.uniform(41.6, 42.1, rows).round(6),
+    })
+    return df.to_csv(index=False).encode("utf-8")
+
+
+class StandIn:
+    # เนื้อไฟล์ + ETag ที่ server ส่ง; drop_after = ตัดการเชื่อมต่อหลังส่งกี่ไบต์ (ครั้งเดียว)
+    def __init__(self, content: bytes):
+        self.requests = []  # (Range, If-Range, status)
+        self.drop_after = None
+        self.pace = 0.0
+        self.set_content(content)
+
+    def set_content(self, content: bytes):
+        self.content = content
+        self.etag = '"' + hashlib.sha256(content).hexdigest()[:16] + '"'
+
+
+def _handler(state: StandIn):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            content, rng, if_range = state.content, self.headers.get("Range"), self.headers.get("If-Range")
+            start, status = 0, 200
+            if rng and (if_range is None or if_range == state.etag):
+                start = int(rng.split("=")[1].rstrip("-"))
+                if start >= len(content):
+                    state.requests.append((rng, if_range, 416))
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(content)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                status = 206
+            state.requests.append((rng, if_range, status))
+            body = content[start:]
+            self.send_response(status)
+            self.send_header("Content-Type", "text/csv")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", state.etag)
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+            self.end_headers()
+            if state.drop_after is not None:
+                # ส่งไม่ครบ Content-Length แล้วปิด socket (connection หลุดกลางทาง)
+                self.wfile.write(body[:state.drop_after])
+                self.wfile.flush()
+                state.drop_after = None
+                self.close_connection = True
+                return
+            for i in range(0, len(body), 16_384):
+                self.wfile.write(body[i:i + 16_384])
+                if state.pace:
+                    time.sleep(state.pace)
+
+    return Handler
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("no_proxy", "127.0.0.1,localhost")
+    monkeypatch.setattr(fetch, "BACKOFF_SECONDS", 0.0)
+    monkeypatch.setattr(fetch, "CHUNK_SIZE", 8192)
+    state = StandIn(make_csv(20_000))
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _handler(state))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    state.url = f"http://127.0.0.1:{httpd.server_address[1]}/crimes.csv"
+    yield state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_resume_after_dropped_connection(server, tmp_path):
+    dest = str(tmp_path / "crimes.csv")
+    server.drop_after = len(server.content) // 3
+    digest, _ = fetch.fetch(server.url, dest)
+
+    assert open(dest, "rb").read() == server.content
+    assert digest == hashlib.sha256(server.content).hexdigest()
+    (_, _, first), (rng, if_range, second) = server.requests
+    assert first == 200 and second == 206
+    assert int(rng.split("=")[1].rstrip("-")) > 0 and if_range == server.etag
+
+
+def test_if_range_falls_back_to_full_download_when_file_changed(server, tmp_path, monkeypatch):
+    dest = str(tmp_path / "crimes.csv")
+    server.drop_after = len(server.content) // 2
+    monkeypatch.setattr(fetch, "RETRIES", 0)
+    with pytest.raises(OSError):
+        fetch.fetch(server.url, dest)
+    assert (tmp_path / "crimes.csv.part").stat().st_size > 0
+
+    # ไฟล์ต้นทางเปลี่ยน (ETag ใหม่) → If-Range ไม่ตรง → 200 ทั้งไฟล์ ไม่ต่อจาก .part เก่า
+    old_etag = server.etag
+    server.set_content(make_csv(15_000, seed=1))
+    monkeypatch.setattr(fetch, "RETRIES", 5)
+    fetch.fetch(server.url, dest)
+
+    assert open(dest, "rb").read() == server.content
+    rng, if_range, status = server.requests[-1]
+    assert rng is not None and if_range == old_etag and status == 200
+
+
+def test_range_past_end_restarts(server, tmp_path):
+    # .part ยาวกว่าไฟล์ปัจจุบัน (validator ยังตรง) → 416 → เริ่มใหม่จาก 0
+    dest = str(tmp_path / "crimes.csv")
+    part = dest + ".part"
+    with open(part, "wb") as f:
+        f.write(b"x" * (len(server.content) + 10))
+    fetch._write_state(part, {"url": server.url, "validator": server.etag})
+    fetch.fetch(server.url, dest)
+
+    assert open(dest, "rb").read() == server.content
+    assert [status for _, _, status in server.requests] == [416, 200]
+
+
+def test_checksum_mismatch_raises(server, tmp_path):
+    dest = tmp_path / "crimes.csv"
+    with pytest.raises(fetch.ChecksumError):
+        fetch.fetch(server.url, str(dest), sha256="0" * 64)
+    assert not dest.exists()
+    assert not (tmp_path / "crimes.csv.part").exists()
+
+    digest, _ = fetch.fetch(server.url, str(dest), sha256=hashlib.sha256(server.content).hexdigest().upper())
+    assert dest.read_bytes() == server.content and digest == hashlib.sha256(server.content).hexdigest()
+
+
+def test_parse_while_downloading_matches_full_read(server, tmp_path):
+    dest = str(tmp_path / "crimes.csv")
+    server.pace = 0.001  # ส่งทีละช่วง → reader อ่านทันข้อมูลที่กำลังเขียน
+    _, df = fetch.fetch(server.url, dest, reader=pd.read_csv)
+
+    assert df is not None
+    pd.testing.assert_frame_equal(df, pd.read_csv(dest))
+    pd.testing.assert_frame_equal(df, pd.read_csv(io.BytesIO(server.content)))
+
+
+def test_parse_after_restart_is_left_to_caller(server, tmp_path):
+    # เริ่มใหม่กลางทาง (416) → ผล parse ระหว่างทางใช้ไม่ได้ → df = None ให้ผู้เรียก parse จาก dest
+    dest = str(tmp_path / "crimes.csv")
+    part = dest + ".part"
+    with open(part, "wb") as f:
+        f.write(b"x" * (len(server.content) + 10))
+    fetch._write_state(part, {"url": server.url, "validator": server.etag})
+    _, df = fetch.fetch(server.url, dest, reader=pd.read_csv)
+
+    assert df is None
+    assert open(dest, "rb").read() == server.content
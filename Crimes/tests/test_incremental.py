@@ -0,0 +1,162 @@
+# test_incremental.py
+# ==============================
+# incremental refresh: aggregate ที่ปรับด้วย delta ต้องเท่ากับ (หรืออยู่ในขอบเขตของ) การสร้างใหม่ทั้งชุด
+# ==============================
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cube
+import data_cache
+import dataset_store
+import duplicates
+import heavy_hitters
+import incremental
+import partitions
+import sampling
+import schema
+import synthetic
+import temporal
+
+VERSION = temporal.PREP_VERSION
+
+
+def build_all(path: str, name: str) -> pd.DataFrame:
+    df = temporal.prep(data_cache.read_parquet_mmap(path))
+    cube.load_or_build(path, VERSION, df, name)
+    temporal.load_or_build(path, VERSION, lambda: temporal.merge_partials([temporal.rollup(df[temporal.TIME_KEY], name)]))
+    heavy_hitters.load_or_build(path, VERSION, lambda: heavy_hitters.merge_partials([heavy_hitters.build_partition_top_k(df, name)]))
+    sampling.load_or_build(path, VERSION, lambda: sampling.merge_partials([sampling.build(df, name)]))
+    duplicates.load_or_build(path, VERSION, lambda: duplicates.summarize(duplicates.fingerprints(df), name))
+    dataset_store.open_shared(path, temporal.prep, VERSION)
+    partitions.open_partitioned(path, temporal.prep, VERSION)
+    return df
+
+
+@pytest.fixture
+def refreshed(tmp_path, monkeypatch):
+    # ตัวอย่างไม่ครบทุกแถวของชั้น → แถวที่ถูกแทนที่มีทั้งที่ถูกสุ่มและไม่ถูกสุ่ม
+    monkeypatch.setattr(sampling, "MIN_PER_STRATUM", 50)
+    base = synthetic.generate(20_000, seed=3)
+    # แถวซ้ำในชุดเดิม: exact (Case Number + Date + IUCR เดียวกัน) และ near (Case เดียวกัน ห่าง 30 นาที)
+    keys = duplicates.KEY_COLUMNS
+    base.loc[100:199, keys] = base.loc[5100:5199, keys].to_numpy()
+    base.loc[300:399, "Case Number"] = base.loc[5300:5399, "Case Number"].to_numpy()
+    base.loc[300:399, "Date"] = (base.loc[5300:5399, "Date"] + pd.Timedelta(minutes=30)).to_numpy()
+    src = tmp_path / "crimes.csv"
+    synthetic.write_csv(base, str(src))
+    cache = str(tmp_path / "cache")
+    path = data_cache.ensure_cached(str(src), schema.read_csv_typed, schema.SCHEMA_VERSION, cache)
+    build_all(path, "After")
+
+    # delta = แก้ไขแถวเดิม 300 แถว (ปี/เขต/ประเภทเปลี่ยน) + แถวใหม่ 500 แถว
+    stored = data_cache.read_parquet_mmap(path)
+    later = stored["Updated On"].max() + pd.Timedelta(days=1)
+    # delta อยู่ในบางปี (ปีท้าย + ปีของแถวซ้ำ) → partition ปีอื่นต้องไม่ถูกเขียนใหม่
+    new = synthetic.generate(500, seed=4, start_year=2020)
+    new["ID"] = new["ID"] + int(stored["ID"].max()) + 1
+    # แถวใหม่ที่ซ้ำกับแถวเดิม (ต่างปี/เขตได้)
+    new.loc[:49, keys] = base.loc[7000:7049, keys].to_numpy()
+    changed = synthetic.generate(300, seed=5, start_year=2020)
+    # แก้ไขแถวที่อยู่ในกลุ่มซ้ำด้วย → กลุ่มเดิมต้องนับใหม่
+    dup_ids = base["ID"].iloc[np.r_[100:150, 300:350, 5100:5120]]
+    recent = stored["ID"][(stored["Date"].dt.year >= 2020) & ~stored["ID"].isin(dup_ids)]
+    changed["ID"] = np.r_[dup_ids, recent.sample(180, random_state=0)]
+    delta = pd.concat([changed, new], ignore_index=True)
+    delta["Updated On"] = later.strftime(synthetic.CSV_DATE_FORMAT)
+    drop = tmp_path / "drop"
+    drop.mkdir()
+    synthetic.write_csv(delta, str(drop / "delta.csv"))
+
+    result = incremental.refresh(str(src), str(drop), temporal.prep, VERSION, cache_dir=cache)
+    new_path = str(tmp_path / "cache" / data_cache.read_manifest(cache)[str(src)]["parquet"])
+    return result, new_path, temporal.prep(data_cache.read_parquet_mmap(new_path)), delta
+
+
+def test_refresh_counts(refreshed):
+    result, _, df, _ = refreshed
+    assert result["added"] == 500 and result["updated"] == 300
+    assert len(df) == 20_500
+
+
+def test_top_k_lists_match_rebuild(refreshed):
+    _, path, df, _ = refreshed
+    tops = pd.read_parquet(heavy_hitters.top_k_path(path, VERSION))
+    full = heavy_hitters.merge_partials([heavy_hitters.build_partition_top_k(df, "After")])
+    for col in heavy_hitters.HH_COLUMNS:
+        for filters in [{}, {"Year": [2010, 2015]}, {"District": [1, 2, 3]}]:
+            got, _ = heavy_hitters.top_k(tops, col, filters, "After", 20)
+            want, _ = heavy_hitters.top_k(full, col, filters, "After", 20)
+            counts = _exact_counts(df, col, filters)
+            # ทุกค่าในผลอยู่ในช่วง Count..Max ของค่าจริง และค่าอันดับต้นตรงกับการสร้างใหม่
+            for value, lo, hi in got[[col, "Count", "Max"]].itertuples(index=False):
+                assert lo <= counts.get(value, 0) <= hi
+            assert got[col].head(3).tolist() == want[col].head(3).tolist()
+
+
+def _exact_counts(df: pd.DataFrame, col: str, filters: dict) -> dict:
+    mask = pd.Series(True, index=df.index)
+    if filters.get("Year"):
+        mask &= df["Year"].between(*filters["Year"]).fillna(False)
+    if filters.get("District"):
+        mask &= df["District"].isin(filters["District"])
+    return df.loc[mask, col].dropna().astype(str).value_counts().to_dict()
+
+
+def test_sample_matches_new_population(refreshed):
+    _, path, df, delta = refreshed
+    sample, values = sampling.load(path, VERSION)
+    strata = sample.drop_duplicates("Stratum")
+    # ประชากรต่อปีของตัวอย่าง = จำนวนแถวจริงต่อปีของชุดใหม่
+    years = sampling._stratum_year(strata["Stratum"].to_numpy())
+    population = strata.groupby(years)["Population"].sum()
+    truth = df["Year"].astype("float64").fillna(-1).astype(int).value_counts()
+    pd.testing.assert_series_equal(population.sort_index(), truth.sort_index(), check_names=False, check_dtype=False, check_index_type=False)
+    assert (strata["Sampled"] <= strata["Population"]).all()
+    assert (sample.groupby("Stratum").size() == sample.groupby("Stratum")["Sampled"].first()).all()
+    # แถวเวอร์ชันเก่าที่ถูกแทนที่ไม่อยู่ในตัวอย่าง (แถวใหม่ของ ID เดียวกันอยู่ในชั้นของ delta)
+    old_part = sample["Stratum"] < sample["Stratum"].max() // sampling.STRATA_PER_PART * sampling.STRATA_PER_PART
+    assert not sample.loc[old_part, sampling.KEY_COL].isin(delta["ID"]).any()
+    assert set(df["Primary Type"].dropna()) <= {v for by_year in values["Primary Type"].values() for v in by_year}
+    assert sampling.total(sample)["value"] == pytest.approx(len(df))
+
+
+def test_time_rollup_matches_rebuild(refreshed):
+    _, path, df, _ = refreshed
+    got = pd.read_parquet(temporal.rollup_path(path, VERSION))
+    full = temporal.merge_partials([temporal.rollup(df[temporal.TIME_KEY], "After")])
+    pd.testing.assert_frame_equal(got.reset_index(drop=True), full.reset_index(drop=True), check_dtype=False, check_categorical=False)
+
+
+def test_duplicate_summary_matches_rebuild(refreshed):
+    _, path, df, _ = refreshed
+    got = pd.read_parquet(duplicates.summary_path(path, VERSION))
+    full = duplicates.summarize(duplicates.fingerprints(df), "After")
+    assert full[["ExactRows", "NearRows"]].to_numpy().sum() > 0
+    pd.testing.assert_frame_equal(got.reset_index(drop=True), full.reset_index(drop=True), check_dtype=False)
+
+
+def test_stores_match_rebuild(refreshed, tmp_path):
+    _, path, df, delta = refreshed
+    arrow = dataset_store.open_arrow(dataset_store.arrow_path(path, VERSION))
+    pd.testing.assert_frame_equal(arrow, df, check_categorical=False)
+
+    root = partitions.partition_root(path, VERSION)
+    partitions.write_partitions(df, str(tmp_path / "rebuild"))
+    got, want = partitions.PartitionedDataset(root), partitions.PartitionedDataset(str(tmp_path / "rebuild"))
+    assert got.meta == want.meta
+    for name in want.meta["partitions"]:
+        assert got.load_partition(name)["ID"].tolist() == want.load_partition(name)["ID"].tolist()
+
+
+def test_only_touched_partitions_are_rewritten(refreshed, tmp_path):
+    _, path, _, delta = refreshed
+    root = partitions.partition_root(path, VERSION)
+    names = [n for n in os.listdir(root) if n != partitions.METADATA_NAME]
+    # ไฟล์ที่แก้หลังเขียน delta = partition ที่ถูกเขียนใหม่ (partition อื่นเป็น hard link ของไฟล์เดิม)
+    written_at = os.stat(tmp_path / "drop" / "delta.csv").st_mtime_ns
+    rewritten = {n for n in names if os.stat(os.path.join(root, n, partitions.PART_FILE)).st_mtime_ns > written_at}
+    assert {partitions.partition_name(y) for y in delta["Date"].dt.year.unique()} <= rewritten
+    assert len(rewritten) < len(names)
@@ -0,0 +1,71 @@
+# test_parallel.py
+# ==============================
+# process pool: ผลเท่ากับคำนวณใน process เดียว และ worker ไม่รันสคริปต์ __main__ ซ้ำ
+# ==============================
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import parallel
+import parallel_worker
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(parallel, "WORKERS", 2)
+    monkeypatch.setattr(parallel, "_pool", None)
+    yield
+    if parallel._pool is not None:
+        parallel._pool.shutdown()
+
+
+def test_workers_do_not_rerun_script_main(pool, tmp_path, monkeypatch):
+    # เหมือน Streamlit: __main__ เป็นโมดูลของสคริปต์ที่มี __file__ → worker ต้องไม่รันไฟล์นั้น
+    marker = tmp_path / "rerun"
+    script = tmp_path / "fake_app.py"
+    script.write_text(f"open({str(marker)!r}, 'a').write('x')\n", encoding="utf-8")
+    main = types.ModuleType("__main__")
+    main.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, "__main__", main)
+
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(3):
+        df = pd.DataFrame({"Ward": rng.integers(1, 50, 1000).astype("float64"), "Beat": rng.integers(100, 200, 1000)})
+        df.loc[df.index % (i + 3) == 0, "Ward"] = np.nan
+        paths.append(str(tmp_path / f"part{i}.parquet"))
+        df.to_parquet(paths[-1])
+    sources = parallel.parquet_sources(paths)
+
+    out = parallel.missing_counts(sources)
+    expected = parallel._merge("missing", [parallel_worker.partial("missing", s, {}) for s in sources])
+
+    pd.testing.assert_series_equal(out, expected)
+    assert not marker.exists()
+    # คำนวณใน worker จริง (ไม่ใช่ fallback ใน process หลัก)
+    assert any(w is not None and w.proc.poll() is None for w in list(parallel._pool._idle.queue))
+
+
+def test_falls_back_to_in_process_when_workers_cannot_start(pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "executable", str(tmp_path / "missing-python"))
+    paths = []
+    for i in range(2):
+        paths.append(str(tmp_path / f"part{i}.parquet"))
+        pd.DataFrame({"Ward": [1.0, None, 3.0][: i + 2]}).to_parquet(paths[-1])
+
+    assert parallel.missing_counts(parallel.parquet_sources(paths)).to_dict() == {"Ward": 2}
+
+
+def test_worker_errors_are_raised(pool, tmp_path):
+    paths = []
+    for i in range(2):
+        paths.append(str(tmp_path / f"part{i}.parquet"))
+        pd.DataFrame({"Ward": [1.0]}).to_parquet(paths[-1])
+    sources = parallel.parquet_sources(paths)
+    with pytest.raises(ValueError, match="unknown op"):
+        parallel.aggregate("nope", sources)
+    # worker ยังใช้ต่อได้หลังงานที่ error
+    assert parallel.missing_counts(sources).to_dict() == {"Ward": 0}
@@ -0,0 +1,28 @@
+# test_schema.py
+# ==============================
+# ตัวแปลงชนิดข้อมูลตอน ingestion
+# ==============================
+import pandas as pd
+
+import schema
+
+
+def test_datetime_rows_after_sample_in_other_format_are_parsed():
+    # sample (DATE_SAMPLE แถวแรก) เป็นรูปแบบ Chicago ทั้งหมด แต่แถวท้ายเป็น ISO → ต้องไม่กลายเป็น NaT
+    head = ["01/02/2020 03:04:05 PM"] * schema.DATE_SAMPLE
+    tail = ["2021-06-07 08:09:10", "2021-06-07T08:09:10", None]
+    out = schema.to_datetime_fast(pd.Series(head + tail, dtype=object))
+
+    assert pd.api.types.is_datetime64_any_dtype(out)
+    assert out.iloc[0] == pd.Timestamp("2020-01-02 15:04:05")
+    assert out.iloc[-3] == pd.Timestamp("2021-06-07 08:09:10")
+    assert out.iloc[-2] == pd.Timestamp("2021-06-07 08:09:10")
+    assert pd.isna(out.iloc[-1])
+    assert int(out.isna().sum()) == 1
+
+
+def test_unparseable_dates_are_missing():
+    out = schema.to_datetime_fast(pd.Series(["01/02/2020 03:04:05 PM", "not a date"], dtype=object))
+    assert out.iloc[0] == pd.Timestamp("2020-01-02 15:04:05")
+    assert pd.isna(out.iloc[1])
+